@@ -0,0 +1,205 @@
+"""
+Dịch vụ embedding cục bộ: tải bge-m3 một lần cho cả máy và gom các yêu cầu đồng
+thời thành micro-batch.
+
+Các tiến trình Streamlit và job index dùng EMBED_BACKEND=remote (RemoteEmbedding)
+để gửi văn bản qua HTTP thay vì mỗi tiến trình tự tải một bản model.
+
+Cách chạy:
+    python -m dags.config.embedding_server --port 8765 --backend float
+    python -m dags.config.embedding_server --backend onnx_int8 --max-batch-size 64 --max-wait-ms 5
+
+API:
+    POST /embed   {"texts": [...], "kind": "text" | "query"} -> {"embeddings": [[...], ...]}
+    GET  /health  -> {"status": "ok", "model": ..., "stats": {...}}
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Gom các yêu cầu nhúng đến gần như cùng lúc thành một lần gọi model.
+
+    Yêu cầu đầu tiên mở một cửa sổ max_wait_ms; các yêu cầu đến trong cửa sổ được
+    nhúng chung một batch (tối đa max_batch_size văn bản). Model chạy trên một luồng
+    duy nhất nên không có hai batch tranh CPU cùng lúc.
+    """
+
+    def __init__(self, embed_model, max_batch_size: int = 32, max_wait_ms: float = 10.0):
+        """
+        Args:
+            embed_model: Embedding model (llama-index BaseEmbedding).
+            max_batch_size: Số văn bản tối đa trong một batch.
+            max_wait_ms: Thời gian tối đa chờ gom thêm yêu cầu sau yêu cầu đầu tiên.
+        """
+        self.embed_model = embed_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # bge-m3 không dùng query instruction nên câu truy vấn được nhúng theo batch
+        # như văn bản; model có instruction thì nhúng từng câu truy vấn
+        self._query_as_text = not getattr(embed_model, "query_instruction", None)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.requests = 0
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: List[str], kind: str = "text") -> Future:
+        """Đưa một yêu cầu vào hàng đợi, trả về Future chứa danh sách vector."""
+        future: Future = Future()
+        self._queue.put((list(texts), kind, future))
+        return future
+
+    def stats(self) -> Dict[str, float]:
+        """Trả về số yêu cầu, số batch, số văn bản và kích thước batch trung bình."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts": self.texts,
+                "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+                "queue_size": self._queue.qsize(),
+            }
+
+    def _collect(self):
+        first = self._queue.get()
+        pending = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            for kind in {item[1] for item in pending}:
+                self._embed([item for item in pending if item[1] == kind], kind)
+
+    def _embed(self, items, kind: str) -> None:
+        texts = [text for item in items for text in item[0]]
+        try:
+            if kind == "query" and not self._query_as_text:
+                vectors = [self.embed_model.get_query_embedding(text) for text in texts]
+            else:
+                vectors = self.embed_model.get_text_embedding_batch(texts)
+        except Exception as e:
+            for _, _, future in items:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.texts += len(texts)
+            self.requests += len(items)
+        position = 0
+        for item_texts, _, future in items:
+            future.set_result(vectors[position:position + len(item_texts)])
+            position += len(item_texts)
+
+
+def make_handler(batcher: MicroBatcher, model_name: str, request_timeout: float):
+    class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, payload) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send_json(404, {"error": "not found"})
+                return
+            self._send_json(200, {"status": "ok", "model": model_name, "stats": batcher.stats()})
+
+        def do_POST(self):
+            if self.path != "/embed":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length))
+                texts = payload["texts"]
+                kind = payload.get("kind", "text")
+                if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                    raise ValueError("texts phải là danh sách chuỗi")
+            except (ValueError, KeyError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            try:
+                embeddings = batcher.submit(texts, kind).result(timeout=request_timeout)
+            except Exception as e:
+                logger.error(f"Lỗi khi nhúng {len(texts)} văn bản: {str(e)}")
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, {"embeddings": embeddings})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return EmbeddingRequestHandler
+
+
+def main():
+    from .vectostore import create_embed_model
+
+    parser = argparse.ArgumentParser(description="Dịch vụ embedding bge-m3 với micro-batching")
+    parser.add_argument("--host", default=os.getenv("EMBED_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("EMBED_SERVER_PORT", "8765")))
+    parser.add_argument(
+        "--backend",
+        choices=["float", "onnx_int8"],
+        default=os.getenv("EMBED_SERVER_BACKEND", "float"),
+        help="Backend của model chạy trong dịch vụ",
+    )
+    parser.add_argument("--max-batch-size", type=int, default=int(os.getenv("EMBED_SERVER_MAX_BATCH", "32")))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("EMBED_SERVER_MAX_WAIT_MS", "10")))
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    logger.info(f"Đang tải embedding model (backend {args.backend})")
+    embed_model = create_embed_model(args.backend)
+    batcher = MicroBatcher(embed_model, args.max_batch_size, args.max_wait_ms)
+    handler = make_handler(batcher, embed_model.model_name, args.request_timeout)
+
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    logger.info(f"Dịch vụ embedding chạy tại http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Dừng dịch vụ embedding: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
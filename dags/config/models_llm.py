@@ -1,19 +1,50 @@
 from dotenv import load_dotenv
-from llama_index.llms.ollama import Ollama
-from llama_index.core import Settings
-import openai
-from llama_index.llms.gemini import Gemini
-from llama_index.llms.openai import OpenAI
+import threading
 load_dotenv()
 import os
 
+# Các client LLM được tạo ở lần đầu tiên cần đến qua các hàm get_*, import module
+# này không import thư viện LLM nào. Các tên cũ (llm_gpt4o, llm_qwen25_3b,
+# llm_deepseek_r1_1b) vẫn dùng được qua __getattr__ ở cuối file.
+
 # API_KEY_GOOGLE_GENIMI = os.getenv("API_KEY_GOOGLE_GENIMI")
 API_KEY_OPENAI = os.getenv("API_KEY_OPENAI")
 
-llm_qwen25_3b = Ollama(model="qwen2.5:3b", request_timeout=1000.0)
-llm_deepseek_r1_1b = Ollama(model="deepseek-r1:1.5b", request_timeout=200.0)
+_lock = threading.Lock()
+_llms = {}
+
+def _get_or_create(name, factory):
+    llm = _llms.get(name)
+    if llm is None:
+        with _lock:
+            llm = _llms.get(name)
+            if llm is None:
+                llm = _llms[name] = factory()
+    return llm
+
+def get_llm_qwen25_3b():
+    from llama_index.llms.ollama import Ollama
+    return _get_or_create("qwen25_3b", lambda: Ollama(model="qwen2.5:3b", request_timeout=1000.0))
+
+def get_llm_deepseek_r1_1b():
+    from llama_index.llms.ollama import Ollama
+    return _get_or_create("deepseek_r1_1b", lambda: Ollama(model="deepseek-r1:1.5b", request_timeout=200.0))
 
 # llm_openai = OpenAI(model="gpt-4o", api_key=API_KEY_OPENAI)
 # llm_gemini25_pro = Gemini(model="models/gemini-2.0-flash", api_key=API_KEY_GOOGLE_GENIMI)
 
-llm_gpt4o = OpenAI(model="gpt-4o", api_key=API_KEY_OPENAI)
+def get_llm_gpt4o():
+    from llama_index.llms.openai import OpenAI
+    return _get_or_create("gpt4o", lambda: OpenAI(model="gpt-4o", api_key=API_KEY_OPENAI))
+
+_LAZY_ATTRIBUTES = {
+    "llm_qwen25_3b": get_llm_qwen25_3b,
+    "llm_deepseek_r1_1b": get_llm_deepseek_r1_1b,
+    "llm_gpt4o": get_llm_gpt4o,
+}
+
+def __getattr__(name):
+    # Giữ tương thích với "from config.models_llm import llm_gpt4o" (PEP 562)
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
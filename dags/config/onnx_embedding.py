@@ -0,0 +1,94 @@
+import os
+import threading
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+# Tên file model trong thư mục export (xem scripts/export_onnx_embedding.py)
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """
+    Embedding bge-m3 chạy bằng onnxruntime trên CPU từ bản export ONNX lượng tử hóa int8.
+
+    Kết quả tương đương bge-m3 float32 (vector dense lấy từ token [CLS] rồi chuẩn hóa
+    về độ dài 1) nhưng nhanh hơn trên CPU và chiếm ít bộ nhớ hơn. Mức sai khác so với
+    model float được kiểm tra bằng scripts/embedding_parity.py.
+
+    Cần cài thêm: onnxruntime, transformers.
+    """
+
+    model_dir: str = Field(description="Thư mục chứa file ONNX và tokenizer.")
+    max_length: int = Field(default=8192, description="Số token tối đa của một đoạn văn bản.")
+    num_threads: int = Field(default=0, description="Số luồng onnxruntime (0 - tự chọn).")
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: List[str] = PrivateAttr()
+    _lock: Any = PrivateAttr()
+
+    def __init__(self, model_dir: str, **kwargs: Any):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "EMBED_BACKEND=onnx_int8 cần onnxruntime và transformers: "
+                "pip install onnxruntime transformers"
+            ) from e
+
+        kwargs.setdefault("model_name", f"onnx:{model_dir}")
+        super().__init__(model_dir=model_dir, **kwargs)
+
+        model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"Không tìm thấy {model_path}, hãy chạy scripts/export_onnx_embedding.py trước"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.num_threads > 0:
+            options.intra_op_num_threads = self.num_threads
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = [model_input.name for model_input in self._session.get_inputs()]
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        # Tokenizer fast của transformers không an toàn khi dùng từ nhiều luồng
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[Embedding]:
+        import numpy as np
+
+        with self._lock:
+            encoded = self._tokenizer(
+                texts,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+        inputs = {name: encoded[name].astype(np.int64) for name in self._input_names if name in encoded}
+        last_hidden_state = self._session.run(None, inputs)[0]
+        # bge-m3 dùng vector của token [CLS] làm vector dense
+        vectors = last_hidden_state[:, 0]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.clip(norms, 1e-12, None)
+        return vectors.tolist()
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed(texts)
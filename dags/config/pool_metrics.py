@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolStats:
+    """
+    Thống kê thời gian chờ lấy kết nối (wait) và thời gian giữ kết nối (checkout)
+    của một connection pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.checkins = 0
+        self.total_held = 0.0
+        self.max_held = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def record_held(self, seconds: float) -> None:
+        with self._lock:
+            self.checkins += 1
+            self.total_held += seconds
+            self.max_held = max(self.max_held, seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Trả về số lần lấy kết nối, số lần hết thời gian chờ và thời gian chờ/giữ (ms)."""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": 1000 * self.total_wait / self.checkouts if self.checkouts else 0.0,
+                "max_wait_ms": 1000 * self.max_wait,
+                "avg_held_ms": 1000 * self.total_held / self.checkins if self.checkins else 0.0,
+                "max_held_ms": 1000 * self.max_held,
+            }
+
+
+class _TimedPoolMixin:
+    """Đo thời gian chờ mỗi lần lấy kết nối ra khỏi pool."""
+
+    # Gán bởi instrument_pool; pool tạo lại sau engine.dispose() không còn thống kê
+    stats = None
+
+    def _do_get(self):
+        if self.stats is None:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool có thống kê thời gian chờ."""
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool có thống kê thời gian chờ."""
+
+
+def instrument_pool(engine, stats: PoolStats) -> None:
+    """
+    Gắn thống kê vào pool của engine (sync hoặc sync_engine của async engine).
+
+    Pool phải được tạo với poolclass TimedQueuePool/TimedAsyncQueuePool để đo thời
+    gian chờ; thời gian giữ kết nối được đo bằng sự kiện checkout/checkin.
+    """
+    pool = engine.pool
+    pool.stats = stats
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checkout_at"] = time.perf_counter()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        checkout_at = connection_record.info.pop("checkout_at", None)
+        if checkout_at is not None:
+            stats.record_held(time.perf_counter() - checkout_at)
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field
+
+
+class RemoteEmbedding(BaseEmbedding):
+    """
+    Client của dịch vụ embedding (dags/config/embedding_server.py), dùng thay cho
+    embedding model tải trong tiến trình.
+
+    Mọi lời gọi được gửi qua HTTP tới dịch vụ; các lời gọi đồng thời từ nhiều tiến
+    trình được dịch vụ gom thành micro-batch nên cả máy chỉ cần một bản model.
+    """
+
+    base_url: str = Field(description="Địa chỉ dịch vụ embedding, ví dụ http://127.0.0.1:8765.")
+    timeout: float = Field(default=120.0, description="Thời gian chờ tối đa mỗi yêu cầu (giây).")
+
+    def __init__(self, base_url: str, **kwargs: Any):
+        kwargs.setdefault("model_name", f"remote:{base_url}")
+        # Dịch vụ tự chia batch, client gửi nhiều văn bản trong một yêu cầu
+        kwargs.setdefault("embed_batch_size", 64)
+        super().__init__(base_url=base_url.rstrip("/"), **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RemoteEmbedding"
+
+    def _post(self, texts: List[str], kind: str) -> List[Embedding]:
+        request = urllib.request.Request(
+            f"{self.base_url}/embed",
+            data=json.dumps({"texts": texts, "kind": kind}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())["embeddings"]
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"Dịch vụ embedding trả lỗi {e.code}: {detail}") from e
+        except urllib.error.URLError as e:
+            raise RuntimeError(f"Không kết nối được dịch vụ embedding {self.base_url}: {e.reason}") from e
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._post([query], "query")[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._post([text], "text")[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._post(texts, "text")
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from airflow.operators.dummy import DummyOperator
+from airflow.exceptions import AirflowException, AirflowSkipException
+from airflow.stats import Stats
+from datetime import datetime, timedelta
+
+# Package chatbot dùng import tương đối tới dags/config nên được import qua "dags.src.chatbot"
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+# Số mã được index đồng thời (mỗi mã một task, phân phối trên các Celery worker)
+REPORT_INDEX_PARALLELISM = int(os.getenv("REPORT_INDEX_PARALLELISM", "4"))
+# Chỉ index các mã này (phân cách bằng dấu phẩy), để trống - mọi mã có file trong REPORT_DATA_DIR
+REPORT_INDEX_SYMBOLS = [
+    symbol.strip().upper() for symbol in os.getenv("REPORT_INDEX_SYMBOLS", "").split(",") if symbol.strip()
+]
+
+default_args = {
+    'owner': 'airflow',
+    'start_date': datetime(2025, 4, 8),
+    'retries': 2,
+    'retry_delay': timedelta(minutes=15),  # Thử lại riêng mã bị lỗi sau 15 phút
+    'email_on_failure': True,
+}
+
+with DAG('etl_report_index',
+         default_args=default_args,
+         schedule_interval='0 2 * * *',  # Chạy lúc 2:00 hằng ngày
+         catchup=False,
+         max_active_runs=1) as dag:
+
+    start = DummyOperator(task_id='start')
+
+    def discover_reports_task():
+        """Tìm các mã có file báo cáo mới, thay đổi hoặc bị xóa kể từ lần index trước"""
+        from dags.src.chatbot.index_to_vectostore import (
+            REPORT_DATA_DIR, discover_report_files, has_pending_changes, report_table_name,
+        )
+
+        try:
+            discovered = discover_report_files(REPORT_DATA_DIR, REPORT_INDEX_SYMBOLS or None)
+            pending = [
+                symbol for symbol, files in discovered.items()
+                if has_pending_changes(report_table_name(symbol), files, symbol=symbol)
+            ]
+        except Exception as e:
+            print(f"Lỗi khi tìm file báo cáo: {str(e)}")
+            raise AirflowException(f"Discover thất bại: {str(e)}")
+
+        print(f"Tìm thấy báo cáo của {len(discovered)} mã trong {REPORT_DATA_DIR}, {len(pending)} mã cần index")
+        if not pending:
+            raise AirflowSkipException("Không có báo cáo mới cần index")
+        return [{'symbol': symbol} for symbol in pending]
+
+    def index_symbol_task(symbol):
+        """Index báo cáo của một mã, ghi lại thời gian index"""
+        from dags.src.chatbot.index_to_vectostore import (
+            REPORT_DATA_DIR, discover_report_files, load_data_vectostore, report_table_name,
+        )
+
+        files = discover_report_files(REPORT_DATA_DIR, [symbol]).get(symbol, [])
+        started = time.perf_counter()
+        try:
+            # Manifest chỉ index lại file thay đổi nên lần thử lại không làm lại phần đã xong
+            load_data_vectostore(report_table_name(symbol), files, symbol=symbol)
+        except Exception as e:
+            print(f"Lỗi khi index {symbol}: {str(e)}")
+            raise AirflowException(f"Index {symbol} thất bại: {str(e)}")
+        duration = time.perf_counter() - started
+
+        Stats.timing(f'report_index.duration.{symbol}', timedelta(seconds=duration))
+        print(f"Đã index {len(files)} file của {symbol} trong {duration:.1f}s")
+        return {'symbol': symbol, 'files': len(files), 'duration_seconds': round(duration, 2)}
+
+    def summarize_index_task(**context):
+        """Tổng hợp thời gian index của các mã, liệt kê các mã thất bại"""
+        results = [result for result in context['ti'].xcom_pull(task_ids='index_symbol') or [] if result]
+        for result in sorted(results, key=lambda item: item['duration_seconds'], reverse=True):
+            print(f"{result['symbol']}: {result['files']} file, {result['duration_seconds']}s")
+
+        pending = context['ti'].xcom_pull(task_ids='discover_reports') or []
+        failed = sorted({item['symbol'] for item in pending} - {result['symbol'] for result in results})
+        total = sum(result['duration_seconds'] for result in results)
+        print(f"Hoàn thành: {len(results)} mã, tổng thời gian index {total:.1f}s")
+        if failed:
+            raise AirflowException(f"Index thất bại {len(failed)} mã: {', '.join(failed)}")
+
+    # Định nghĩa các task
+    discover_reports = PythonOperator(
+        task_id='discover_reports',
+        python_callable=discover_reports_task
+    )
+
+    # Mỗi mã một task instance: thử lại, log và thời gian chạy tách riêng theo mã
+    index_symbol = PythonOperator.partial(
+        task_id='index_symbol',
+        python_callable=index_symbol_task,
+        max_active_tis_per_dag=REPORT_INDEX_PARALLELISM,
+    ).expand(op_kwargs=discover_reports.output)
+
+    summarize_index = PythonOperator(
+        task_id='summarize_index',
+        python_callable=summarize_index_task,
+        provide_context=True,
+        trigger_rule='all_done'
+    )
+
+    end = DummyOperator(task_id='end')
+
+    # Thiết lập thứ tự thực thi
+    start >> discover_reports >> index_symbol >> summarize_index >> end
@@ -1,6 +1,12 @@
-from .agent_stock import chatbot_agent
+# Các hàm của agent_stock chỉ được import ở lần đầu truy cập (PEP 562), nên
+# "import dags.src.chatbot" không kéo theo llama-index, embedding model hay LLM.
+__all__ = [
+    "chatbot_agent", "stream_chatbot_agent"
+]
 
 
-__all__ = [
-    "chatbot_agent"
-]
\ No newline at end of file
+def __getattr__(name):
+    if name in __all__:
+        from . import agent_stock
+        return getattr(agent_stock, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
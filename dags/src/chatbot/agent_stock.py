@@ -1,20 +1,35 @@
 import logging
 import os
 import pandas as pd
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterator, List
 from dotenv import load_dotenv
-import nest_asyncio
 from llama_index.core.tools import QueryEngineTool, FunctionTool
 from llama_index.core.agent import ReActAgent, FunctionCallingAgent
 from llama_index.core.chat_engine import SimpleChatEngine
 from ...config.database import engine
-from ...config.models_llm import llm_gpt4o
-from .index_to_vectostore import load_data_vectostore, load_indexs
+from ...config.models_llm import get_llm_gpt4o
+from ...config.vectostore import get_vector_pool_stats
+from .index_to_vectostore import (
+    REPORT_SIMILARITY_TOP_K, VECTOR_STORE_LAYOUT, apply_nest_asyncio, discover_report_files, load_data_vectostore,
+    load_indexs, get_index_versions, report_table_name, symbol_filters,
+)
+from .answer_cache import SemanticAnswerCache
+from .context_compression import compression_stats, create_compression_postprocessors
+from .embedding_cache import query_embed_model, start_embedding_scope
+from .hierarchical_retriever import HIERARCHICAL_SUMMARY_TOP_K, create_hierarchical_query_engine
+from .hybrid_retriever import HYBRID_SIMILARITY_TOP_K, RETRIEVAL_MODE, create_hybrid_query_engine
+from .index_pool import LazyQueryEngine, index_pool
+from .parallel_agent import ParallelFunctionCallingAgent
+from .registry import ToolRegistry
+from .rerank import create_report_postprocessors
+from .report_metadata import REPORT_FILTER_INFERENCE, infer_report_filters
+from .report_summary import HIERARCHICAL_RETRIEVAL, summary_table_name
+from .question_parser import QuestionParser, answer_from_sql, classify_question_type
+from .router import TickerRouter, log_prompt_savings
 from .function_calling.function import StockAnalyzer
 
 # Thiết lập cơ bản
 load_dotenv()
-nest_asyncio.apply()
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO)
@@ -178,6 +193,12 @@ def analyze_vn30_performance(stock_symbol: Optional[str] = None, top_n: int = 5,
     analyzer = StockAnalyzer(engine)
     return analyzer.analyze_vn30_performance(stock_symbol, top_n, period)
 
+def get_report_item(stock_symbol: str, item_name: str, year: Optional[int] = None,
+                    quarter: Optional[int] = None) -> pd.DataFrame:
+    """Tra cứu một chỉ tiêu trong báo cáo tài chính (doanh thu, lợi nhuận, tài sản, ...)."""
+    analyzer = StockAnalyzer(engine)
+    return analyzer.get_report_item(stock_symbol, item_name, year, quarter)
+
 def analyze_sector_comparison(stock_symbol: str) -> Dict:
     """So sánh mã chứng khoán với ngành."""
     analyzer = StockAnalyzer(engine)
@@ -185,17 +206,117 @@ def analyze_sector_comparison(stock_symbol: str) -> Dict:
     return {"message": f"Phân tích so sánh {stock_symbol} với ngành"}
 
 # Khởi tạo vector stores (giữ nguyên)
-def initialize_vector_stores():
-    """Khởi tạo vector store cho tất cả mã chứng khoán."""
-    base_dir = r"D:\project\Chatbot_VNstock\data"
-    for symbol in VN30_SYMBOLS:
+def initialize_vector_stores(data_dir: Optional[str] = None) -> Dict[str, str]:
+    """
+    Khởi tạo vector store cho tất cả mã chứng khoán (chạy tuần tự).
+
+    Mỗi mã chỉ index các file báo cáo của chính nó trong REPORT_DATA_DIR. DAG
+    etl_report_index làm việc tương tự theo lịch, song song theo mã.
+
+    Returns:
+        dict: {mã: lỗi} của các mã index thất bại.
+    """
+    failures = {}
+    for symbol, files in discover_report_files(data_dir, VN30_SYMBOLS).items():
         try:
-            table_name = f"{symbol}_financials_report"
-            logger.info(f"Đang xử lý: {symbol}")
-            load_data_vectostore(table_name, base_dir)
+            logger.info(f"Đang xử lý: {symbol} ({len(files)} file)")
+            load_data_vectostore(report_table_name(symbol), files, symbol=symbol)
         except Exception as e:
             logger.error(f"Lỗi xử lý {symbol}: {str(e)}")
-            continue
+            failures[symbol] = str(e)
+    if failures:
+        logger.error(f"Index thất bại {len(failures)} mã: {', '.join(failures)}")
+    return failures
+
+# Tạo công cụ báo cáo tài chính cho một mã chứng khoán
+def create_report_tool(symbol: str) -> QueryEngineTool:
+    """
+    Tạo công cụ truy vấn báo cáo tài chính của một mã chứng khoán.
+
+    Index của mã chỉ được tải khi công cụ được gọi lần đầu và được giữ trong index_pool.
+    Với bảng dùng chung, truy vấn được lọc theo metadata symbol.
+    """
+    query_engine_kwargs = {
+        "similarity_top_k": REPORT_SIMILARITY_TOP_K,
+        "llm": get_llm_gpt4o(),
+        "node_postprocessors": create_report_postprocessors() + create_compression_postprocessors(),
+    }
+    if RETRIEVAL_MODE == "hybrid":
+        query_engine_kwargs["similarity_top_k"] = HYBRID_SIMILARITY_TOP_K
+        query_engine_kwargs["query_engine_factory"] = create_hybrid_query_engine
+    if HIERARCHICAL_RETRIEVAL:
+        query_engine_kwargs["query_engine_factory"] = create_hierarchical_query_engine
+        query_engine_kwargs["hybrid"] = RETRIEVAL_MODE == "hybrid"
+    if REPORT_FILTER_INFERENCE:
+        query_engine_kwargs["filter_inferrer"] = infer_report_filters
+    if VECTOR_STORE_LAYOUT == "shared":
+        query_engine_kwargs["filters"] = symbol_filters([symbol])
+    query_engine = LazyQueryEngine(report_table_name(symbol), index_pool, **query_engine_kwargs)
+    return QueryEngineTool.from_defaults(
+        query_engine=query_engine,
+        name=f"financial_report_{symbol}",
+        description=f"""
+        Công cụ truy vấn báo cáo tài chính của {symbol}.
+        
+        SỬ DỤNG KHI:
+        - Cần thông tin về tình hình tài chính của {symbol}
+        - Phân tích doanh thu, lợi nhuận, tài sản, nợ của {symbol}
+        - So sánh hiệu quả kinh doanh qua các năm
+        - Đánh giá sức khỏe tài chính tổng thể
+        
+        KHÔNG SỬ DỤNG KHI:
+        - Cần dữ liệu giá cổ phiếu theo thời gian
+        - Cần chỉ số kỹ thuật (RSI, MACD, v.v.)
+        - So sánh hiệu suất với các mã khác
+        """
+    )
+
+# Tạo công cụ báo cáo tài chính cho nhiều mã (chỉ dùng với bảng dùng chung)
+def create_multi_report_tool(symbols: List[str]) -> QueryEngineTool:
+    """
+    Tạo công cụ truy vấn báo cáo tài chính của nhiều mã cùng lúc.
+
+    Mọi mã nằm trong bảng dùng chung nên một câu hỏi so sánh chỉ cần một truy vấn
+    ANN lọc theo symbol thay vì một truy vấn cho mỗi mã.
+    """
+    query_engine_kwargs = {
+        "similarity_top_k": max(REPORT_SIMILARITY_TOP_K, 5 * len(symbols)),
+        "node_postprocessors": create_report_postprocessors(len(symbols)) + create_compression_postprocessors(),
+    }
+    if RETRIEVAL_MODE == "hybrid":
+        query_engine_kwargs["similarity_top_k"] = HYBRID_SIMILARITY_TOP_K * len(symbols)
+        query_engine_kwargs["query_engine_factory"] = create_hybrid_query_engine
+    if HIERARCHICAL_RETRIEVAL:
+        query_engine_kwargs["query_engine_factory"] = create_hierarchical_query_engine
+        query_engine_kwargs["hybrid"] = RETRIEVAL_MODE == "hybrid"
+        query_engine_kwargs["summary_top_k"] = HIERARCHICAL_SUMMARY_TOP_K * len(symbols)
+    if REPORT_FILTER_INFERENCE:
+        query_engine_kwargs["filter_inferrer"] = infer_report_filters
+    query_engine = LazyQueryEngine(
+        report_table_name(symbols[0]),
+        index_pool,
+        llm=get_llm_gpt4o(),
+        filters=symbol_filters(symbols),
+        **query_engine_kwargs,
+    )
+    symbols_text = ", ".join(symbols)
+    return QueryEngineTool.from_defaults(
+        query_engine=query_engine,
+        name="financial_report_multi",
+        description=f"""
+        Công cụ truy vấn báo cáo tài chính của các mã {symbols_text} trong một lần gọi.
+        Mỗi đoạn kết quả có metadata symbol, year, quarter, statement_type cho biết thuộc mã,
+        kỳ và phần báo cáo nào.
+        
+        SỬ DỤNG KHI:
+        - Cần so sánh tình hình tài chính giữa {symbols_text}
+        - Phân tích doanh thu, lợi nhuận, tài sản, nợ của nhiều mã cùng lúc
+        
+        KHÔNG SỬ DỤNG KHI:
+        - Cần dữ liệu giá cổ phiếu theo thời gian
+        - Cần chỉ số kỹ thuật (RSI, MACD, v.v.)
+        """
+    )
 
 # Tạo query engines (giữ nguyên nhưng cải thiện description)
 def create_query_engines():
@@ -203,67 +324,16 @@ def create_query_engines():
     query_engine_tools = []
     for symbol in VN30_SYMBOLS:
         try:
-            table_name = f"{symbol}_financials_report"
-            index = load_indexs(table_name)
-            query_engine = index.as_query_engine(similarity_top_k=10, llm=llm_gpt4o)
-            query_engine_tools.append(
-                QueryEngineTool.from_defaults(
-                    query_engine=query_engine,
-                    name=f"financial_report_{symbol}",
-                    description=f"""
-                    Công cụ truy vấn báo cáo tài chính của {symbol}.
-                    
-                    SỬ DỤNG KHI:
-                    - Cần thông tin về tình hình tài chính của {symbol}
-                    - Phân tích doanh thu, lợi nhuận, tài sản, nợ của {symbol}
-                    - So sánh hiệu quả kinh doanh qua các năm
-                    - Đánh giá sức khỏe tài chính tổng thể
-                    
-                    KHÔNG SỬ DỤNG KHI:
-                    - Cần dữ liệu giá cổ phiếu theo thời gian
-                    - Cần chỉ số kỹ thuật (RSI, MACD, v.v.)
-                    - So sánh hiệu suất với các mã khác
-                    """
-                )
-            )
+            query_engine_tools.append(create_report_tool(symbol))
         except Exception as e:
             logger.warning(f"Không tải được {symbol}: {str(e)}")
             continue
     return query_engine_tools
 
-# Phân loại loại câu hỏi
-def classify_question_type(text: str) -> Dict[str, bool]:
-    """Phân loại loại câu hỏi để chọn chuyên gia phù hợp."""
-    text_lower = text.lower()
-    
-    # Keywords cho từng loại phân tích
-    fundamental_keywords = ['pe', 'pb', 'roe', 'roa', 'eps', 'doanh thu', 'lợi nhuận', 'tài chính', 'báo cáo', 'định giá']
-    technical_keywords = ['rsi', 'macd', 'sma', 'ema', 'xu hướng', 'tăng', 'giảm', 'kỹ thuật', 'biểu đồ']
-    news_keywords = ['tin tức', 'vĩ mô', 'chính sách', 'kinh tế', 'thị trường', 'ảnh hưởng']
-    comparison_keywords = ['so sánh', 'tốt nhất', 'xếp hạng', 'top', 'nên chọn']
-    
-    return {
-        'fundamental': any(keyword in text_lower for keyword in fundamental_keywords),
-        'technical': any(keyword in text_lower for keyword in technical_keywords),
-        'news': any(keyword in text_lower for keyword in news_keywords),
-        'comparison': any(keyword in text_lower for keyword in comparison_keywords),
-        'investment_decision': any(word in text_lower for word in ['nên', 'mua', 'bán', 'đầu tư', 'khuyến nghị'])
-    }
-
-# Hàm tư vấn thông minh chính
-def intelligent_stock_advisor(text: str):
-    """Hệ thống tư vấn chứng khoán thông minh với khả năng tự động chọn công cụ."""
-    
-    logger.info(f"Câu hỏi: {text}")
-    
-    # Phân loại câu hỏi
-    question_type = classify_question_type(text)
-    logger.info(f"Loại câu hỏi: {question_type}")
-    
-    # Tạo các công cụ
-    query_engine_tools = create_query_engines()
-    
-    function_tools = [
+# Tạo các công cụ truy vấn dữ liệu
+def create_function_tools() -> List[FunctionTool]:
+    """Tạo danh sách FunctionTool truy vấn dữ liệu giá và chỉ số tài chính."""
+    return [
         FunctionTool.from_defaults(
             analyze_stock_price_summary,
             name="price_summary_tool",
@@ -283,24 +353,208 @@ def intelligent_stock_advisor(text: str):
             analyze_vn30_performance,
             name="vn30_performance_tool",
             description="So sánh hiệu suất các mã VN30. Sử dụng khi cần xếp hạng hoặc so sánh."
+        ),
+        FunctionTool.from_defaults(
+            get_report_item,
+            name="report_item_tool",
+            description=(
+                "Tra cứu số liệu trong báo cáo tài chính (doanh thu thuần, lợi nhuận sau thuế, tổng tài sản, "
+                "vốn chủ sở hữu, lưu chuyển tiền thuần, ...) theo mã, tên chỉ tiêu, năm, quý (quý 0 là báo cáo năm). "
+                "Giá trị tính bằng đồng. Ưu tiên dùng trước công cụ báo cáo tài chính khi chỉ cần một con số; "
+                "nếu không có kết quả thì dùng công cụ báo cáo tài chính."
+            )
         )
     ]
-    
-    all_tools = query_engine_tools + function_tools
-    
-    # Tạo agent chính thông minh
-    main_agent = ReActAgent.from_tools(
-        tools=all_tools,
-        llm=llm_gpt4o,
+
+def get_report_index_versions(symbols) -> Dict[str, int]:
+    """Lấy phiên bản index của bảng báo cáo tài chính theo từng mã."""
+    versions = get_index_versions({report_table_name(symbol) for symbol in symbols})
+    return {symbol: versions[report_table_name(symbol)] for symbol in symbols}
+
+def invalidate_report_index(symbol: str) -> None:
+    """
+    Làm mới dữ liệu báo cáo của một mã sau khi được index lại.
+
+    Loại index (và BM25 gắn với nó) của bảng báo cáo và bảng tóm tắt khỏi index_pool,
+    và xóa các câu trả lời đã cache liên quan đến mã.
+    """
+    table_name = report_table_name(symbol)
+    index_pool.invalidate(table_name)
+    index_pool.invalidate(summary_table_name(table_name))
+    answer_cache.invalidate([symbol])
+
+# Registry dùng chung trong tiến trình: công cụ chỉ được tạo một lần và chỉ
+# tạo lại khi bảng vector được index lại hoặc danh sách mã thay đổi
+tool_registry = ToolRegistry(
+    symbols_provider=lambda: VN30_SYMBOLS,
+    report_tool_factory=create_report_tool,
+    function_tools_factory=create_function_tools,
+    version_provider=get_report_index_versions,
+    refresh_interval=float(os.getenv("TOOL_REGISTRY_REFRESH_SECONDS", "60")),
+    on_stale=invalidate_report_index,
+)
+
+# Bộ định tuyến mã chứng khoán, trie được xây dựng từ Dim_Company ở lần dùng đầu tiên
+ticker_router = TickerRouter(engine, fallback_symbols=VN30_SYMBOLS)
+
+def select_tools(symbols: List[str]) -> List:
+    """
+    Chọn các công cụ đưa cho agent dựa trên các mã được nhắc đến trong câu hỏi.
+
+    Chỉ giữ công cụ báo cáo của các mã đó cùng các FunctionTool; nếu không nhận ra
+    mã nào có báo cáo thì giữ nguyên toàn bộ công cụ. Với bảng dùng chung, câu hỏi
+    nhắc đến nhiều mã dùng một công cụ báo cáo chung cho các mã đó.
+    """
+    all_tools = tool_registry.get_tools()
+    report_symbols = [symbol for symbol in symbols if tool_registry.get_report_tool(symbol) is not None]
+    if not report_symbols:
+        return all_tools
+
+    if VECTOR_STORE_LAYOUT == "shared" and len(report_symbols) > 1:
+        report_tools = [create_multi_report_tool(report_symbols)]
+    else:
+        report_tools = [tool_registry.get_report_tool(symbol) for symbol in report_symbols]
+
+    routed_tools = report_tools + tool_registry.get_function_tools()
+    log_prompt_savings(all_tools, routed_tools)
+    return routed_tools
+
+# Cache câu trả lời theo ngữ nghĩa, tự xóa khi ETL nạp dữ liệu mới cho các mã liên quan
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+answer_cache = SemanticAnswerCache(
+    query_embed_model,
+    engine,
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400")),
+)
+
+def lookup_cached_answer(text: str, symbols: List[str]):
+    """
+    Tra cache câu trả lời cho câu hỏi.
+
+    Returns:
+        Tuple (câu trả lời đã lưu hoặc None, vector của câu hỏi để lưu câu trả lời mới).
+        Vector là None nếu cache bị tắt hoặc không nhúng được câu hỏi.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None, None
+    try:
+        question_embedding = answer_cache.embed(text)
+        cached_answer = answer_cache.get(text, question_embedding, symbols)
+        logger.info(f"Answer cache: {answer_cache.stats()}")
+        return cached_answer, question_embedding
+    except Exception as e:
+        logger.warning(f"Không tra được cache câu trả lời: {str(e)}")
+        return None, None
+
+# Câu hỏi tra cứu số liệu đơn thuần (chỉ số, giá đóng cửa của một mã) được trả lời
+# trực tiếp bằng SQL, không qua agent và LLM
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.9"))
+question_parser = QuestionParser(engine, ticker_router)
+
+def try_fast_path(text: str, symbols: List[str]) -> Optional[str]:
+    """
+    Trả lời câu hỏi tra cứu số liệu bằng SQL nếu phân tích được với độ tin cậy đủ cao.
+
+    Returns:
+        Optional[str]: Câu trả lời, None nếu câu hỏi cần đến agent.
+    """
+    try:
+        parsed = question_parser.parse(text, symbols)
+        logger.info(f"Phân tích câu hỏi: {parsed}")
+        if parsed.confidence < FAST_PATH_MIN_CONFIDENCE:
+            return None
+        answer = answer_from_sql(parsed, StockAnalyzer(engine))
+        if answer is not None:
+            logger.info(f"Trả lời bằng SQL, bỏ qua agent ({parsed.intent}: {parsed.ratio_name or ''})")
+        return answer
+    except Exception as e:
+        logger.warning(f"Không trả lời được bằng SQL, chuyển sang agent: {str(e)}")
+        return None
+
+def create_agent(tools: List) -> ReActAgent:
+    """
+    Tạo agent chính từ các công cụ đã có trong registry.
+
+    Agent được tạo mới cho mỗi câu hỏi vì nó giữ bộ nhớ hội thoại riêng; việc này
+    chỉ là ghép nối đối tượng, phần tốn kém (vector store, index) đã được registry giữ lại.
+    """
+    return ReActAgent.from_tools(
+        tools=tools,
+        llm=get_llm_gpt4o(),
         verbose=True,
         system_prompt=INTELLIGENT_ADVISOR_PROMPT
     )
+
+# Chế độ agent của mỗi bản triển khai: "react" (ReActAgent) hoặc
+# "function_calling" (gọi hàm gốc của model, chạy song song các công cụ trong một lượt)
+AGENT_MODE = os.getenv("AGENT_MODE", "react").lower()
+
+def run_react_agent(tools: List, prompt: str, stream_final: bool = True):
+    """
+    Chạy ReActAgent từng bước, phát sự kiện mỗi khi một công cụ chạy xong.
+
+    Yields:
+        Sự kiện {"type": "tool", ...} và {"type": "token", ...} (nếu stream_final).
+
+    Returns:
+        Tuple (câu trả lời cuối cùng, số lượt gọi LLM).
+    """
+    main_agent = create_agent(tools)
+    task = main_agent.create_task(prompt)
+    reported_sources = 0
+    round_trips = 0
+    while True:
+        # Mỗi bước của ReActAgent là một lượt gọi LLM
+        round_trips += 1
+        if stream_final:
+            step_output = main_agent.stream_step(task.task_id)
+        else:
+            step_output = main_agent.run_step(task.task_id)
+        
+        sources = main_agent.get_task(task.task_id).extra_state.get("sources", [])
+        for tool_output in sources[reported_sources:]:
+            yield {"type": "tool", "tool": tool_output.tool_name, "input": str(tool_output.raw_input)}
+        reported_sources = len(sources)
+        
+        if step_output.is_last:
+            break
+    
+    if not stream_final:
+        response = main_agent.finalize_response(task.task_id, step_output)
+        return str(response), round_trips
     
-    # Xây dựng prompt dựa trên loại câu hỏi
-    enhanced_prompt = f"""
+    answer_parts = []
+    for token in step_output.output.response_gen:
+        answer_parts.append(token)
+        yield {"type": "token", "content": token}
+    main_agent.finalize_response(task.task_id, step_output)
+    return "".join(answer_parts), round_trips
+
+def run_agent(tools: List, prompt: str, stream_final: bool = True):
+    """
+    Chạy agent chính theo AGENT_MODE.
+
+    Returns:
+        Tuple (câu trả lời cuối cùng, số lượt gọi LLM).
+    """
+    if AGENT_MODE == "function_calling":
+        agent = ParallelFunctionCallingAgent(
+            tools, get_llm_gpt4o(), system_prompt=INTELLIGENT_ADVISOR_PROMPT
+        )
+        answer = yield from agent.run(prompt, stream_final=stream_final)
+        return answer, agent.round_trips
+    return (yield from run_react_agent(tools, prompt, stream_final=stream_final))
+
+# Xây dựng prompt dựa trên loại câu hỏi
+def build_analysis_prompt(text: str, question_type: Dict[str, bool], symbols: List[str]) -> str:
+    """Tạo prompt cho agent chính từ câu hỏi và kết quả phân loại."""
+    return f"""
     **CÂU HỎI NGƯỜI DÙNG:** {text}
     
     **PHÂN TÍCH CÂU HỎI:**
+    - Mã chứng khoán nhận diện: {', '.join(symbols) if symbols else 'Không rõ'}
     - Cần phân tích cơ bản: {'Có' if question_type['fundamental'] else 'Không'}
     - Cần phân tích kỹ thuật: {'Có' if question_type['technical'] else 'Không'}  
     - Cần tin tức vĩ mô: {'Có' if question_type['news'] else 'Không'}
@@ -318,21 +572,12 @@ def intelligent_stock_advisor(text: str):
     
     Hãy trả lời một cách toàn diện và chuyên nghiệp.
     """
-    
-    # Thực hiện phân tích
-    try:
-        response = main_agent.chat(enhanced_prompt)
-        
-        # Nếu cần khuyến nghị đầu tư, tạo thêm agent chuyên về khuyến nghị
-        if question_type['investment_decision']:
-            strategist_agent = SimpleChatEngine.from_defaults(
-                llm=llm_gpt4o,
-                system_prompt=INVESTMENT_STRATEGIST_PROMPT
-            )
-            
-            final_prompt = f"""
+
+def build_strategist_prompt(text: str, analysis: str) -> str:
+    """Tạo prompt cho chuyên gia chiến lược từ kết quả phân tích của agent chính."""
+    return f"""
             **DỮ LIỆU PHÂN TÍCH:**
-            {str(response)}
+            {analysis}
             
             **YÊU CẦU:** 
             Dựa trên dữ liệu trên, hãy đưa ra khuyến nghị đầu tư cuối cùng cho câu hỏi: "{text}"
@@ -343,21 +588,104 @@ def intelligent_stock_advisor(text: str):
             3. **Khuyến nghị cuối cùng: MUA/BÁN/GIỮ** (in đậm)
             4. **Lý do và điều kiện theo dõi** (2-3 câu)
             """
-            
-            final_response = strategist_agent.chat(final_prompt)
-            return str(final_response)
+
+# Hàm tư vấn thông minh chính (dạng stream)
+def stream_intelligent_stock_advisor(text: str) -> Iterator[Dict[str, str]]:
+    """
+    Hệ thống tư vấn chứng khoán thông minh, trả kết quả dần dần dưới dạng sự kiện.
+
+    Yields:
+        Dict[str, str]: Một trong các sự kiện
+            - {"type": "tool", "tool": tên công cụ, "input": tham số}: agent vừa gọi xong một công cụ
+            - {"type": "status", "content": ...}: thông báo tiến trình
+            - {"type": "token", "content": ...}: một đoạn của câu trả lời cuối cùng
+            - {"type": "error", "content": ...}: thông báo lỗi (sự kiện cuối cùng)
+    """
+    logger.info(f"Câu hỏi: {text}")
+    start_embedding_scope()
+    
+    # Phân loại câu hỏi
+    question_type = classify_question_type(text)
+    logger.info(f"Loại câu hỏi: {question_type}")
+    
+    # Nhận diện mã chứng khoán
+    symbols = ticker_router.extract_symbols(text)
+    logger.info(f"Mã chứng khoán nhận diện: {symbols}")
+    
+    # Tra cứu số liệu đơn thuần: trả lời bằng SQL
+    fast_answer = try_fast_path(text, symbols)
+    if fast_answer is not None:
+        yield {"type": "token", "content": fast_answer}
+        return
+    
+    # Dùng lại câu trả lời của câu hỏi tương tự nếu dữ liệu chưa thay đổi
+    cached_answer, question_embedding = lookup_cached_answer(text, symbols)
+    if cached_answer is not None:
+        yield {"type": "token", "content": cached_answer}
+        return
+    
+    answer_parts = []
+    try:
+        apply_nest_asyncio()
+        
+        # Chỉ đưa cho agent các công cụ liên quan
+        tools = select_tools(symbols)
+        prompt = build_analysis_prompt(text, question_type, symbols)
+        
+        # Nếu cần khuyến nghị đầu tư thì câu trả lời cuối đến từ chuyên gia chiến lược,
+        # nên agent chính chạy không stream
+        needs_strategist = question_type['investment_decision']
+        analysis, round_trips = yield from run_agent(tools, prompt, stream_final=not needs_strategist)
+        
+        if needs_strategist:
+            yield {"type": "status", "content": "Đang tổng hợp khuyến nghị đầu tư"}
+            strategist_agent = SimpleChatEngine.from_defaults(
+                llm=get_llm_gpt4o(),
+                system_prompt=INVESTMENT_STRATEGIST_PROMPT
+            )
+            round_trips += 1
+            for token in strategist_agent.stream_chat(build_strategist_prompt(text, analysis)).response_gen:
+                answer_parts.append(token)
+                yield {"type": "token", "content": token}
+            answer = "".join(answer_parts)
+        else:
+            answer = analysis
         
-        return str(response)
+        logger.info(f"Số lượt gọi LLM cho câu hỏi ({AGENT_MODE}): {round_trips}")
+        logger.info(f"Cache vector câu truy vấn: {query_embed_model.stats()}")
+        logger.info(f"Connection pool vector DB: {get_vector_pool_stats()}")
+        if compression_stats.queries:
+            logger.info(f"Nén context: {compression_stats.snapshot()}")
+        if question_embedding is not None:
+            answer_cache.put(text, question_embedding, symbols, answer)
         
     except Exception as e:
         logger.error(f"Lỗi trong quá trình phân tích: {str(e)}")
-        return f"Xin lỗi, đã xảy ra lỗi trong quá trình phân tích: {str(e)}. Vui lòng thử lại hoặc điều chỉnh câu hỏi."
+        yield {
+            "type": "error",
+            "content": f"Xin lỗi, đã xảy ra lỗi trong quá trình phân tích: {str(e)}. Vui lòng thử lại hoặc điều chỉnh câu hỏi."
+        }
+
+# Hàm tư vấn thông minh chính
+def intelligent_stock_advisor(text: str):
+    """Hệ thống tư vấn chứng khoán thông minh với khả năng tự động chọn công cụ."""
+    answer_parts = []
+    for event in stream_intelligent_stock_advisor(text):
+        if event["type"] == "token":
+            answer_parts.append(event["content"])
+        elif event["type"] == "error":
+            return event["content"]
+    return "".join(answer_parts)
 
 # Hàm wrapper cho việc sử dụng (giữ tương thích với code cũ)
 def chatbot_agent(text: str):
     """Wrapper function để giữ tương thích với code cũ."""
     return intelligent_stock_advisor(text)
 
+def stream_chatbot_agent(text: str) -> Iterator[Dict[str, str]]:
+    """Wrapper dạng stream cho giao diện Streamlit."""
+    return stream_intelligent_stock_advisor(text)
+
 # # Ví dụ sử dụng
 # if __name__ == "__main__":
 #     # Test cases
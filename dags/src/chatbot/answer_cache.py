@@ -0,0 +1,231 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_PATTERN = re.compile(r"\d+")
+
+# Mốc dữ liệu theo mã: thay đổi khi etl_quote_daily (Fact_StockPrice), etl_quarterly
+# (Fact_FinancialRatios) hoặc etl_report_index (Fact_ReportItems) nạp dữ liệu mới cho mã đó
+WATERMARK_QUERY = """
+SELECT c."StockSymbol", 'price' AS "Source", MAX(f."TimeKey") AS "MaxTimeKey", COUNT(*) AS "Rows"
+FROM "Fact_StockPrice" f
+JOIN "Dim_Company" c ON f."StockKey" = c."StockKey"
+GROUP BY c."StockSymbol"
+UNION ALL
+SELECT c."StockSymbol", 'ratio' AS "Source", MAX(f."TimeKey") AS "MaxTimeKey", COUNT(*) AS "Rows"
+FROM "Fact_FinancialRatios" f
+JOIN "Dim_Company" c ON f."StockKey" = c."StockKey"
+GROUP BY c."StockSymbol"
+UNION ALL
+SELECT c."StockSymbol", 'report' AS "Source", MAX(f."Year" * 10 + f."Quarter") AS "MaxTimeKey", COUNT(*) AS "Rows"
+FROM "Fact_ReportItems" f
+JOIN "Dim_Company" c ON f."StockKey" = c."StockKey"
+GROUP BY c."StockSymbol"
+"""
+
+
+@dataclass
+class CacheEntry:
+    """Một câu trả lời đã lưu trong cache."""
+    question: str
+    embedding: np.ndarray
+    answer: str
+    symbols: FrozenSet[str]
+    numbers: FrozenSet[str]
+    created_at: float = field(default_factory=time.time)
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời theo ngữ nghĩa của câu hỏi.
+
+    Câu hỏi được nhúng bằng embedding model đang dùng (bge-m3); một câu trả lời đã
+    lưu được dùng lại khi câu hỏi mới nhắc đến đúng các mã đó, cùng các con số
+    (năm, quý...) và có độ tương đồng cosine không thấp hơn ngưỡng.
+
+    Các mục bị loại theo LRU khi vượt quá số lượng tối đa, khi hết hạn, và khi
+    data warehouse có dữ liệu mới cho các mã liên quan.
+    """
+
+    def __init__(
+        self,
+        embed_model,
+        engine=None,
+        threshold: float = 0.92,
+        max_entries: int = 512,
+        ttl_seconds: float = 86400.0,
+        watermark_interval: float = 60.0,
+    ):
+        """
+        Khởi tạo cache.
+
+        Args:
+            embed_model: Embedding model dùng để nhúng câu hỏi.
+            engine: SQLAlchemy engine của data warehouse, dùng để phát hiện dữ liệu mới.
+                None - không kiểm tra.
+            threshold: Ngưỡng cosine tối thiểu để coi hai câu hỏi là một.
+            max_entries: Số câu trả lời tối đa được giữ.
+            ttl_seconds: Thời gian sống tối đa của một câu trả lời.
+            watermark_interval: Số giây tối thiểu giữa hai lần kiểm tra dữ liệu mới.
+        """
+        self.embed_model = embed_model
+        self.engine = engine
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.watermark_interval = watermark_interval
+
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._watermarks: Optional[Dict[Tuple[str, str], Tuple[int, int]]] = None
+        self._last_watermark_check = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, question: str) -> np.ndarray:
+        """Nhúng câu hỏi và chuẩn hóa vector về độ dài 1."""
+        vector = np.asarray(self.embed_model.get_query_embedding(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, question: str, embedding: np.ndarray, symbols: Sequence[str]) -> Optional[str]:
+        """
+        Tìm câu trả lời đã lưu cho một câu hỏi.
+
+        Args:
+            question: Câu hỏi của người dùng.
+            embedding: Vector của câu hỏi (từ embed()).
+            symbols: Các mã chứng khoán được nhắc đến trong câu hỏi.
+
+        Returns:
+            Optional[str]: Câu trả lời đã lưu, None nếu không có.
+        """
+        self._refresh_watermarks()
+        key_symbols = frozenset(symbols)
+        key_numbers = self._numbers(question)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, -1.0
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry.created_at > self.ttl_seconds:
+                    del self._entries[entry_id]
+                    continue
+                if entry.symbols != key_symbols or entry.numbers != key_numbers:
+                    continue
+                score = float(np.dot(entry.embedding, embedding))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                entry = self._entries[best_id]
+                logger.info(f"Cache hit (cosine={best_score:.3f}) cho câu hỏi: {entry.question}")
+                return entry.answer
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, embedding: np.ndarray, symbols: Sequence[str], answer: str) -> None:
+        """Lưu câu trả lời của một câu hỏi, loại mục cũ nhất nếu cache đầy."""
+        entry = CacheEntry(
+            question=question,
+            embedding=embedding,
+            answer=answer,
+            symbols=frozenset(symbols),
+            numbers=self._numbers(question),
+        )
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, symbols: Optional[Sequence[str]] = None) -> int:
+        """
+        Xóa các câu trả lời liên quan đến các mã chứng khoán.
+
+        Câu trả lời không gắn với mã nào (ví dụ câu hỏi về toàn thị trường) luôn bị xóa.
+
+        Args:
+            symbols: Danh sách mã có dữ liệu mới. None - xóa toàn bộ cache.
+
+        Returns:
+            int: Số câu trả lời đã xóa.
+        """
+        with self._lock:
+            if symbols is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            changed = set(symbols)
+            stale = [
+                entry_id for entry_id, entry in self._entries.items()
+                if not entry.symbols or entry.symbols & changed
+            ]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            return len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        """Trả về số lần hit, miss, tỷ lệ hit và số câu trả lời đang lưu."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+    @staticmethod
+    def _numbers(question: str) -> FrozenSet[str]:
+        # Các con số (năm, quý, số ngày...) phải khớp chính xác, vì câu hỏi về quý 1
+        # và quý 2 có embedding gần như giống nhau nhưng câu trả lời khác nhau
+        return frozenset(_NUMBER_PATTERN.findall(question))
+
+    def _refresh_watermarks(self) -> None:
+        """Xóa câu trả lời của các mã vừa được ETL nạp dữ liệu mới."""
+        if self.engine is None:
+            return
+        now = time.monotonic()
+        if now - self._last_watermark_check < self.watermark_interval:
+            return
+        self._last_watermark_check = now
+
+        try:
+            with Session(self.engine) as session:
+                result = pd.read_sql(text(WATERMARK_QUERY), session.connection())
+        except Exception as e:
+            logger.warning(f"Không kiểm tra được dữ liệu mới cho cache: {str(e)}")
+            return
+
+        watermarks = {
+            (row.StockSymbol, row.Source): (int(row.MaxTimeKey), int(row.Rows))
+            for row in result.itertuples(index=False)
+        }
+        previous = self._watermarks
+        self._watermarks = watermarks
+        if previous is None:
+            return
+
+        changed: List[str] = sorted({
+            symbol for (symbol, source), mark in watermarks.items()
+            if previous.get((symbol, source)) != mark
+        })
+        if changed:
+            removed = self.invalidate(changed)
+            logger.info(f"Dữ liệu mới cho {changed}, xóa {removed} câu trả lời khỏi cache")
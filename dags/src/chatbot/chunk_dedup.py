@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .index_manifest import INDEX_CACHE_DIR, _write_json
+from .router import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Phát hiện đoạn gần trùng (header/footer, đoạn thuyết minh lặp lại giữa các trang của
+# cùng một báo cáo) khi index: đoạn trùng chỉ được nhúng và lưu một lần
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+# Số bit khác nhau tối đa giữa hai SimHash 64 bit để coi là gần trùng
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+# Đoạn ngắn hơn số từ này không được gộp (dễ trùng ngẫu nhiên)
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "40"))
+
+_SIMHASH_BITS = 64
+_SHINGLE_SIZE = 3
+_NUMBER_PATTERN = re.compile(r"\d[\d.,]*")
+_BIT_WEIGHTS = np.uint64(1) << np.arange(_SIMHASH_BITS, dtype=np.uint64)
+
+
+def simhash(value: str) -> int:
+    """
+    SimHash 64 bit của một đoạn văn bản theo các cụm 3 từ liên tiếp (đã bỏ dấu).
+
+    Hai đoạn chỉ khác vài từ (số trang, ngày ký) có SimHash khác nhau ít bit.
+    """
+    words = tokenize(value)
+    shingles = Counter(
+        " ".join(words[i:i + _SHINGLE_SIZE]) for i in range(max(len(words) - _SHINGLE_SIZE + 1, 1))
+    )
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+         for shingle in shingles],
+        dtype=np.uint64,
+    )
+    weights = np.array(list(shingles.values()), dtype=np.int64)
+    bits = ((hashes[:, None] & _BIT_WEIGHTS) != 0).astype(np.int64)
+    totals = weights @ (2 * bits - 1)
+    return sum(1 << bit for bit, total in enumerate(totals) if total > 0)
+
+
+def numbers_signature(value: str) -> str:
+    """
+    Hash của các số trong đoạn.
+
+    Hai bảng số liệu cùng tên chỉ tiêu nhưng khác kỳ có chữ gần giống nhau; chỉ coi là
+    trùng khi các số cũng giống hệt, để không bao giờ gộp số liệu của hai kỳ.
+    """
+    numbers = sorted(_NUMBER_PATTERN.findall(value))
+    return hashlib.sha1(" ".join(numbers).encode("utf-8")).hexdigest()[:16]
+
+
+class ChunkDedupIndex:
+    """
+    Chỉ mục SimHash của các đoạn đã lưu trong một phạm vi index (như IndexManifest).
+
+    Mỗi node lưu SimHash, chữ ký số, nhóm metadata và danh sách file nguồn dùng chung
+    node đó. Tìm gần trùng bằng cách chia SimHash thành DEDUP_MAX_DISTANCE + 1 dải
+    bit: hai hash khác nhau không quá DEDUP_MAX_DISTANCE bit thì chắc chắn trùng nhau
+    ở ít nhất một dải, nên chỉ cần so với các node cùng dải.
+
+    Chỉ gộp các đoạn cùng nhóm metadata (các khóa dùng để lọc khi truy vấn: mã, năm,
+    quý, phần báo cáo, file). Node dùng chung chỉ mang metadata của đoạn được lưu đầu
+    tiên, nên gộp đoạn của hai báo cáo khác nhau sẽ làm truy vấn có lọc theo kỳ hoặc
+    theo file bỏ sót đoạn của báo cáo sau.
+
+    Cấu trúc file:
+        {"nodes": {node_id: {"simhash": ..., "numbers": ..., "group": ..., "sources": [đường dẫn file]}}}
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        cache_dir: str = INDEX_CACHE_DIR,
+        max_distance: int = DEDUP_MAX_DISTANCE,
+        min_words: int = DEDUP_MIN_WORDS,
+    ):
+        """
+        Args:
+            scope: Tên phạm vi, cùng tên với IndexManifest.
+            cache_dir: Thư mục chứa chỉ mục.
+            max_distance: Số bit khác nhau tối đa để coi là gần trùng.
+            min_words: Số từ tối thiểu của một đoạn để được gộp.
+        """
+        safe_scope = re.sub(r"[^A-Za-z0-9_.-]", "_", scope)
+        self.path = os.path.join(cache_dir, "dedup", f"{safe_scope}.json")
+        self.max_distance = max_distance
+        self.min_words = min_words
+        bands = max_distance + 1
+        self._band_width = _SIMHASH_BITS // bands
+        self._band_count = bands
+        self.nodes: Dict[str, Dict] = {}
+        self._bands: Dict[tuple, List[str]] = defaultdict(list)
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for node_id, entry in json.load(f).get("nodes", {}).items():
+                    self._insert(node_id, entry)
+
+    def _band_keys(self, value: int) -> List[tuple]:
+        mask = (1 << self._band_width) - 1
+        return [(band, (value >> (band * self._band_width)) & mask) for band in range(self._band_count)]
+
+    def _insert(self, node_id: str, entry: Dict) -> None:
+        self.nodes[node_id] = entry
+        for key in self._band_keys(int(entry["simhash"], 16)):
+            self._bands[key].append(node_id)
+
+    def find_duplicate(self, value: str, group: str = "") -> Optional[str]:
+        """node_id của một đoạn đã lưu cùng nhóm metadata gần trùng với đoạn này, None nếu không có."""
+        if len(tokenize(value)) < self.min_words:
+            return None
+        fingerprint = simhash(value)
+        numbers = numbers_signature(value)
+        for key in self._band_keys(fingerprint):
+            for node_id in self._bands.get(key, []):
+                entry = self.nodes.get(node_id)
+                if entry is None or entry["numbers"] != numbers or entry.get("group") != group:
+                    continue
+                if bin(fingerprint ^ int(entry["simhash"], 16)).count("1") <= self.max_distance:
+                    return node_id
+        return None
+
+    def add(self, node_id: str, value: str, source: str, group: str = "") -> None:
+        """Ghi nhận một đoạn mới được lưu cùng nhóm metadata của nó."""
+        if len(tokenize(value)) < self.min_words:
+            return
+        self._insert(node_id, {
+            "simhash": f"{simhash(value):016x}",
+            "numbers": numbers_signature(value),
+            "group": group,
+            "sources": [source],
+        })
+
+    def link(self, node_id: str, source: str) -> None:
+        """Ghi nhận một file nguồn khác dùng chung node đã lưu."""
+        sources = self.nodes[node_id]["sources"]
+        if source not in sources:
+            sources.append(source)
+
+    def release(self, node_id: str, source: str) -> bool:
+        """
+        Bỏ liên kết giữa một node và một file nguồn.
+
+        Returns:
+            bool: True nếu không còn file nào dùng node (node cần được xóa khỏi vector store).
+        """
+        entry = self.nodes.get(node_id)
+        if entry is None:
+            return True
+        if source in entry["sources"]:
+            entry["sources"].remove(source)
+        if entry["sources"]:
+            return False
+        del self.nodes[node_id]
+        for key in self._band_keys(int(entry["simhash"], 16)):
+            self._bands[key].remove(node_id)
+        return True
+
+    def clear(self) -> None:
+        """Xóa toàn bộ chỉ mục (khi phạm vi được index lại từ đầu)."""
+        self.nodes.clear()
+        self._bands.clear()
+
+    def dedup_ratio(self) -> float:
+        """Tỷ lệ số liên kết (file, đoạn) được phục vụ bởi một node dùng chung với file khác."""
+        links = sum(len(entry["sources"]) for entry in self.nodes.values())
+        return (links - len(self.nodes)) / links if links else 0.0
+
+    def save(self) -> None:
+        """Ghi chỉ mục xuống đĩa."""
+        _write_json(self.path, {"nodes": self.nodes})
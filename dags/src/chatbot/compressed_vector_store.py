@@ -0,0 +1,191 @@
+import logging
+from typing import Any, List, Optional
+
+from llama_index.core.vector_stores.types import MetadataFilters
+from llama_index.vector_stores.postgres import PGVectorStore
+from sqlalchemy import text
+
+from ...config.vectostore import disable_statement_timeout
+
+logger = logging.getLogger(__name__)
+
+
+class CompressedPGVectorStore(PGVectorStore):
+    """
+    PGVectorStore lưu vector ở dạng half precision (halfvec), có thể kèm lượt tìm
+    kiếm đầu bằng vector nhị phân.
+
+    - halfvec: cột embedding kiểu halfvec(dim), HNSW halfvec_cosine_ops. Bảng và
+      index nhỏ khoảng một nửa so với vector float32.
+    - binary_first_pass: thêm HNSW trên binary_quantize(embedding)::bit(dim) (nhỏ
+      hơn khoảng 16 lần so với halfvec). Truy vấn lấy top_k * rescore_factor ứng
+      viên theo khoảng cách Hamming rồi xếp hạng lại bằng cosine trên vector halfvec
+      đầy đủ chiều.
+
+    Độ phủ và độ trễ so với bảng vector hiện tại được đo bằng
+    scripts/benchmark_vector_storage.py.
+    """
+
+    binary_first_pass: bool = False
+    rescore_factor: int = 4
+
+    def __init__(self, binary_first_pass: bool = False, rescore_factor: int = 4, **kwargs: Any):
+        """
+        Args:
+            binary_first_pass: Tìm ứng viên bằng index nhị phân rồi xếp hạng lại.
+            rescore_factor: Số ứng viên của lượt đầu bằng top_k nhân hệ số này.
+            **kwargs: Tham số của PGVectorStore (use_halfvec luôn bật).
+        """
+        kwargs["use_halfvec"] = True
+        super().__init__(**kwargs)
+        self.binary_first_pass = binary_first_pass
+        self.rescore_factor = max(1, rescore_factor)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CompressedPGVectorStore"
+
+    def _create_hnsw_index(self) -> None:
+        super()._create_hnsw_index()
+        if not self.binary_first_pass:
+            return
+        table_name = self._table_class.__tablename__
+        with self._session() as session, session.begin():
+            session.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS {table_name}_embedding_bit_idx "
+                    f"ON {self.schema_name}.{table_name} "
+                    f"USING hnsw ((binary_quantize(embedding)::bit({self.embed_dim})) bit_hamming_ops)"
+                )
+            )
+
+    def _build_query(
+        self,
+        embedding: Optional[List[float]],
+        limit: int = 10,
+        metadata_filters: Optional[MetadataFilters] = None,
+    ) -> Any:
+        if not self.binary_first_pass:
+            return super()._build_query(embedding, limit, metadata_filters)
+
+        from pgvector.sqlalchemy import BIT, HALFVEC
+        from sqlalchemy import cast, func, literal, select
+
+        table = self._table_class
+        query_vector = cast(literal(embedding, HALFVEC(self.embed_dim)), HALFVEC(self.embed_dim))
+        # Biểu thức phải giống hệt biểu thức của index nhị phân để Postgres dùng index
+        hamming_distance = cast(func.binary_quantize(table.embedding), BIT(self.embed_dim)).op("<~>")(
+            cast(func.binary_quantize(query_vector), BIT(self.embed_dim))
+        )
+        candidates = select(
+            table.id,
+            table.node_id,
+            table.text,
+            table.metadata_,
+            table.embedding,
+        ).order_by(hamming_distance)
+        candidates = self._apply_filters_and_limit(
+            candidates, limit * self.rescore_factor, metadata_filters
+        ).subquery()
+
+        distance = candidates.c.embedding.cosine_distance(query_vector).label("distance")
+        return (
+            select(
+                candidates.c.id,
+                candidates.c.node_id,
+                candidates.c.text,
+                candidates.c.metadata_,
+                distance,
+            )
+            .order_by(distance)
+            .limit(limit)
+        )
+
+    def _first_pass_kwargs(self, limit: int, kwargs: dict) -> dict:
+        # hnsw.ef_search giới hạn số dòng index trả về, phải đủ cho toàn bộ ứng viên
+        if self.binary_first_pass and self.hnsw_kwargs:
+            ef_search = kwargs.get("hnsw_ef_search") or self.hnsw_kwargs["hnsw_ef_search"]
+            kwargs = {**kwargs, "hnsw_ef_search": max(ef_search, limit * self.rescore_factor)}
+        return kwargs
+
+    def _query_with_score(self, embedding, limit=10, metadata_filters=None, **kwargs):
+        return super()._query_with_score(
+            embedding, limit, metadata_filters, **self._first_pass_kwargs(limit, kwargs)
+        )
+
+    async def _aquery_with_score(self, embedding, limit=10, metadata_filters=None, **kwargs):
+        return await super()._aquery_with_score(
+            embedding, limit, metadata_filters, **self._first_pass_kwargs(limit, kwargs)
+        )
+
+
+def convert_table_to_halfvec(
+    engine,
+    table_name: str,
+    embed_dim: int = 1024,
+    hnsw_m: int = 16,
+    hnsw_ef_construction: int = 64,
+    binary_index: bool = False,
+) -> None:
+    """
+    Chuyển cột embedding của một bảng vector đã có sang halfvec và tạo lại HNSW.
+
+    Bảng đã dùng halfvec không bị đổi kiểu cột, chỉ được tạo các HNSW còn thiếu.
+
+    Đổi kiểu cột và tạo index trên bảng thật chạy lâu hơn nhiều so với
+    statement_timeout của pool dùng chung, nên được chạy trong một transaction đã
+    tắt giới hạn này.
+
+    Args:
+        engine: Engine đồng bộ của vector DB.
+        table_name: Tên bảng (như khi truyền vào load_indexs).
+        embed_dim: Số chiều vector.
+        hnsw_m: Tham số m của HNSW mới.
+        hnsw_ef_construction: Tham số ef_construction của HNSW mới.
+        binary_index: Tạo thêm HNSW nhị phân (VECTOR_STORAGE_MODE=halfvec_binary).
+    """
+    data_table = f"data_{table_name.lower()}"
+    with engine.begin() as connection:
+        disable_statement_timeout(connection)
+        column_type = connection.execute(
+            text(
+                """
+                SELECT format_type(atttypid, atttypmod)
+                FROM pg_attribute
+                WHERE attrelid = to_regclass(:table) AND attname = 'embedding'
+                """
+            ),
+            {"table": f"public.{data_table}"},
+        ).scalar()
+        if column_type is None:
+            raise ValueError(f"Không tìm thấy bảng {data_table}")
+        converted = not column_type.startswith("halfvec")
+        if converted:
+            connection.execute(text(f"DROP INDEX IF EXISTS public.{data_table}_embedding_idx"))
+            connection.execute(
+                text(
+                    f"ALTER TABLE public.{data_table} "
+                    f"ALTER COLUMN embedding TYPE halfvec({embed_dim}) USING embedding::halfvec({embed_dim})"
+                )
+            )
+        else:
+            logger.info(f"Bảng {data_table} đã dùng halfvec, chỉ tạo các index còn thiếu")
+        # Bảng đã là halfvec vẫn tạo index còn thiếu ở đây (nhất là index nhị phân khi
+        # chuyển sang halfvec_binary) thay vì để store tạo dưới statement_timeout của pool.
+        # Cùng tên index với PGVectorStore để store không tạo lại khi khởi tạo
+        connection.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS {data_table}_embedding_idx ON public.{data_table} "
+                f"USING hnsw (embedding halfvec_cosine_ops) "
+                f"WITH (m = {hnsw_m}, ef_construction = {hnsw_ef_construction})"
+            )
+        )
+        if binary_index:
+            connection.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS {data_table}_embedding_bit_idx ON public.{data_table} "
+                    f"USING hnsw ((binary_quantize(embedding)::bit({embed_dim})) bit_hamming_ops)"
+                )
+            )
+    if converted:
+        logger.info(f"Đã chuyển {data_table} từ {column_type} sang halfvec({embed_dim})")
@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.utils import get_tokenizer
+
+from .embedding_cache import query_embed_model
+from .hybrid_retriever import VIETNAMESE_STOPWORDS
+from .router import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Nén các đoạn báo cáo trước khi đưa vào LLM: chỉ giữ câu và dòng bảng liên quan
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "false").lower() == "true"
+# Điểm tối thiểu (cosine với câu hỏi + thưởng từ khóa) để giữ một câu/dòng bảng
+COMPRESSION_MIN_SCORE = float(os.getenv("COMPRESSION_MIN_SCORE", "0.55"))
+# Luôn giữ ít nhất số câu/dòng có điểm cao nhất này trong mỗi đoạn
+COMPRESSION_MIN_UNITS = int(os.getenv("COMPRESSION_MIN_UNITS", "2"))
+# Trọng số thưởng cho tỷ lệ từ khóa của câu hỏi xuất hiện trong câu/dòng
+COMPRESSION_LEXICAL_WEIGHT = float(os.getenv("COMPRESSION_LEXICAL_WEIGHT", "0.3"))
+# Số vector câu/dòng giữ trong cache của tiến trình (các đoạn hay được truy xuất lại)
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", "20000"))
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+(?=[^\s\d])")
+_TABLE_SEPARATOR = re.compile(r"^\|?[\s:\-|]+\|?$")
+
+# Các loại đơn vị trong một đoạn
+_HEADING, _TABLE_HEADER, _TABLE_SEPARATOR_ROW, _TABLE_ROW, _SENTENCE = range(5)
+
+
+def split_units(content: str) -> List[Dict[str, Any]]:
+    """
+    Tách nội dung markdown của một đoạn thành các đơn vị: tiêu đề, dòng bảng, câu.
+
+    Mỗi đơn vị ghi lại tiêu đề và tiêu đề bảng mà nó thuộc về để khi giữ một dòng
+    bảng thì giữ cả dòng tiêu đề cột, khi giữ một câu thì giữ cả tiêu đề mục.
+    """
+    units: List[Dict[str, Any]] = []
+    heading: Optional[int] = None
+    table_header: Optional[int] = None
+    previous_is_table = False
+    for line in content.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            previous_is_table = False
+            continue
+        if stripped.startswith("#"):
+            heading = len(units)
+            units.append({"kind": _HEADING, "text": stripped, "heading": None, "table_header": None})
+            previous_is_table = False
+        elif stripped.startswith("|"):
+            if _TABLE_SEPARATOR.match(stripped):
+                units.append({"kind": _TABLE_SEPARATOR_ROW, "text": stripped, "heading": heading,
+                              "table_header": table_header})
+            elif not previous_is_table:
+                table_header = len(units)
+                units.append({"kind": _TABLE_HEADER, "text": stripped, "heading": heading, "table_header": None})
+            else:
+                units.append({"kind": _TABLE_ROW, "text": stripped, "heading": heading,
+                              "table_header": table_header})
+            previous_is_table = True
+        else:
+            for sentence in _SENTENCE_BOUNDARY.split(stripped):
+                if sentence.strip():
+                    units.append({"kind": _SENTENCE, "text": sentence.strip(), "heading": heading,
+                                  "table_header": None})
+            previous_is_table = False
+    return units
+
+
+def _keywords(value: str) -> set:
+    return {token for token in tokenize(value) if token not in VIETNAMESE_STOPWORDS}
+
+
+class CompressionStats:
+    """Thống kê tỷ lệ nén (token sau nén / token trước nén) của cả tiến trình."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.original_tokens = 0
+        self.compressed_tokens = 0
+
+    def record(self, original_tokens: int, compressed_tokens: int) -> None:
+        with self._lock:
+            self.queries += 1
+            self.original_tokens += original_tokens
+            self.compressed_tokens += compressed_tokens
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "original_tokens": self.original_tokens,
+                "compressed_tokens": self.compressed_tokens,
+                "compression_ratio": (
+                    self.compressed_tokens / self.original_tokens if self.original_tokens else 1.0
+                ),
+            }
+
+
+compression_stats = CompressionStats()
+
+_unit_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_unit_cache_lock = threading.Lock()
+
+
+def _embed_units(texts: List[str]) -> np.ndarray:
+    # Vector của câu/dòng được cache theo hash nội dung, chỉ nhúng những câu chưa có
+    keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+    vectors: Dict[str, np.ndarray] = {}
+    with _unit_cache_lock:
+        for key in keys:
+            if key in _unit_cache:
+                _unit_cache.move_to_end(key)
+                vectors[key] = _unit_cache[key]
+    missing = [(key, text) for key, text in zip(keys, texts) if key not in vectors]
+    if missing:
+        embeddings = query_embed_model.get_text_embedding_batch([text for _, text in missing])
+        with _unit_cache_lock:
+            for (key, _), embedding in zip(missing, embeddings):
+                vector = np.asarray(embedding, dtype=np.float32)
+                vector /= max(float(np.linalg.norm(vector)), 1e-12)
+                vectors[key] = vector
+                _unit_cache[key] = vector
+            while len(_unit_cache) > COMPRESSION_CACHE_SIZE:
+                _unit_cache.popitem(last=False)
+    return np.stack([vectors[key] for key in keys])
+
+
+class ContextCompressionPostprocessor(BaseNodePostprocessor):
+    """
+    Nén trích xuất các đoạn báo cáo: chỉ giữ câu và dòng bảng liên quan đến câu hỏi.
+
+    Mỗi đơn vị (câu, dòng bảng) được chấm bằng cosine giữa vector của nó và vector câu
+    hỏi (cùng embedding model bge-m3 đang dùng để truy xuất) cộng thêm phần thưởng
+    theo tỷ lệ từ khóa của câu hỏi (tên chỉ tiêu, năm, mã) có trong đơn vị. Đơn vị
+    được giữ nếu đạt min_score hoặc thuộc min_units đơn vị điểm cao nhất của đoạn;
+    dòng tiêu đề cột và tiêu đề mục tương ứng được giữ kèm, thứ tự ban đầu không đổi.
+    Tỷ lệ nén được ghi log cho mỗi truy vấn và cộng dồn vào compression_stats.
+    """
+
+    min_score: float = Field(default=COMPRESSION_MIN_SCORE, description="Điểm tối thiểu để giữ một đơn vị.")
+    min_units: int = Field(default=COMPRESSION_MIN_UNITS, description="Số đơn vị tối thiểu giữ lại mỗi đoạn.")
+    lexical_weight: float = Field(default=COMPRESSION_LEXICAL_WEIGHT, description="Trọng số thưởng từ khóa.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextCompressionPostprocessor"
+
+    def _compress(self, content: str, query_vector: np.ndarray, query_keywords: set) -> str:
+        units = split_units(content)
+        scored = [i for i, unit in enumerate(units) if unit["kind"] in (_SENTENCE, _TABLE_ROW)]
+        if len(scored) <= self.min_units:
+            return content
+
+        similarities = _embed_units([units[i]["text"] for i in scored]) @ query_vector
+        scores = {}
+        for i, similarity in zip(scored, similarities):
+            overlap = len(query_keywords & _keywords(units[i]["text"])) / len(query_keywords) if query_keywords else 0.0
+            scores[i] = float(similarity) + self.lexical_weight * overlap
+
+        top = set(sorted(scores, key=scores.get, reverse=True)[:self.min_units])
+        keep = set()
+        for i, score in scores.items():
+            if score < self.min_score and i not in top:
+                continue
+            keep.add(i)
+            unit = units[i]
+            if unit["heading"] is not None:
+                keep.add(unit["heading"])
+            if unit["table_header"] is not None:
+                keep.add(unit["table_header"])
+                # Dòng phân cách ngay sau tiêu đề cột để bảng markdown vẫn hợp lệ
+                separator = unit["table_header"] + 1
+                if separator < len(units) and units[separator]["kind"] == _TABLE_SEPARATOR_ROW:
+                    keep.add(separator)
+
+        lines = []
+        for i, unit in enumerate(units):
+            if i not in keep:
+                continue
+            # Câu liền nhau nối trên một dòng, dòng bảng và tiêu đề giữ dòng riêng
+            if unit["kind"] == _SENTENCE and lines and i - 1 in keep and units[i - 1]["kind"] == _SENTENCE:
+                lines[-1] = f"{lines[-1]} {unit['text']}"
+            else:
+                lines.append(unit["text"])
+        return "\n".join(lines)
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None or not nodes:
+            return nodes
+
+        query_vector = np.asarray(query_embed_model.get_query_embedding(query_bundle.query_str), dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+        query_keywords = _keywords(query_bundle.query_str)
+
+        tokenizer = get_tokenizer()
+        original_tokens = 0
+        compressed_tokens = 0
+        results = []
+        for result in nodes:
+            content = result.node.get_content(metadata_mode=MetadataMode.NONE)
+            compressed = self._compress(content, query_vector, query_keywords)
+            original_tokens += len(tokenizer(content))
+            compressed_tokens += len(tokenizer(compressed))
+            # Node mới để không sửa node gốc đang được BM25/cache dùng chung
+            node = TextNode(
+                id_=result.node.node_id,
+                text=compressed,
+                metadata=result.node.metadata,
+                excluded_llm_metadata_keys=result.node.excluded_llm_metadata_keys,
+                excluded_embed_metadata_keys=result.node.excluded_embed_metadata_keys,
+                relationships=result.node.relationships,
+            )
+            results.append(NodeWithScore(node=node, score=result.score))
+
+        compression_stats.record(original_tokens, compressed_tokens)
+        ratio = compressed_tokens / original_tokens if original_tokens else 1.0
+        logger.info(
+            f"Nén context: {original_tokens} -> {compressed_tokens} token "
+            f"(tỷ lệ {ratio:.2f}, {len(nodes)} đoạn)"
+        )
+        return results
+
+
+def create_compression_postprocessors() -> List[Any]:
+    """Danh sách node_postprocessors nén context (rỗng nếu COMPRESSION_ENABLED=false)."""
+    if not COMPRESSION_ENABLED:
+        return []
+    return [ContextCompressionPostprocessor()]
@@ -0,0 +1,163 @@
+import contextvars
+import logging
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from ...config.vectostore import EMBED_MODEL_NAME, get_embed_model
+
+logger = logging.getLogger(__name__)
+
+# Bộ nhớ tạm vector câu truy vấn trong một lượt hỏi (một câu hỏi của người dùng)
+_request_memo: contextvars.ContextVar[Optional[Dict[str, Embedding]]] = contextvars.ContextVar(
+    "query_embedding_memo", default=None
+)
+
+
+def normalize_query(query: str) -> str:
+    """Chuẩn hóa câu truy vấn làm khóa cache: Unicode NFC, gộp khoảng trắng."""
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+
+def start_embedding_scope() -> None:
+    """
+    Bắt đầu một lượt hỏi mới: các công cụ truy xuất trong lượt dùng chung vector
+    của những câu truy vấn giống nhau.
+
+    Các luồng chạy công cụ song song phải được tạo bằng contextvars.copy_context()
+    để thấy cùng bộ nhớ tạm.
+    """
+    _request_memo.set({})
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Embedding model có cache vector câu truy vấn, đặt trước embedding model thật.
+
+    bge-m3 chạy trên CPU mất hàng trăm mili giây cho mỗi câu truy vấn, trong khi
+    các công cụ financial_report_* của một câu hỏi so sánh thường truy vấn cùng
+    một nội dung. Vector được tra lần lượt ở bộ nhớ tạm của lượt hỏi hiện tại rồi
+    ở cache LRU của tiến trình (theo câu truy vấn đã chuẩn hóa) trước khi gọi model.
+
+    Vector của văn bản khi index không được cache.
+    """
+
+    _inner: Any = PrivateAttr()
+    _inner_factory: Any = PrivateAttr()
+    _cache: "OrderedDict[str, Embedding]" = PrivateAttr()
+    _max_size: int = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(
+        self,
+        inner: Union[BaseEmbedding, Callable[[], BaseEmbedding]],
+        max_size: int = 1024,
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            inner: Embedding model thật, hoặc hàm trả về model đó (model chỉ được
+                tải ở lần nhúng đầu tiên).
+            max_size: Số vector câu truy vấn tối đa giữ trong cache của tiến trình.
+        """
+        if isinstance(inner, BaseEmbedding):
+            kwargs.setdefault("model_name", inner.model_name)
+            kwargs.setdefault("embed_batch_size", inner.embed_batch_size)
+            inner_model, inner_factory = inner, None
+        else:
+            inner_model, inner_factory = None, inner
+        super().__init__(**kwargs)
+        self._inner = inner_model
+        self._inner_factory = inner_factory
+        self._cache = OrderedDict()
+        self._max_size = max_size
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        """Embedding model thật, tải ở lần đầu cần đến."""
+        if self._inner is None:
+            with self._lock:
+                if self._inner is None:
+                    self._inner = self._inner_factory()
+        return self._inner
+
+    def _lookup(self, key: str) -> Optional[Embedding]:
+        memo = _request_memo.get()
+        if memo is not None and key in memo:
+            with self._lock:
+                self._hits += 1
+            return memo[key]
+
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+            else:
+                self._misses += 1
+        if embedding is not None and memo is not None:
+            memo[key] = embedding
+        return embedding
+
+    def _store(self, key: str, embedding: Embedding) -> None:
+        memo = _request_memo.get()
+        if memo is not None:
+            memo[key] = embedding
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = normalize_query(query)
+        embedding = self._lookup(key)
+        if embedding is None:
+            embedding = self.inner.get_query_embedding(query)
+            self._store(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = normalize_query(query)
+        embedding = self._lookup(key)
+        if embedding is None:
+            embedding = await self.inner.aget_query_embedding(query)
+            self._store(key, embedding)
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self.inner.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self.inner.get_text_embedding_batch(texts)
+
+    def stats(self) -> Dict[str, float]:
+        """Trả về số lần hit, miss, tỷ lệ hit và số vector đang lưu."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "size": len(self._cache),
+            }
+
+
+# Embedding model dùng chung cho mọi truy vấn của chatbot
+query_embed_model = CachedEmbedding(
+    get_embed_model,
+    max_size=int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024")),
+    model_name=EMBED_MODEL_NAME,
+)
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 import pandas as pd
 import numpy as np
 from ....config.database import engine
+from ..router import normalize_text
 
 class StockAnalyzer:
     """Lớp để phân tích dữ liệu chứng khoán từ cơ sở dữ liệu PostgreSQL."""
@@ -358,6 +359,131 @@ class StockAnalyzer:
         
         return result
 
+    def get_ratio_value(self, stock_symbol: str, ratio_name: str, year: Optional[int] = None,
+                        quarter: Optional[int] = None) -> pd.DataFrame:
+        """
+        Lấy giá trị một chỉ số tài chính của một mã tại một quý.
+
+        Args:
+            stock_symbol: Mã chứng khoán (ví dụ: 'ACB').
+            ratio_name: Tên chỉ số đúng như trong Dim_Ratio (ví dụ: 'P/E').
+            year: Năm cần lấy (mặc định là None - lấy quý gần nhất có dữ liệu).
+            quarter: Quý cần lấy (mặc định là None - lấy quý gần nhất trong năm).
+
+        Returns:
+            pd.DataFrame: Một dòng gồm Year, Quarter, RatioName, Unit, RatioValue (rỗng nếu không có dữ liệu).
+        """
+        query = """
+        SELECT "Year", "Quarter", "RatioName", "Unit", "RatioValue"
+        FROM vw_QuarterlyFinancialRatios
+        WHERE "StockSymbol" = :stock_symbol AND "RatioName" = :ratio_name
+        """
+
+        params = {"stock_symbol": stock_symbol, "ratio_name": ratio_name}
+
+        if year is not None:
+            query += ' AND "Year" = :year'
+            params["year"] = year
+
+        if quarter is not None:
+            query += ' AND "Quarter" = :quarter'
+            params["quarter"] = quarter
+
+        query += ' ORDER BY "Year" DESC, "Quarter" DESC LIMIT 1'
+
+        with Session(self.engine) as session:
+            result = pd.read_sql(text(query), session.connection(), params=params)
+
+        return result
+
+    def get_close_price(self, stock_symbol: str, to_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        Lấy giá đóng cửa của phiên giao dịch gần nhất tính đến một ngày.
+
+        Args:
+            stock_symbol: Mã chứng khoán (ví dụ: 'ACB').
+            to_date: Ngày giới hạn (định dạng 'YYYY-MM-DD'). Mặc định là None - phiên mới nhất.
+
+        Returns:
+            pd.DataFrame: Một dòng gồm Date, CurrentPrice, PrevClose, DailyChangePercent (rỗng nếu không có dữ liệu).
+        """
+        query = """
+        SELECT "Date", "CurrentPrice", "PrevClose", "DailyChangePercent"
+        FROM vw_StockPriceMovement
+        WHERE "StockSymbol" = :stock_symbol
+        """
+
+        params = {"stock_symbol": stock_symbol}
+
+        if to_date is not None:
+            query += ' AND "Date" <= :to_date'
+            params["to_date"] = to_date
+
+        query += ' ORDER BY "Date" DESC LIMIT 1'
+
+        with Session(self.engine) as session:
+            result = pd.read_sql(text(query), session.connection(), params=params)
+
+        return result
+
+
+    def get_report_item(self, stock_symbol: str, item_name: str, year: Optional[int] = None,
+                        quarter: Optional[int] = None, statement_type: Optional[str] = None) -> pd.DataFrame:
+        """
+        Lấy giá trị một chỉ tiêu trong báo cáo tài chính (Fact_ReportItems) của một mã.
+
+        Tên chỉ tiêu được so khớp không dấu, không phân biệt hoa thường; nếu nhiều chỉ
+        tiêu chứa tên cần tìm thì chọn chỉ tiêu trùng khớp hoàn toàn hoặc ngắn nhất.
+
+        Args:
+            stock_symbol: Mã chứng khoán (ví dụ: 'ACB').
+            item_name: Tên chỉ tiêu (ví dụ: 'Doanh thu thuần', 'Tổng cộng tài sản').
+            year: Năm cần lấy (mặc định là None - các kỳ gần nhất).
+            quarter: Quý cần lấy (0 - báo cáo năm, mặc định là None - mọi kỳ).
+            statement_type: balance_sheet, income_statement hoặc cash_flow (mặc định là None - mọi phần).
+
+        Returns:
+            pd.DataFrame: Tối đa 8 kỳ gần nhất gồm Year, Quarter, StatementType, ItemName, Value (đồng).
+        """
+        item_key = " ".join(normalize_text(item_name).split())
+        filters = ""
+        params = {"stock_symbol": stock_symbol, "item_key": item_key, "pattern": f"%{item_key}%"}
+
+        if statement_type is not None:
+            filters += ' AND r."StatementType" = :statement_type'
+            params["statement_type"] = statement_type
+
+        query = f"""
+        WITH best AS (
+            SELECT r."StatementType", r."ItemKey"
+            FROM "Fact_ReportItems" r
+            JOIN "Dim_Company" c ON r."StockKey" = c."StockKey"
+            WHERE c."StockSymbol" = :stock_symbol AND r."ItemKey" LIKE :pattern{filters}
+            ORDER BY (r."ItemKey" = :item_key) DESC, length(r."ItemKey"), r."Year" DESC
+            LIMIT 1
+        )
+        SELECT r."Year", r."Quarter", r."StatementType", r."ItemName", r."Value"
+        FROM "Fact_ReportItems" r
+        JOIN "Dim_Company" c ON r."StockKey" = c."StockKey"
+        JOIN best b ON r."StatementType" = b."StatementType" AND r."ItemKey" = b."ItemKey"
+        WHERE c."StockSymbol" = :stock_symbol
+        """
+
+        if year is not None:
+            query += ' AND r."Year" = :year'
+            params["year"] = year
+
+        if quarter is not None:
+            query += ' AND r."Quarter" = :quarter'
+            params["quarter"] = quarter
+
+        query += ' ORDER BY r."Year" DESC, r."Quarter" DESC LIMIT 8'
+
+        with Session(self.engine) as session:
+            result = pd.read_sql(text(query), session.connection(), params=params)
+
+        return result
+
 
 # # Ví dụ sử dụng:
 # if __name__ == "__main__":
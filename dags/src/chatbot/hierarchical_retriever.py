@@ -0,0 +1,153 @@
+import logging
+import os
+from typing import Any, List, Optional
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores import FilterCondition, MetadataFilter, MetadataFilters
+
+from .hybrid_retriever import HybridRetriever
+from .index_pool import index_pool
+from .index_to_vectostore import REPORT_SIMILARITY_TOP_K
+from .report_metadata import combine_filters
+from .report_summary import summary_table_name
+
+logger = logging.getLogger(__name__)
+
+# Số tóm tắt (báo cáo hoặc phần báo cáo) được chọn ở tầng thứ nhất cho mỗi mã
+HIERARCHICAL_SUMMARY_TOP_K = int(os.getenv("HIERARCHICAL_SUMMARY_TOP_K", "3"))
+
+
+def selection_filters(summary_results: List[NodeWithScore]) -> Optional[MetadataFilters]:
+    """
+    Bộ lọc giới hạn việc tìm đoạn trong các báo cáo/phần báo cáo đã chọn.
+
+    Tóm tắt phần (level="section") chọn các đoạn cùng file và cùng statement_type,
+    tóm tắt báo cáo (level="report") chọn mọi đoạn của file; các lựa chọn nối bằng OR.
+    """
+    selections = []
+    seen = set()
+    for result in summary_results:
+        metadata = result.node.metadata
+        if not metadata.get("file_name"):
+            continue
+        conditions = [MetadataFilter(key="file_name", value=metadata["file_name"])]
+        if metadata.get("symbol"):
+            conditions.append(MetadataFilter(key="symbol", value=metadata["symbol"]))
+        if metadata.get("level") == "section" and metadata.get("statement_type"):
+            conditions.append(MetadataFilter(key="statement_type", value=metadata["statement_type"]))
+        key = tuple((condition.key, condition.value) for condition in conditions)
+        if key in seen:
+            continue
+        seen.add(key)
+        selections.append(MetadataFilters(filters=conditions))
+    if not selections:
+        return None
+    return MetadataFilters(filters=selections, condition=FilterCondition.OR)
+
+
+class HierarchicalRetriever(BaseRetriever):
+    """
+    Truy xuất hai tầng: tóm tắt trước, đoạn sau.
+
+    Tầng thứ nhất tìm trên bảng tóm tắt (mỗi báo cáo vài node) để chọn summary_top_k
+    báo cáo hoặc phần báo cáo liên quan; tầng thứ hai chỉ tìm đoạn bên trong các phần
+    đã chọn. Bảng tóm tắt nhỏ và số đoạn được xét không tăng theo số năm báo cáo, nên
+    độ trễ và lượng context gần như không đổi khi dữ liệu tích lũy. Nếu tầng thứ nhất
+    không chọn được gì (chưa có tóm tắt) hoặc tầng thứ hai không có kết quả, truy xuất
+    trên toàn bảng như bình thường.
+    """
+
+    def __init__(
+        self,
+        index,
+        summary_index,
+        similarity_top_k: int = REPORT_SIMILARITY_TOP_K,
+        summary_top_k: int = HIERARCHICAL_SUMMARY_TOP_K,
+        filters: Optional[MetadataFilters] = None,
+        hybrid: bool = False,
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            index: VectorStoreIndex của bảng báo cáo.
+            summary_index: VectorStoreIndex của bảng tóm tắt tương ứng.
+            similarity_top_k: Số đoạn trả về.
+            summary_top_k: Số tóm tắt được chọn ở tầng thứ nhất.
+            filters: Bộ lọc metadata áp dụng cho cả hai tầng.
+            hybrid: Tầng thứ hai dùng HybridRetriever thay vì chỉ tìm theo vector.
+        """
+        super().__init__(**kwargs)
+        self._index = index
+        self._similarity_top_k = similarity_top_k
+        self._filters = filters
+        self._hybrid = hybrid
+        self._summary_retriever = summary_index.as_retriever(similarity_top_k=summary_top_k, filters=filters)
+
+    def _chunk_retriever(self, filters: Optional[MetadataFilters]) -> BaseRetriever:
+        if self._hybrid:
+            return HybridRetriever(self._index, similarity_top_k=self._similarity_top_k, filters=filters)
+        return self._index.as_retriever(similarity_top_k=self._similarity_top_k, filters=filters)
+
+    def _selected_filters(self, summary_results: List[NodeWithScore]) -> Optional[MetadataFilters]:
+        selected = selection_filters(summary_results)
+        if selected is None:
+            logger.info("Không có tóm tắt phù hợp, tìm đoạn trên toàn bảng")
+            return None
+        logger.info(
+            "Chọn " + ", ".join(
+                f"{result.node.metadata.get('file_name')}/{result.node.metadata.get('statement_type', 'report')}"
+                for result in summary_results
+            )
+        )
+        return combine_filters(self._filters, selected)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        selected = self._selected_filters(self._summary_retriever.retrieve(query_bundle))
+        if selected is not None:
+            results = self._chunk_retriever(selected).retrieve(query_bundle)
+            if results:
+                return results
+        return self._chunk_retriever(self._filters).retrieve(query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        selected = self._selected_filters(await self._summary_retriever.aretrieve(query_bundle))
+        if selected is not None:
+            results = await self._chunk_retriever(selected).aretrieve(query_bundle)
+            if results:
+                return results
+        return await self._chunk_retriever(self._filters).aretrieve(query_bundle)
+
+
+def create_hierarchical_query_engine(
+    index,
+    similarity_top_k: Optional[int] = None,
+    filters=None,
+    summary_top_k: Optional[int] = None,
+    hybrid: bool = False,
+    **kwargs,
+):
+    """
+    Tạo query engine dùng HierarchicalRetriever, thay cho index.as_query_engine.
+
+    Index của bảng tóm tắt được lấy từ index_pool như index của bảng báo cáo.
+
+    Args:
+        index: VectorStoreIndex của bảng báo cáo.
+        similarity_top_k: Số đoạn đưa vào LLM (None - REPORT_SIMILARITY_TOP_K).
+        filters: Bộ lọc metadata.
+        summary_top_k: Số tóm tắt chọn ở tầng thứ nhất (None - HIERARCHICAL_SUMMARY_TOP_K).
+        hybrid: Tầng thứ hai dùng HybridRetriever.
+        **kwargs: Tham số của RetrieverQueryEngine.from_args (llm, node_postprocessors, ...).
+    """
+    summary_index = index_pool.get(summary_table_name(index.vector_store.table_name))
+    retriever = HierarchicalRetriever(
+        index,
+        summary_index,
+        similarity_top_k=similarity_top_k or REPORT_SIMILARITY_TOP_K,
+        summary_top_k=summary_top_k or HIERARCHICAL_SUMMARY_TOP_K,
+        filters=filters,
+        hybrid=hybrid,
+    )
+    return RetrieverQueryEngine.from_args(retriever, **kwargs)
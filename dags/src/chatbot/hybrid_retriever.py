@@ -0,0 +1,269 @@
+import logging
+import math
+import os
+import threading
+import weakref
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from llama_index.core.vector_stores.types import FilterCondition, FilterOperator, MetadataFilters
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+from sqlalchemy import text
+
+from ...config.vectostore import get_vector_engine
+from .router import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Cách truy xuất báo cáo:
+# - vector: chỉ tìm theo embedding (mặc định)
+# - hybrid: trộn điểm BM25 (tách từ tiếng Việt) với điểm vector, lấy ít đoạn hơn
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
+# Số đoạn lấy ra mỗi truy vấn ở chế độ hybrid
+HYBRID_SIMILARITY_TOP_K = int(os.getenv("HYBRID_SIMILARITY_TOP_K", "4"))
+# Trọng số của điểm vector khi trộn (1 - alpha cho BM25)
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))
+# Mỗi nhánh lấy top_k * hệ số ứng viên trước khi trộn
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+
+# Hư từ thường gặp (đã bỏ dấu), không mang nghĩa khi so khớp từ khóa
+VIETNAMESE_STOPWORDS = {
+    "va", "la", "cua", "cac", "nhung", "duoc", "trong", "cho", "voi", "co", "khong",
+    "nay", "do", "thi", "ma", "mot", "nhu", "tai", "tu", "den", "theo", "ve", "hay",
+    "bao", "nhieu", "gi", "nao", "the", "sao", "khi", "da", "se", "dang", "cung",
+    "ra", "vao", "len", "o", "nen", "vi", "boi", "hon", "rat", "nhat",
+}
+
+
+def vietnamese_tokenize(value: str) -> List[str]:
+    """
+    Tách văn bản tiếng Việt thành các từ khóa cho BM25.
+
+    Văn bản được bỏ dấu (như router.tokenize) để câu hỏi gõ không dấu vẫn khớp. Mỗi
+    âm tiết không phải hư từ là một từ khóa; thêm các cặp âm tiết liền nhau vì từ
+    tiếng Việt thường gồm nhiều âm tiết ("hang ton", "ton kho" trong "hàng tồn kho").
+    Mã chứng khoán và năm (ACB, 2024) là các âm tiết riêng nên được giữ nguyên.
+    """
+    syllables = tokenize(value)
+    terms = [syllable for syllable in syllables if syllable not in VIETNAMESE_STOPWORDS]
+    terms.extend(
+        f"{first} {second}"
+        for first, second in zip(syllables, syllables[1:])
+        if first not in VIETNAMESE_STOPWORDS and second not in VIETNAMESE_STOPWORDS
+    )
+    return terms
+
+
+def _compare(value: Any, operator: FilterOperator, expected: Any) -> bool:
+    if value is None:
+        return operator in (FilterOperator.NE, FilterOperator.NIN, FilterOperator.IS_EMPTY)
+    if operator == FilterOperator.EQ:
+        return value == expected
+    if operator == FilterOperator.NE:
+        return value != expected
+    if operator == FilterOperator.IN:
+        return value in expected
+    if operator == FilterOperator.NIN:
+        return value not in expected
+    try:
+        if operator == FilterOperator.GT:
+            return float(value) > float(expected)
+        if operator == FilterOperator.GTE:
+            return float(value) >= float(expected)
+        if operator == FilterOperator.LT:
+            return float(value) < float(expected)
+        if operator == FilterOperator.LTE:
+            return float(value) <= float(expected)
+    except (TypeError, ValueError):
+        return False
+    raise ValueError(f"BM25 không hỗ trợ toán tử lọc {operator}")
+
+
+def matches_filters(metadata: Dict[str, Any], filters: Optional[MetadataFilters]) -> bool:
+    """Kiểm tra metadata của một đoạn có thỏa bộ lọc (như PGVectorStore lọc trong SQL)."""
+    if filters is None or not filters.filters:
+        return True
+    results = (
+        matches_filters(metadata, item) if isinstance(item, MetadataFilters)
+        else _compare(metadata.get(item.key), item.operator, item.value)
+        for item in filters.filters
+    )
+    if filters.condition == FilterCondition.OR:
+        return any(results)
+    return all(results)
+
+
+class BM25Index:
+    """
+    Chỉ mục BM25 trong bộ nhớ trên các đoạn của một bảng vector.
+
+    Các đoạn được đọc một lần từ bảng của PGVectorStore (không đọc cột embedding),
+    tách từ bằng vietnamese_tokenize và lưu dạng chỉ mục ngược.
+    """
+
+    def __init__(self, nodes: Sequence[TextNode], k1: float = 1.5, b: float = 0.75):
+        self.nodes = list(nodes)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)
+        self._lengths: List[int] = []
+        for position, node in enumerate(self.nodes):
+            terms = Counter(vietnamese_tokenize(node.get_content()))
+            self._lengths.append(sum(terms.values()))
+            for term, count in terms.items():
+                self._postings[term].append((position, count))
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        total = len(self.nodes)
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    @classmethod
+    def from_vector_store(cls, vector_store) -> "BM25Index":
+        """Đọc toàn bộ đoạn (node_id, text, metadata) từ bảng của một PGVectorStore."""
+        table = f"{vector_store.schema_name}.data_{vector_store.table_name}"
+        # client của PGVectorStore là None cho tới khi store được khởi tạo (_initialize),
+        # mà index tải bằng load_indexs chưa truy vấn lần nào; dùng thẳng engine của store
+        engine = getattr(vector_store, "_engine", None) or get_vector_engine()
+        with engine.connect() as connection:
+            rows = connection.execute(text(f"SELECT node_id, text, metadata_ FROM {table}")).fetchall()
+        nodes = []
+        for node_id, node_text, metadata in rows:
+            try:
+                node = metadata_dict_to_node(metadata)
+                node.set_content(str(node_text))
+            except Exception:
+                node = TextNode(id_=node_id, text=node_text, metadata=metadata or {})
+            nodes.append(node)
+        bm25 = cls(nodes)
+        logger.info(f"Tạo BM25 cho {table}: {len(nodes)} đoạn, {len(bm25._idf)} từ khóa")
+        return bm25
+
+    def search(self, query: str, top_k: int, filters: Optional[MetadataFilters] = None) -> List[NodeWithScore]:
+        """Trả về top_k đoạn có điểm BM25 cao nhất, chỉ xét các đoạn thỏa bộ lọc."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(vietnamese_tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for position, count in self._postings[term]:
+                length_norm = 1 - self.b + self.b * self._lengths[position] / (self._avg_length or 1)
+                scores[position] += idf * count * (self.k1 + 1) / (count + self.k1 * length_norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for position, score in ranked:
+            node = self.nodes[position]
+            if not matches_filters(node.metadata, filters):
+                continue
+            results.append(NodeWithScore(node=node, score=score))
+            if len(results) >= top_k:
+                break
+        return results
+
+
+# BM25 gắn với từng VectorStoreIndex: khi index bị loại khỏi index_pool (registry gọi
+# invalidate khi phát hiện bảng được index lại, hoặc bị đẩy ra theo LRU), BM25 cũ được
+# giải phóng cùng index và lần truy vấn sau tạo lại từ dữ liệu mới
+_bm25_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_bm25_lock = threading.Lock()
+
+
+def get_bm25_index(index) -> BM25Index:
+    """BM25 của một VectorStoreIndex, tạo ở lần đầu cần đến và dùng chung giữa các query engine."""
+    with _bm25_lock:
+        bm25 = _bm25_indexes.get(index)
+        if bm25 is None:
+            bm25 = BM25Index.from_vector_store(index.vector_store)
+            _bm25_indexes[index] = bm25
+    return bm25
+
+
+def _normalize_scores(results: List[NodeWithScore]) -> Dict[str, float]:
+    # Đưa điểm về [0, 1] theo min-max để điểm cosine và BM25 cộng được với nhau
+    if not results:
+        return {}
+    scores = [result.score or 0.0 for result in results]
+    low, high = min(scores), max(scores)
+    if high == low:
+        return {result.node.node_id: 1.0 for result in results}
+    return {result.node.node_id: ((result.score or 0.0) - low) / (high - low) for result in results}
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Truy xuất kết hợp vector và BM25.
+
+    Mỗi nhánh lấy top_k * candidate_factor ứng viên với cùng bộ lọc metadata; điểm của
+    mỗi nhánh được chuẩn hóa min-max rồi trộn theo alpha * vector + (1 - alpha) * BM25.
+    Câu hỏi chứa tên chỉ số, mã chứng khoán, năm được BM25 kéo đúng đoạn lên đầu nên
+    có thể dùng top_k nhỏ hơn so với chỉ tìm theo vector.
+    """
+
+    def __init__(
+        self,
+        index,
+        similarity_top_k: int = HYBRID_SIMILARITY_TOP_K,
+        alpha: float = HYBRID_ALPHA,
+        candidate_factor: int = HYBRID_CANDIDATE_FACTOR,
+        filters: Optional[MetadataFilters] = None,
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            index: VectorStoreIndex của bảng báo cáo.
+            similarity_top_k: Số đoạn trả về.
+            alpha: Trọng số điểm vector (0 - chỉ BM25, 1 - chỉ vector).
+            candidate_factor: Hệ số số ứng viên của mỗi nhánh.
+            filters: Bộ lọc metadata áp dụng cho cả hai nhánh.
+        """
+        super().__init__(**kwargs)
+        self._similarity_top_k = similarity_top_k
+        self._alpha = alpha
+        self._filters = filters
+        self._candidate_k = similarity_top_k * max(1, candidate_factor)
+        self._vector_retriever = index.as_retriever(similarity_top_k=self._candidate_k, filters=filters)
+        self._bm25 = get_bm25_index(index)
+
+    def _fuse(self, vector_results: List[NodeWithScore], bm25_results: List[NodeWithScore]) -> List[NodeWithScore]:
+        vector_scores = _normalize_scores(vector_results)
+        bm25_scores = _normalize_scores(bm25_results)
+        nodes = {result.node.node_id: result.node for result in bm25_results + vector_results}
+        fused = [
+            NodeWithScore(
+                node=node,
+                score=self._alpha * vector_scores.get(node_id, 0.0)
+                + (1 - self._alpha) * bm25_scores.get(node_id, 0.0),
+            )
+            for node_id, node in nodes.items()
+        ]
+        fused.sort(key=lambda result: result.score, reverse=True)
+        return fused[:self._similarity_top_k]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        vector_results = self._vector_retriever.retrieve(query_bundle)
+        bm25_results = self._bm25.search(query_bundle.query_str, self._candidate_k, self._filters)
+        return self._fuse(vector_results, bm25_results)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        vector_results = await self._vector_retriever.aretrieve(query_bundle)
+        bm25_results = self._bm25.search(query_bundle.query_str, self._candidate_k, self._filters)
+        return self._fuse(vector_results, bm25_results)
+
+
+def create_hybrid_query_engine(index, similarity_top_k: Optional[int] = None, filters=None, **kwargs):
+    """
+    Tạo query engine dùng HybridRetriever, thay cho index.as_query_engine.
+
+    Args:
+        index: VectorStoreIndex của bảng báo cáo.
+        similarity_top_k: Số đoạn đưa vào LLM (None - HYBRID_SIMILARITY_TOP_K).
+        filters: Bộ lọc metadata.
+        **kwargs: Tham số của RetrieverQueryEngine.from_args (llm, node_postprocessors, ...).
+    """
+    retriever = HybridRetriever(index, similarity_top_k or HYBRID_SIMILARITY_TOP_K, filters=filters)
+    return RetrieverQueryEngine.from_args(retriever, **kwargs)
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from llama_index.core.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# Thư mục chứa manifest của các bảng vector và markdown đã parse
+INDEX_CACHE_DIR = os.getenv("INDEX_CACHE_DIR", ".index_cache")
+
+
+def file_sha256(path: str) -> str:
+    """Hash SHA-256 nội dung một file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    """Hash SHA-256 của một đoạn văn bản."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_json(path: str, data) -> None:
+    # Ghi ra file tạm rồi đổi tên để không bao giờ để lại file ghi dở
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class ParseCache:
+    """
+    Cache trên đĩa kết quả parse (markdown) của từng file, theo hash nội dung file.
+
+    Một file đã parse sẽ không bao giờ bị gửi lại LlamaParse, kể cả khi được đổi tên
+    hoặc chuyển thư mục.
+    """
+
+    def __init__(self, cache_dir: str = INDEX_CACHE_DIR):
+        self.cache_dir = os.path.join(cache_dir, "parsed")
+
+    def _path(self, file_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{file_hash}.json")
+
+    def get(self, file_hash: str) -> Optional[List[Document]]:
+        """Lấy các tài liệu đã parse của một file, None nếu chưa có."""
+        path = self._path(file_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                return [Document.from_dict(data) for data in json.load(f)]
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cache parse bị hỏng ({path}), sẽ parse lại: {str(e)}")
+            return None
+
+    def put(self, file_hash: str, documents: List[Document]) -> None:
+        """Lưu các tài liệu đã parse của một file."""
+        _write_json(self._path(file_hash), [document.to_dict() for document in documents])
+
+
+class IndexManifest:
+    """
+    Manifest của một phạm vi index (một bảng vector, hoặc một mã trong bảng dùng chung).
+
+    Với mỗi file nguồn lưu hash nội dung file và hash của từng chunk kèm node_id
+    trong vector store, để lần index sau chỉ nhúng lại các chunk đã thay đổi và xóa
+    node của các chunk/file không còn nữa.
+
+    Cấu trúc:
+        {"files": {đường dẫn file: {"file_hash": ..., "chunks": {hash chunk: node_id},
+                                     "summaries": [node_id tóm tắt]}}}
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, scope: str, cache_dir: str = INDEX_CACHE_DIR):
+        """
+        Args:
+            scope: Tên phạm vi, ví dụ "ACB_financials_report" hoặc "financials_report__ACB".
+            cache_dir: Thư mục chứa manifest.
+        """
+        safe_scope = re.sub(r"[^A-Za-z0-9_.-]", "_", scope)
+        self.path = os.path.join(cache_dir, "manifests", f"{safe_scope}.json")
+        self.exists = os.path.exists(self.path)
+        self.files: Dict[str, Dict] = {}
+        if self.exists:
+            with open(self.path, encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def save(self) -> None:
+        """Ghi manifest xuống đĩa."""
+        with self._lock:
+            _write_json(self.path, {"files": self.files})
+        self.exists = True
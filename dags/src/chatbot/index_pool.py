@@ -0,0 +1,235 @@
+import asyncio
+import inspect
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.response.schema import RESPONSE_TYPE
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.prompts.mixin import PromptMixinType
+from llama_index.core.schema import QueryBundle
+from llama_index.core.vector_stores import MetadataFilters
+
+from ...config.vectostore import get_vector_engine
+from .embedding_cache import query_embed_model
+from .index_to_vectostore import load_indexs
+from .report_metadata import combine_filters
+
+logger = logging.getLogger(__name__)
+
+
+def close_vector_store(vector_store) -> None:
+    """
+    Đóng kết nối của một vector store (hỗ trợ cả close đồng bộ và bất đồng bộ).
+
+    Vector store dùng connection pool chung (get_vector_engine()) không được đóng, vì
+    close() của PGVectorStore sẽ dispose engine đang được các store khác sử dụng.
+    """
+    if getattr(vector_store, "client", None) is get_vector_engine():
+        return
+    close = getattr(vector_store, "close", None)
+    if close is None:
+        return
+    result = close()
+    if inspect.isawaitable(result):
+        asyncio.run(result)
+
+
+class IndexPool:
+    """
+    Pool LRU giữ các VectorStoreIndex đã tải, mỗi bảng vector một index.
+
+    Index chỉ được tạo ở lần đầu tiên bảng đó được truy vấn. Khi pool đầy, index
+    ít được dùng nhất bị loại và kết nối của vector store tương ứng được đóng, nên
+    bộ nhớ tăng theo số mã thực sự được hỏi.
+    """
+
+    def __init__(self, loader: Callable[[str], Any] = load_indexs, max_size: int = 8):
+        """
+        Khởi tạo pool.
+
+        Args:
+            loader: Hàm tạo index từ tên bảng (mặc định là load_indexs).
+            max_size: Số index tối đa được giữ cùng lúc.
+        """
+        if max_size < 1:
+            raise ValueError("max_size phải lớn hơn hoặc bằng 1")
+        self._loader = loader
+        self._max_size = max_size
+        self._indexes: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Khóa riêng cho từng bảng để hai luồng không cùng tạo một index
+        self._loading_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, table_name: str):
+        """Lấy index của một bảng, tạo mới nếu chưa có trong pool."""
+        with self._lock:
+            index = self._indexes.get(table_name)
+            if index is not None:
+                self._indexes.move_to_end(table_name)
+                self.hits += 1
+                return index
+            loading_lock = self._loading_locks.setdefault(table_name, threading.Lock())
+
+        with loading_lock:
+            with self._lock:
+                index = self._indexes.get(table_name)
+                if index is not None:
+                    self._indexes.move_to_end(table_name)
+                    self.hits += 1
+                    return index
+                self.misses += 1
+
+            index = self._loader(table_name)
+
+            with self._lock:
+                self._indexes[table_name] = index
+                evicted = []
+                while len(self._indexes) > self._max_size:
+                    evicted.append(self._indexes.popitem(last=False))
+                    self.evictions += 1
+
+        for evicted_table, evicted_index in evicted:
+            logger.info(f"Loại index của bảng {evicted_table} khỏi pool")
+            self._close(evicted_index)
+        return index
+
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        """
+        Loại index khỏi pool và đóng kết nối của nó.
+
+        Args:
+            table_name: Tên bảng cần loại. None - loại toàn bộ pool.
+        """
+        with self._lock:
+            if table_name is None:
+                removed = list(self._indexes.values())
+                self._indexes.clear()
+            else:
+                index = self._indexes.pop(table_name, None)
+                removed = [index] if index is not None else []
+        for index in removed:
+            self._close(index)
+
+    def stats(self) -> Dict[str, int]:
+        """Trả về số lần hit, miss, eviction và kích thước hiện tại của pool."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._indexes),
+                "max_size": self._max_size,
+            }
+
+    @staticmethod
+    def _close(index) -> None:
+        try:
+            close_vector_store(index.vector_store)
+        except Exception as e:
+            logger.warning(f"Không đóng được vector store: {str(e)}")
+
+
+class LazyQueryEngine(BaseQueryEngine):
+    """
+    Query engine chỉ tải index của bảng vector khi được truy vấn lần đầu.
+
+    Index được lấy từ IndexPool ở mỗi lần truy vấn, nên nếu đã bị loại khỏi pool
+    thì sẽ được tải lại một cách trong suốt.
+
+    Nếu có filter_inferrer, bộ lọc suy ra từ câu hỏi (năm, quý, loại báo cáo) được
+    gộp với bộ lọc sẵn có và áp dụng trước khi tìm ANN. Khi bộ lọc không khớp đoạn
+    nào (ví dụ bảng chưa được index lại với metadata mới), truy vấn được chạy lại
+    không có bộ lọc suy ra.
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        pool: IndexPool,
+        callback_manager: Optional[CallbackManager] = None,
+        query_engine_factory: Optional[Callable[..., BaseQueryEngine]] = None,
+        filter_inferrer: Optional[Callable[[str], Optional[MetadataFilters]]] = None,
+        **query_engine_kwargs: Any,
+    ):
+        """
+        Args:
+            table_name: Tên bảng vector (như khi truyền vào load_indexs).
+            pool: Pool chứa các index đã tải.
+            query_engine_factory: Hàm tạo query engine từ index và query_engine_kwargs
+                (mặc định index.as_query_engine).
+            filter_inferrer: Hàm suy ra bộ lọc metadata từ câu hỏi (None - không suy ra).
+            **query_engine_kwargs: Tham số truyền cho hàm tạo query engine.
+        """
+        super().__init__(callback_manager=callback_manager)
+        self._table_name = table_name
+        self._pool = pool
+        self._query_engine_factory = query_engine_factory
+        self._filter_inferrer = filter_inferrer
+        self._query_engine_kwargs = query_engine_kwargs
+        self._cached = None  # (index, query_engine) của lần truy vấn gần nhất
+
+    def _create_query_engine(self, index, **kwargs: Any) -> BaseQueryEngine:
+        if self._query_engine_factory is None:
+            return index.as_query_engine(**kwargs)
+        return self._query_engine_factory(index, **kwargs)
+
+    def _get_query_engine(self, inferred_filters: Optional[MetadataFilters] = None) -> BaseQueryEngine:
+        index = self._pool.get(self._table_name)
+        if inferred_filters is not None:
+            # Bộ lọc khác nhau theo từng câu hỏi nên query engine không được cache
+            kwargs = dict(self._query_engine_kwargs)
+            kwargs["filters"] = combine_filters(kwargs.get("filters"), inferred_filters)
+            return self._create_query_engine(index, **kwargs)
+        cached = self._cached
+        if cached is not None and cached[0] is index:
+            return cached[1]
+        query_engine = self._create_query_engine(index, **self._query_engine_kwargs)
+        self._cached = (index, query_engine)
+        return query_engine
+
+    def _infer_filters(self, query_bundle: QueryBundle) -> Optional[MetadataFilters]:
+        if self._filter_inferrer is None:
+            return None
+        return self._filter_inferrer(query_bundle.query_str)
+
+    def _log_fallback(self, inferred_filters: MetadataFilters) -> None:
+        logger.info(
+            f"Bộ lọc suy ra {inferred_filters.filters} không khớp đoạn nào "
+            f"trong bảng {self._table_name}, truy vấn lại không lọc"
+        )
+
+    def _get_prompt_modules(self) -> PromptMixinType:
+        return {}
+
+    def _query(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        inferred_filters = self._infer_filters(query_bundle)
+        if inferred_filters is not None:
+            response = self._get_query_engine(inferred_filters).query(query_bundle)
+            if response.source_nodes:
+                return response
+            self._log_fallback(inferred_filters)
+        return self._get_query_engine().query(query_bundle)
+
+    async def _aquery(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        inferred_filters = self._infer_filters(query_bundle)
+        if inferred_filters is not None:
+            response = await self._get_query_engine(inferred_filters).aquery(query_bundle)
+            if response.source_nodes:
+                return response
+            self._log_fallback(inferred_filters)
+        return await self._get_query_engine().aquery(query_bundle)
+
+
+# Pool dùng chung trong tiến trình
+index_pool = IndexPool(
+    partial(load_indexs, embed_model=query_embed_model),
+    max_size=int(os.getenv("INDEX_POOL_SIZE", "8")),
+)
@@ -1,96 +1,526 @@
 import os
-from dotenv import load_dotenv
-from llama_parse import LlamaParse
+import re
+from functools import partial
 from llama_index.core import (
+    Settings,
     VectorStoreIndex, 
     SimpleDirectoryReader,
     StorageContext,
 )
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import MetadataMode
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
 import logging
 from llama_index.vector_stores.postgres import PGVectorStore
-from ...config.vectostore import embedd_model, db_name, url  # Sử dụng url từ config
-from sqlalchemy import make_url
+from ...config.database import engine as warehouse_engine
+from ...config.vectostore import get_embed_model, get_vector_engine, get_async_vector_engine
+from sqlalchemy import text
+from .chunk_dedup import DEDUP_ENABLED, ChunkDedupIndex
+from .index_manifest import IndexManifest, ParseCache, file_sha256, text_sha256
+from .local_parser import create_report_parser
+from .compressed_vector_store import CompressedPGVectorStore
+from .report_facts import REPORT_FACTS_ENABLED, delete_report_items, extract_report_items, save_report_items
+from .report_metadata import split_by_statement
+from .report_summary import HIERARCHICAL_RETRIEVAL, build_report_summaries, summary_table_name
 
 logging.basicConfig(level=logging.INFO)
 
-def load_data_vectostore(table_name, data_path):
-    current_dir = r'D:\project_NCKH\oral-exam-chatbot-'
-    env_path = os.path.join(current_dir, '.env')
-    load_dotenv(env_path)
-
-    # Parse connection URL từ config
-    connection_url = make_url(url)
-    
-    # Khởi tạo parser
-    parser = LlamaParse(
-        result_type="markdown",
-        async_mode=True,
-        encoding="utf-8",
-        language="vi",
-        api_key=os.getenv("LLAMA_CLOUD_API_KEY")
-    )
-    file_extractor = {".pdf": parser, ".docx": parser}
+# Số lần index lại trong tiến trình hiện tại, theo từng bảng
+_local_index_versions = {}
+
+_nest_asyncio_applied = False
+
+def apply_nest_asyncio():
+    """
+    Cho phép event loop lồng nhau (LlamaParse async, các hàm đồng bộ của llama-index
+    gọi asyncio bên trong). Chỉ áp dụng một lần, ở lần đầu cần đến thay vì khi import.
+    """
+    global _nest_asyncio_applied
+    if not _nest_asyncio_applied:
+        import nest_asyncio
+        nest_asyncio.apply()
+        _nest_asyncio_applied = True
+
+# Cách lưu báo cáo tài chính trong vector DB:
+# - per_symbol: mỗi mã một bảng "{symbol}_financials_report"
+# - shared: mọi mã dùng chung một bảng, phân biệt bằng metadata symbol/year/quarter
+VECTOR_STORE_LAYOUT = os.getenv("VECTOR_STORE_LAYOUT", "per_symbol").lower()
+SHARED_REPORT_TABLE = os.getenv("SHARED_REPORT_TABLE", "financials_report")
+
+# Các khóa metadata được đánh btree index trong bảng dùng chung. year/quarter dùng
+# kiểu float vì PGVectorStore so sánh số bằng (metadata_->>'key')::float
+REPORT_METADATA_KEYS = {
+    ("symbol", "text"), ("year", "float"), ("quarter", "float"), ("statement_type", "text"), ("file_name", "text"),
+}
+
+# Kiểu lưu vector trong các bảng:
+# - vector: vector float32 (mặc định)
+# - halfvec: vector half precision (CompressedPGVectorStore)
+# - halfvec_binary: halfvec, tìm ứng viên bằng index nhị phân rồi xếp hạng lại
+# Bảng đã có cần chuyển sang halfvec trước (scripts/benchmark_vector_storage.py --convert)
+VECTOR_STORAGE_MODE = os.getenv("VECTOR_STORAGE_MODE", "vector").lower()
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+# Tham số HNSW của các bảng vector. m và ef_construction chỉ có tác dụng khi index
+# được tạo; ef_search áp dụng cho mỗi truy vấn. Chọn theo kết quả của
+# scripts/benchmark_retrieval.py cho cỡ kho dữ liệu hiện tại
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+# Số đoạn báo cáo lấy ra cho mỗi truy vấn
+REPORT_SIMILARITY_TOP_K = int(os.getenv("REPORT_SIMILARITY_TOP_K", "10"))
+
+# Thư mục chứa file báo cáo: REPORT_DATA_DIR/<mã>/*.pdf hoặc REPORT_DATA_DIR/<mã>_....pdf
+REPORT_DATA_DIR = os.getenv("REPORT_DATA_DIR", "data")
+REPORT_FILE_EXTENSIONS = {".pdf", ".docx"}
+
+_FILE_SYMBOL_PATTERN = re.compile(r"^([A-Za-z0-9]{3})(?=[\s_\-.])")
+_FILE_QUARTER_PATTERN = re.compile(r"(?<![a-z])(?:quy|q)[\s_\-]*([1-4])(?!\d)")
+_FILE_YEAR_PATTERN = re.compile(r"(?<!\d)(20\d{2})(?!\d)")
+
+def report_table_name(symbol):
+    """Tên bảng vector chứa báo cáo tài chính của một mã theo VECTOR_STORE_LAYOUT."""
+    if VECTOR_STORE_LAYOUT == "shared":
+        return SHARED_REPORT_TABLE
+    return f"{symbol}_financials_report"
+
+def symbol_filters(symbols):
+    """Bộ lọc metadata giới hạn truy vấn trong bảng dùng chung vào các mã cho trước."""
+    symbols = list(symbols)
+    if len(symbols) == 1:
+        return MetadataFilters(filters=[MetadataFilter(key="symbol", value=symbols[0])])
+    return MetadataFilters(filters=[MetadataFilter(key="symbol", value=symbols, operator=FilterOperator.IN)])
+
+def parse_report_period(file_name):
+    """
+    Đoán năm và quý của báo cáo từ tên file, ví dụ "ACB_Q1_2024.pdf" hoặc
+    "BCTC quý 2 năm 2023.pdf". Báo cáo năm không có khóa quarter.
+    """
+    name = (file_name or "").lower().replace("ý", "y")
+    period = {}
+    year_match = _FILE_YEAR_PATTERN.search(name)
+    if year_match:
+        period["year"] = int(year_match.group(1))
+    quarter_match = _FILE_QUARTER_PATTERN.search(name)
+    if quarter_match:
+        period["quarter"] = int(quarter_match.group(1))
+    return period
+
+def _report_file_metadata(file_path, symbol):
+    metadata = default_file_metadata_func(file_path)
+    metadata["symbol"] = symbol
+    metadata.update(parse_report_period(os.path.basename(file_path)))
+    return metadata
+
+def report_file_metadata(symbol):
+    """
+    Hàm metadata cho SimpleDirectoryReader: thêm symbol, year, quarter vào mỗi tài liệu.
 
-    # Đọc tài liệu
-    documents = SimpleDirectoryReader(
-        input_files=data_path,
-        file_extractor=file_extractor
-    ).load_data()
-
-    # Khởi tạo vector store
-    vector_store = PGVectorStore.from_params(
-        database=db_name,
-        host=connection_url.host,
-        password=connection_url.password,
-        port=connection_url.port,
-        user=connection_url.username,
+    Trả về partial của hàm cấp module (không phải closure) để pickle được khi
+    SimpleDirectoryReader parse song song bằng nhiều tiến trình.
+    """
+    return partial(_report_file_metadata, symbol=symbol)
+
+def hnsw_settings(m=None, ef_construction=None, ef_search=None, dist_method="vector_cosine_ops"):
+    """
+    Tạo hnsw_kwargs cho PGVectorStore (mặc định theo HNSW_*).
+
+    Luôn trả về dict mới vì PGVectorStore xóa bớt khóa của dict khi tạo index.
+    """
+    return {
+        "hnsw_m": m or HNSW_M,
+        "hnsw_ef_construction": ef_construction or HNSW_EF_CONSTRUCTION,
+        "hnsw_ef_search": ef_search or HNSW_EF_SEARCH,
+        "hnsw_dist_method": dist_method,
+    }
+
+def _create_vector_store(table_name, storage_mode=None, **kwargs):
+    """
+    Tạo PGVectorStore cho một bảng; bảng dùng chung có thêm index trên metadata.
+
+    Mọi vector store dùng chung connection pool của get_vector_engine()/
+    get_async_vector_engine() thay vì mỗi store tự tạo engine riêng.
+
+    Args:
+        table_name: Tên bảng vector.
+        storage_mode: Kiểu lưu vector (None - theo VECTOR_STORAGE_MODE).
+        **kwargs: Tham số khác của PGVectorStore; hnsw_kwargs mặc định theo hnsw_settings().
+    """
+    storage_mode = (storage_mode or VECTOR_STORAGE_MODE).lower()
+    vector_engine = get_vector_engine()
+    async_vector_engine = get_async_vector_engine()
+    if table_name == SHARED_REPORT_TABLE:
+        kwargs.setdefault("indexed_metadata_keys", REPORT_METADATA_KEYS)
+    store_class = PGVectorStore
+    dist_method = "vector_cosine_ops"
+    if storage_mode in ("halfvec", "halfvec_binary"):
+        store_class = CompressedPGVectorStore
+        dist_method = "halfvec_cosine_ops"
+        kwargs.setdefault("binary_first_pass", storage_mode == "halfvec_binary")
+        kwargs.setdefault("rescore_factor", VECTOR_RESCORE_FACTOR)
+    elif storage_mode != "vector":
+        raise ValueError(
+            f"VECTOR_STORAGE_MODE không hợp lệ: {storage_mode} (vector, halfvec hoặc halfvec_binary)"
+        )
+    kwargs.setdefault("hnsw_kwargs", hnsw_settings(dist_method=dist_method))
+    return store_class(
+        connection_string=vector_engine.url.render_as_string(hide_password=False),
+        async_connection_string=async_vector_engine.url.render_as_string(hide_password=False),
+        engine=vector_engine,
+        async_engine=async_vector_engine,
         table_name=table_name,
+        schema_name="public",
         embed_dim=1024,
-        hnsw_kwargs={
-            "hnsw_m": 16,
-            "hnsw_ef_construction": 64,
-            "hnsw_ef_search": 40,
-            "hnsw_dist_method": "vector_cosine_ops",
-        }
+        **kwargs,
     )
 
-    # Tạo index
+def _collect_files(data_path, extensions):
+    """Danh sách file báo cáo từ một danh sách file hoặc một thư mục."""
+    if isinstance(data_path, (str, os.PathLike)) and os.path.isdir(data_path):
+        files = []
+        for root, _, names in os.walk(data_path):
+            files.extend(
+                os.path.join(root, name) for name in names
+                if os.path.splitext(name)[1].lower() in extensions
+            )
+        return sorted(files)
+    if isinstance(data_path, (str, os.PathLike)):
+        return [str(data_path)]
+    return [str(path) for path in data_path]
+
+def discover_report_files(data_dir=None, symbols=None):
+    """
+    Tìm file báo cáo của từng mã trong thư mục dữ liệu.
+
+    Mã của một file là tên thư mục con cấp một chứa nó (REPORT_DATA_DIR/ACB/...),
+    hoặc với file nằm ngay trong thư mục gốc là ba ký tự đầu của tên file
+    ("ACB_Q1_2024.pdf").
+
+    Args:
+        data_dir: Thư mục dữ liệu (None - REPORT_DATA_DIR).
+        symbols: Chỉ lấy các mã này (None - mọi mã tìm thấy).
+
+    Returns:
+        dict: {mã: danh sách đường dẫn file đã sắp xếp}
+    """
+    data_dir = data_dir or REPORT_DATA_DIR
+    if not os.path.isdir(data_dir):
+        raise FileNotFoundError(f"Không tìm thấy thư mục báo cáo {data_dir}")
+    wanted = {symbol.upper() for symbol in symbols} if symbols else None
+    discovered = {}
+    for path in _collect_files(data_dir, REPORT_FILE_EXTENSIONS):
+        parts = os.path.relpath(path, data_dir).split(os.sep)
+        if len(parts) > 1:
+            symbol = parts[0].upper()
+        else:
+            match = _FILE_SYMBOL_PATTERN.match(parts[0])
+            if match is None:
+                continue
+            symbol = match.group(1).upper()
+        if wanted is None or symbol in wanted:
+            discovered.setdefault(symbol, []).append(path)
+    return dict(sorted(discovered.items()))
+
+def _manifest_scope(table_name, symbol):
+    # Bảng dùng chung có một manifest cho mỗi mã
+    if symbol and table_name == SHARED_REPORT_TABLE:
+        return f"{table_name}__{symbol}"
+    return table_name
+
+def has_pending_changes(table_name, files, symbol=None):
+    """
+    Kiểm tra một mã có file báo cáo mới, thay đổi hoặc bị xóa so với lần index trước.
+
+    Args:
+        table_name: Tên bảng vector.
+        files: Danh sách file báo cáo hiện có của mã (như khi truyền vào load_data_vectostore).
+        symbol: Mã chứng khoán.
+    """
+    manifest = IndexManifest(_manifest_scope(table_name, symbol))
+    if not manifest.exists or set(manifest.files) != set(files):
+        return True
+    if HIERARCHICAL_RETRIEVAL and any("summaries" not in entry for entry in manifest.files.values()):
+        return True
+    return any(manifest.files[path].get("file_hash") != file_sha256(path) for path in files)
+
+def load_data_vectostore(table_name, data_path, symbol=None):
+    """
+    Parse báo cáo tài chính và index vào bảng vector theo kiểu tăng dần.
+
+    Manifest (index_manifest.IndexManifest) lưu hash của từng file và từng chunk:
+    file không đổi được bỏ qua, file thay đổi chỉ nhúng lại các chunk mới, chunk
+    và file không còn nữa bị xóa khỏi vector store. Markdown đã parse được cache
+    trên đĩa theo hash file nên không file nào bị parse hai lần. Parser chọn theo
+    REPORT_PARSER (local_parser.create_report_parser). Đoạn gần trùng với một đoạn đã
+    lưu cùng metadata lọc (chunk_dedup.ChunkDedupIndex) không được nhúng lại mà dùng
+    chung node cũ.
+    Bảng số liệu của báo cáo được trích vào Fact_ReportItems (report_facts).
+    Khi HIERARCHICAL_RETRIEVAL bật,
+    mỗi báo cáo còn có các node tóm tắt (report_summary) trong bảng
+    summary_table_name(table_name).
+
+    Args:
+        table_name: Tên bảng vector.
+        data_path: Danh sách file báo cáo hoặc thư mục chứa báo cáo.
+        symbol: Mã chứng khoán của các báo cáo. Nếu có, mỗi tài liệu được gắn
+            metadata symbol/year/quarter và manifest được tách riêng theo mã.
+
+    Returns:
+        str: Tên bảng vector.
+    """
+    apply_nest_asyncio()
+
+    # Khởi tạo parser theo REPORT_PARSER (LlamaParse hoặc parser local)
+    parser, num_workers = create_report_parser()
+    file_extractor = {".pdf": parser, ".docx": parser}
+    file_metadata = report_file_metadata(symbol) if symbol else default_file_metadata_func
+
+    shared_scope = bool(symbol) and table_name == SHARED_REPORT_TABLE
+    scope = _manifest_scope(table_name, symbol)
+    manifest = IndexManifest(scope)
+    # Đoạn gần trùng giữa các báo cáo chỉ được lưu một lần, dùng chung cho mọi file nguồn
+    dedup_index = ChunkDedupIndex(scope) if DEDUP_ENABLED else None
+    parse_cache = ParseCache()
+    vector_store = _create_vector_store(table_name)
+    # Bảng tóm tắt báo cáo/phần báo cáo cho truy xuất hai tầng
+    summary_store = _create_vector_store(summary_table_name(table_name)) if HIERARCHICAL_RETRIEVAL else None
+    stores = [store for store in (vector_store, summary_store) if store is not None]
+
+    if not manifest.exists:
+        # Chưa có manifest: xóa dữ liệu cũ của phạm vi này để index lại từ đầu,
+        # tránh trùng với các node được ghi trước khi có manifest
+        logging.info(f"Chưa có manifest cho {manifest.path}, index lại toàn bộ")
+        for store in stores:
+            if shared_scope:
+                store.delete_nodes(filters=symbol_filters([symbol]))
+            else:
+                store.clear()
+        if dedup_index is not None:
+            dedup_index.clear()
+
+    files = _collect_files(data_path, REPORT_FILE_EXTENSIONS)
+    file_hashes = {path: file_sha256(path) for path in files}
+    changed_files = [path for path in files if manifest.files.get(path, {}).get("file_hash") != file_hashes[path]]
+    deleted_files = [path for path in manifest.files if path not in file_hashes]
+    # File không đổi nhưng chưa có tóm tắt (vừa bật HIERARCHICAL_RETRIEVAL)
+    summary_files = [
+        path for path in files
+        if summary_store is not None and path not in changed_files and "summaries" not in manifest.files.get(path, {})
+    ]
+    stats = {
+        "unchanged_files": len(files) - len(changed_files),
+        "changed_files": len(changed_files),
+        "deleted_files": len(deleted_files),
+        "failed_files": 0,
+        "embedded_chunks": 0,
+        "reused_chunks": 0,
+        "deleted_chunks": 0,
+        "deduplicated_chunks": 0,
+        "summaries": 0,
+        "report_items": 0,
+    }
+
+    def release_nodes(node_ids, path):
+        # Node dùng chung với file khác chỉ được xóa khi không còn file nào dùng
+        node_ids = list(dict.fromkeys(node_ids))
+        if dedup_index is None:
+            return node_ids
+        return [node_id for node_id in node_ids if dedup_index.release(node_id, path)]
+
+    # File bị xóa: xóa toàn bộ node của file
+    for path in deleted_files:
+        entry = manifest.files.pop(path)
+        node_ids = release_nodes(entry["chunks"].values(), path)
+        if node_ids:
+            vector_store.delete_nodes(node_ids=node_ids)
+        if summary_store is not None and entry.get("summaries"):
+            summary_store.delete_nodes(node_ids=entry["summaries"])
+        if REPORT_FACTS_ENABLED and symbol:
+            try:
+                delete_report_items(warehouse_engine, symbol, os.path.basename(path))
+            except Exception as e:
+                logging.warning(f"Không xóa được số liệu của {path} khỏi Fact_ReportItems: {str(e)}")
+        stats["deleted_chunks"] += len(node_ids)
+    if deleted_files:
+        manifest.save()
+        if dedup_index is not None:
+            dedup_index.save()
+
+    # Chỉ parse các file thay đổi chưa có trong cache parse
+    to_parse = [path for path in changed_files if parse_cache.get(file_hashes[path]) is None]
+    if to_parse:
+        num_workers = min(num_workers, len(to_parse))
+        logging.info(f"Parse {len(to_parse)} file bằng {type(parser).__name__} ({num_workers} tiến trình)")
+        parsed_documents = SimpleDirectoryReader(
+            input_files=to_parse,
+            file_extractor=file_extractor,
+            file_metadata=file_metadata
+        ).load_data(num_workers=num_workers if num_workers > 1 else None)
+        for path in to_parse:
+            documents = [
+                document for document in parsed_documents
+                if os.path.abspath(document.metadata.get("file_path", "")) == os.path.abspath(path)
+            ]
+            # File parse lỗi (SimpleDirectoryReader bỏ qua) không được cache để lần sau parse lại
+            if documents:
+                parse_cache.put(file_hashes[path], documents)
+
     storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    index = VectorStoreIndex.from_documents(
-        documents,
-        embed_model=embedd_model,
-        storage_context=storage_context,
-        show_progress=True
-    )
+    embed_model = get_embed_model()
+    for path in files:
+        if path not in changed_files and path not in summary_files:
+            continue
+        documents = parse_cache.get(file_hashes[path])
+        if not documents:
+            # Giữ nguyên node cũ của file, lần index sau sẽ thử parse lại
+            logging.warning(f"Không parse được {path}, bỏ qua")
+            if path in changed_files:
+                stats["changed_files"] -= 1
+                stats["failed_files"] += 1
+            continue
+        # Metadata lấy theo đường dẫn hiện tại, không theo lần parse trước
+        metadata = file_metadata(path)
+        for document in documents:
+            document.metadata.update(metadata)
+        # Mỗi chunk chỉ thuộc một phần báo cáo và mang statement_type, page để lọc khi truy vấn
+        documents = split_by_statement(documents)
+        entry = dict(manifest.files.get(path, {}))
+
+        if path in changed_files:
+            nodes = run_transformations(documents, Settings.transformations)
+            old_chunks = entry.get("chunks", {})
+            new_chunks = {}
+            new_nodes = []
+            for node in nodes:
+                chunk_hash = text_sha256(node.get_content(metadata_mode=MetadataMode.EMBED))
+                if chunk_hash in new_chunks:
+                    continue
+                if chunk_hash in old_chunks:
+                    new_chunks[chunk_hash] = old_chunks[chunk_hash]
+                    stats["reused_chunks"] += 1
+                    continue
+                content = node.get_content()
+                # Chỉ gộp với đoạn có cùng metadata dùng để lọc (node gộp chỉ mang metadata của một báo cáo)
+                dedup_group = "|".join(str(node.metadata.get(key)) for key, _ in sorted(REPORT_METADATA_KEYS))
+                duplicate_id = dedup_index.find_duplicate(content, dedup_group) if dedup_index is not None else None
+                if duplicate_id is not None:
+                    dedup_index.link(duplicate_id, path)
+                    new_chunks[chunk_hash] = duplicate_id
+                    stats["deduplicated_chunks"] += 1
+                    continue
+                new_chunks[chunk_hash] = node.node_id
+                new_nodes.append(node)
+                if dedup_index is not None:
+                    dedup_index.add(node.node_id, content, path, dedup_group)
 
+            kept_node_ids = set(new_chunks.values())
+            stale_node_ids = release_nodes(
+                (node_id for chunk_hash, node_id in old_chunks.items()
+                 if chunk_hash not in new_chunks and node_id not in kept_node_ids),
+                path,
+            )
+            if stale_node_ids:
+                vector_store.delete_nodes(node_ids=stale_node_ids)
+            if new_nodes:
+                VectorStoreIndex(
+                    new_nodes,
+                    storage_context=storage_context,
+                    embed_model=embed_model,
+                    show_progress=True
+                )
+            stats["embedded_chunks"] += len(new_nodes)
+            stats["deleted_chunks"] += len(stale_node_ids)
+            entry.update(file_hash=file_hashes[path], chunks=new_chunks)
+
+            if REPORT_FACTS_ENABLED and symbol and metadata.get("year"):
+                # Bảng số liệu của báo cáo vào Fact_ReportItems để tra cứu bằng SQL
+                try:
+                    stats["report_items"] += save_report_items(
+                        warehouse_engine, symbol, metadata["year"], metadata.get("quarter"),
+                        extract_report_items(documents), os.path.basename(path),
+                    )
+                except Exception as e:
+                    logging.warning(f"Không ghi được số liệu của {path} vào Fact_ReportItems: {str(e)}")
+
+        if summary_store is not None:
+            # Tóm tắt của báo cáo được tạo lại toàn bộ mỗi khi file thay đổi
+            if entry.get("summaries"):
+                summary_store.delete_nodes(node_ids=entry["summaries"])
+            summary_nodes = build_report_summaries(documents)
+            VectorStoreIndex(
+                summary_nodes,
+                storage_context=StorageContext.from_defaults(vector_store=summary_store),
+                embed_model=embed_model,
+            )
+            entry["summaries"] = [node.node_id for node in summary_nodes]
+            stats["summaries"] += len(summary_nodes)
+
+        manifest.files[path] = entry
+        manifest.save()
+        if dedup_index is not None:
+            dedup_index.save()
+
+    logging.info(f"Index {table_name}{f' ({symbol})' if symbol else ''}: {stats}")
+    if dedup_index is not None:
+        new_chunk_count = stats["embedded_chunks"] + stats["deduplicated_chunks"]
+        run_ratio = stats["deduplicated_chunks"] / new_chunk_count if new_chunk_count else 0.0
+        logging.info(
+            f"Tỷ lệ đoạn trùng: {run_ratio:.1%} đoạn mới lần này, "
+            f"{dedup_index.dedup_ratio():.1%} trên toàn bộ {len(dedup_index.nodes)} đoạn được theo dõi"
+        )
+    if changed_files or deleted_files or stats["summaries"]:
+        _local_index_versions[table_name] = _local_index_versions.get(table_name, 0) + 1
     return table_name
 
-def load_indexs(vectorstore_table):
+def get_index_versions(table_names):
+    """
+    Lấy phiên bản index hiện tại của các bảng vector.
+
+    Phiên bản được tính từ số dòng đã ghi vào bảng (pg_stat_user_tables) cộng với
+    số lần index lại trong tiến trình, nên thay đổi mỗi khi bảng được index lại.
+
+    Args:
+        table_names: Danh sách tên bảng (như khi truyền vào load_indexs).
+
+    Returns:
+        dict: {tên bảng: phiên bản}
+    """
+    # PGVectorStore lưu dữ liệu vào bảng "data_<tên bảng viết thường>"
+    relnames = {f"data_{name.lower()}": name for name in table_names}
+    versions = {name: _local_index_versions.get(name, 0) for name in table_names}
+
+    with get_vector_engine().connect() as connection:
+        rows = connection.execute(
+            text(
+                """
+                SELECT relname, n_tup_ins + n_tup_upd + n_tup_del
+                FROM pg_stat_user_tables
+                WHERE relname = ANY(:relnames)
+                """
+            ),
+            {"relnames": list(relnames)},
+        ).fetchall()
+    for relname, writes in rows:
+        versions[relnames[relname]] += int(writes)
+
+    return versions
+
+def load_indexs(vectorstore_table, embed_model=None):
+    """
+    Tải index từ một bảng vector đã có.
+
+    Args:
+        vectorstore_table: Tên bảng vector.
+        embed_model: Embedding model dùng cho câu truy vấn (None - bge-m3 từ get_embed_model()).
+    """
     try:
         logging.info(f"Khởi tạo vector store cho bảng: {vectorstore_table}")
         
-        # Parse connection URL từ config
-        connection_url = make_url(url)
-        
-        vector_store = PGVectorStore.from_params(
-            database=db_name,
-            host=connection_url.host,
-            password=connection_url.password,
-            port=connection_url.port,
-            user=connection_url.username,
-            table_name=vectorstore_table,
-            embed_dim=1024,
-            hybrid_search=False,
-            hnsw_kwargs={
-                "hnsw_m": 16,
-                "hnsw_ef_construction": 64,
-                "hnsw_ef_search": 40,
-                "hnsw_dist_method": "vector_cosine_ops",
-            },
-        )
+        vector_store = _create_vector_store(vectorstore_table, hybrid_search=False)
         
         index = VectorStoreIndex.from_vector_store(
-            embed_model=embedd_model,
+            embed_model=embed_model or get_embed_model(),
             vector_store=vector_store
         )
         return index
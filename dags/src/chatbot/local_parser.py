@@ -0,0 +1,167 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+# Parser dùng khi index báo cáo:
+# - llamaparse: LlamaParse cloud (cần LLAMA_CLOUD_API_KEY)
+# - local: LocalReportParser, chạy offline và chia file cho nhiều tiến trình
+REPORT_PARSER = os.getenv("REPORT_PARSER", "llamaparse").lower()
+# Số tiến trình parse song song với parser local (0 - bằng số CPU)
+PARSER_NUM_WORKERS = int(os.getenv("PARSER_NUM_WORKERS", "0"))
+
+
+def _clean_cell(cell) -> str:
+    if cell is None:
+        return ""
+    # Ô gộp nhiều dòng trong PDF/DOCX; dấu | sẽ làm vỡ bảng markdown
+    return " ".join(str(cell).split()).replace("|", "\\|")
+
+
+def table_to_markdown(rows: List[List[Any]]) -> str:
+    """
+    Chuyển một bảng (danh sách các dòng) thành bảng markdown, dòng đầu là tiêu đề.
+
+    Các dòng được đệm cho đủ số cột; dòng trống hoàn toàn bị bỏ.
+    """
+    rows = [[_clean_cell(cell) for cell in row] for row in rows if row]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = [
+        "| " + " | ".join(rows[0]) + " |",
+        "| " + " | ".join(["---"] * width) + " |",
+    ]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+    return "\n".join(lines)
+
+
+class LocalReportParser(BaseReader):
+    """
+    Parser báo cáo tài chính PDF/DOCX thành markdown chạy hoàn toàn cục bộ, thay cho
+    LlamaParse khi REPORT_PARSER=local.
+
+    Bảng trong báo cáo được giữ dưới dạng bảng markdown, đặt đúng vị trí giữa các đoạn
+    văn. PDF được tách một Document mỗi trang (metadata page_label), DOCX là một Document.
+    Đối tượng không giữ trạng thái nên dùng được với SimpleDirectoryReader.load_data(num_workers=...)
+    để chia file cho nhiều tiến trình.
+
+    Cần cài thêm: pdfplumber (PDF), python-docx (DOCX).
+    """
+
+    def load_data(self, file: Path, extra_info: Optional[Dict] = None, **kwargs: Any) -> List[Document]:
+        """
+        Parse một file PDF hoặc DOCX.
+
+        Args:
+            file: Đường dẫn file.
+            extra_info: Metadata gắn vào mọi Document của file.
+
+        Returns:
+            List[Document]: Các tài liệu markdown.
+        """
+        suffix = Path(file).suffix.lower()
+        if suffix == ".pdf":
+            return self._load_pdf(file, extra_info or {})
+        if suffix == ".docx":
+            return self._load_docx(file, extra_info or {})
+        raise ValueError(f"LocalReportParser không hỗ trợ định dạng {suffix}")
+
+    @staticmethod
+    def _load_pdf(file, extra_info: Dict) -> List[Document]:
+        try:
+            import pdfplumber
+        except ImportError as e:
+            raise ImportError("REPORT_PARSER=local cần pdfplumber để đọc PDF: pip install pdfplumber") from e
+
+        documents = []
+        with pdfplumber.open(file) as pdf:
+            for page_number, page in enumerate(pdf.pages, start=1):
+                blocks = []
+                top = 0
+                # Lấy văn bản theo từng dải ngang giữa các bảng để giữ đúng thứ tự đọc
+                tables = sorted(page.find_tables(), key=lambda table: table.bbox[1])
+                for table in tables:
+                    _, table_top, _, table_bottom = table.bbox
+                    if table_top < top:
+                        continue
+                    if table_top > top:
+                        blocks.append(page.crop((0, top, page.width, table_top)).extract_text() or "")
+                    blocks.append(table_to_markdown(table.extract()))
+                    top = table_bottom
+                if top < page.height:
+                    blocks.append(page.crop((0, top, page.width, page.height)).extract_text() or "")
+
+                text = "\n\n".join(block.strip() for block in blocks if block and block.strip())
+                if not text:
+                    continue
+                metadata = dict(extra_info)
+                metadata["page_label"] = str(page_number)
+                documents.append(Document(text=text, metadata=metadata))
+        return documents
+
+    @staticmethod
+    def _load_docx(file, extra_info: Dict) -> List[Document]:
+        try:
+            from docx import Document as DocxDocument
+            from docx.table import Table
+            from docx.text.paragraph import Paragraph
+        except ImportError as e:
+            raise ImportError("REPORT_PARSER=local cần python-docx để đọc DOCX: pip install python-docx") from e
+
+        docx = DocxDocument(file)
+        blocks = []
+        # Duyệt thân văn bản theo thứ tự để bảng nằm đúng chỗ giữa các đoạn
+        for element in docx.element.body.iterchildren():
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "p":
+                paragraph = Paragraph(element, docx)
+                text = paragraph.text.strip()
+                if not text:
+                    continue
+                style = paragraph.style.name if paragraph.style is not None else ""
+                if style.startswith("Heading") and style[len("Heading"):].strip().isdigit():
+                    level = min(int(style[len("Heading"):]), 6)
+                    text = f"{'#' * level} {text}"
+                elif style == "Title":
+                    text = f"# {text}"
+                blocks.append(text)
+            elif tag == "tbl":
+                table = Table(element, docx)
+                blocks.append(table_to_markdown([[cell.text for cell in row.cells] for row in table.rows]))
+
+        text = "\n\n".join(block for block in blocks if block)
+        if not text:
+            return []
+        return [Document(text=text, metadata=dict(extra_info))]
+
+
+def create_report_parser(parser_name: Optional[str] = None):
+    """
+    Tạo parser báo cáo cho file_extractor của SimpleDirectoryReader.
+
+    Args:
+        parser_name: "llamaparse" hoặc "local" (None - theo REPORT_PARSER).
+
+    Returns:
+        tuple: (parser, số tiến trình parse). LlamaParse tự chạy bất đồng bộ trên
+            cloud nên chỉ dùng một tiến trình.
+    """
+    parser_name = (parser_name or REPORT_PARSER).lower()
+    if parser_name == "local":
+        return LocalReportParser(), PARSER_NUM_WORKERS or os.cpu_count() or 1
+    if parser_name == "llamaparse":
+        from llama_parse import LlamaParse
+        parser = LlamaParse(
+            result_type="markdown",
+            async_mode=True,
+            encoding="utf-8",
+            language="vi",
+            api_key=os.getenv("LLAMA_CLOUD_API_KEY")
+        )
+        return parser, 1
+    raise ValueError(f"REPORT_PARSER không hợp lệ: {parser_name} (llamaparse hoặc local)")
@@ -0,0 +1,152 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Generator, List, Optional, Sequence, Tuple
+
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.tools import BaseTool, ToolOutput
+from llama_index.core.tools.calling import call_tool
+
+logger = logging.getLogger(__name__)
+
+
+class ParallelFunctionCallingAgent:
+    """
+    Agent dùng tính năng gọi hàm gốc (native tool calling) của model.
+
+    Khác với ReActAgent (mỗi lượt gọi LLM chỉ chọn được một công cụ qua văn bản
+    Thought/Action), ở mỗi lượt model có thể trả về nhiều lời gọi công cụ và các
+    lời gọi này được chạy song song, ví dụ financial_ratios_tool cho ACB và BID
+    cùng lúc. Số lượt gọi LLM được đếm trong round_trips.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        llm,
+        system_prompt: Optional[str] = None,
+        max_turns: int = 8,
+        max_workers: int = 8,
+    ):
+        """
+        Khởi tạo agent.
+
+        Args:
+            tools: Danh sách công cụ agent được dùng.
+            llm: LLM hỗ trợ function calling (ví dụ OpenAI gpt-4o).
+            system_prompt: System prompt của agent.
+            max_turns: Số lượt gọi LLM tối đa trước khi buộc trả lời.
+            max_workers: Số công cụ tối đa chạy song song trong một lượt.
+        """
+        if not getattr(llm.metadata, "is_function_calling_model", False):
+            raise ValueError(f"Model {llm.metadata.model_name} không hỗ trợ function calling")
+        self.tools = list(tools)
+        self.llm = llm
+        self.system_prompt = system_prompt
+        self.max_turns = max_turns
+        self.max_workers = max_workers
+        self.round_trips = 0
+        self._tools_by_name = {tool.metadata.name: tool for tool in self.tools}
+
+    def run(self, message: str, stream_final: bool = True) -> Generator[Dict[str, str], None, str]:
+        """
+        Chạy agent cho một câu hỏi.
+
+        Args:
+            message: Nội dung câu hỏi (prompt) gửi cho agent.
+            stream_final: True - trả câu trả lời cuối dưới dạng các sự kiện token.
+
+        Yields:
+            Dict[str, str]: Sự kiện {"type": "tool", ...} khi một công cụ chạy xong và
+            {"type": "token", ...} cho câu trả lời cuối (nếu stream_final). Nội dung model
+            viết ở các lượt có gọi công cụ không được gửi đi.
+
+        Returns:
+            str: Câu trả lời cuối cùng.
+        """
+        messages: List[ChatMessage] = []
+        if self.system_prompt:
+            messages.append(ChatMessage(role=MessageRole.SYSTEM, content=self.system_prompt))
+        messages.append(ChatMessage(role=MessageRole.USER, content=message))
+
+        for _ in range(self.max_turns):
+            self.round_trips += 1
+            deltas: List[str] = []
+            if stream_final:
+                response = None
+                # Model có thể viết vài câu rồi mới gọi công cụ; chỉ biết lượt này là câu
+                # trả lời cuối khi stream kết thúc mà không có lời gọi công cụ nào, nên các
+                # token được giữ lại đến lúc đó
+                for response in self.llm.stream_chat_with_tools(
+                    self.tools, chat_history=messages, allow_parallel_tool_calls=True
+                ):
+                    if response.delta:
+                        deltas.append(response.delta)
+            else:
+                response = self.llm.chat_with_tools(
+                    self.tools, chat_history=messages, allow_parallel_tool_calls=True
+                )
+
+            tool_calls = self.llm.get_tool_calls_from_response(response, error_on_no_tool_call=False)
+            if not tool_calls:
+                for delta in deltas:
+                    yield {"type": "token", "content": delta}
+                return response.message.content or ""
+            if deltas:
+                logger.info(f"Bỏ {len(''.join(deltas))} ký tự model viết trước khi gọi công cụ")
+
+            messages.append(response.message)
+            for tool_call, tool_output in self._call_tools(tool_calls):
+                yield {"type": "tool", "tool": tool_output.tool_name, "input": str(tool_output.raw_input)}
+                messages.append(
+                    ChatMessage(
+                        role=MessageRole.TOOL,
+                        content=str(tool_output),
+                        additional_kwargs={
+                            "name": tool_call.tool_name,
+                            "tool_call_id": tool_call.tool_id,
+                        },
+                    )
+                )
+
+        # Hết số lượt cho phép: buộc model trả lời với dữ liệu đã có
+        logger.warning(f"Agent vượt quá {self.max_turns} lượt gọi công cụ, buộc trả lời")
+        self.round_trips += 1
+        if stream_final:
+            parts = []
+            for response in self.llm.stream_chat(messages):
+                if response.delta:
+                    parts.append(response.delta)
+                    yield {"type": "token", "content": response.delta}
+            return "".join(parts)
+        return self.llm.chat(messages).message.content or ""
+
+    def _call_tools(self, tool_calls) -> List[Tuple[object, ToolOutput]]:
+        """Chạy song song các lời gọi công cụ trong một lượt, giữ nguyên thứ tự của model."""
+        if len(tool_calls) == 1:
+            return [(tool_calls[0], self._call_tool(tool_calls[0]))]
+
+        outputs = {}
+        with ThreadPoolExecutor(max_workers=min(len(tool_calls), self.max_workers)) as executor:
+            # Mỗi luồng chạy trong bản sao context hiện tại để dùng chung bộ nhớ tạm
+            # của lượt hỏi (ví dụ vector câu truy vấn)
+            futures = {
+                executor.submit(contextvars.copy_context().run, self._call_tool, tool_call): position
+                for position, tool_call in enumerate(tool_calls)
+            }
+            for future in as_completed(futures):
+                outputs[futures[future]] = future.result()
+        logger.info(f"Đã chạy song song {len(tool_calls)} công cụ: {[c.tool_name for c in tool_calls]}")
+        return [(tool_call, outputs[position]) for position, tool_call in enumerate(tool_calls)]
+
+    def _call_tool(self, tool_call) -> ToolOutput:
+        tool = self._tools_by_name.get(tool_call.tool_name)
+        if tool is None:
+            return ToolOutput(
+                content=f"Không tồn tại công cụ {tool_call.tool_name}",
+                tool_name=tool_call.tool_name,
+                raw_input=tool_call.tool_kwargs,
+                raw_output=None,
+                is_error=True,
+            )
+        return call_tool(tool, tool_call.tool_kwargs)
@@ -0,0 +1,255 @@
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .function_calling.function import StockAnalyzer
+from .router import PhraseTrie, TickerRouter, normalize_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Tên gọi thường dùng của các chỉ số, ánh xạ về RatioName trong Dim_Ratio
+RATIO_ALIASES = {
+    "pe": "P/E", "p/e": "P/E",
+    "pb": "P/B", "p/b": "P/B",
+    "ps": "P/S", "p/s": "P/S",
+    "eps": "EPS (VND)", "bvps": "BVPS (VND)",
+    "roe": "ROE (%)", "roa": "ROA (%)", "roic": "ROIC (%)",
+    "ev/ebitda": "EV/EBITDA", "ebitda": "EBITDA (Tỷ đồng)", "ebit": "EBIT (Tỷ đồng)",
+    "vốn hóa": "Vốn hóa (Tỷ đồng)",
+    "tỷ suất cổ tức": "Tỷ suất cổ tức (%)",
+    "biên lợi nhuận ròng": "Biên lợi nhuận ròng (%)",
+    "biên lợi nhuận gộp": "Biên lợi nhuận gộp (%)",
+    "biên ebit": "Biên EBIT (%)",
+    "số cổ phiếu lưu hành": "Số CP lưu hành (Triệu CP)",
+}
+
+# Từ khóa cho thấy câu hỏi cần phân tích chứ không chỉ tra cứu số liệu
+ANALYSIS_KEYWORDS = [
+    "tai sao", "vi sao", "phan tich", "danh gia", "du bao", "nhan dinh",
+    "co nen", "co tot", "y nghia", "giai thich", "trien vong",
+]
+
+CLOSE_PRICE_KEYWORDS = [
+    "gia dong cua", "gia dong", "gia cuoi phien", "gia hien tai",
+    "gia co phieu", "gia hom qua", "gia hom nay", "gia bao nhieu",
+]
+
+_QUARTER_PATTERN = re.compile(r"\b(?:quy|q)\s*([1-4])\s*(?:/|-|nam)?\s*(20\d{2})\b")
+# "quý 1" không kèm năm ngay sau
+_BARE_QUARTER_PATTERN = re.compile(r"\b(?:quy|q)\s*([1-4])\b")
+_YEAR_PATTERN = re.compile(r"\b(20\d{2})\b")
+_DATE_PATTERN = re.compile(r"\b(\d{1,2})[/-](\d{1,2})[/-](20\d{2})\b")
+# Các cách nêu kỳ dữ liệu đã đọc được, bỏ đi trước khi tìm từ chỉ kỳ còn sót lại
+_PARSED_PERIOD_PATTERNS = [
+    _QUARTER_PATTERN, _DATE_PATTERN, _BARE_QUARTER_PATTERN,
+    re.compile(r"\b(?:nam\s*)?20\d{2}\b"), re.compile(r"\bhom (?:qua|nay)\b"),
+]
+# Từ chỉ kỳ dữ liệu ("quý trước", "năm ngoái", "cùng kỳ", "tháng 3"), trừ "kỳ vọng", "Việt Nam"
+_PERIOD_TERM_PATTERN = re.compile(r"(?<!viet )\b(?:quy|nam|ky|thang)\b(?!\s*vong)")
+
+
+# Phân loại loại câu hỏi
+def classify_question_type(text: str) -> Dict[str, bool]:
+    """Phân loại loại câu hỏi để chọn chuyên gia phù hợp."""
+    text_lower = text.lower()
+
+    # Keywords cho từng loại phân tích
+    fundamental_keywords = ['pe', 'pb', 'roe', 'roa', 'eps', 'doanh thu', 'lợi nhuận', 'tài chính', 'báo cáo', 'định giá']
+    technical_keywords = ['rsi', 'macd', 'sma', 'ema', 'xu hướng', 'tăng', 'giảm', 'kỹ thuật', 'biểu đồ']
+    news_keywords = ['tin tức', 'vĩ mô', 'chính sách', 'kinh tế', 'thị trường', 'ảnh hưởng']
+    comparison_keywords = ['so sánh', 'tốt nhất', 'xếp hạng', 'top', 'nên chọn']
+
+    return {
+        'fundamental': any(keyword in text_lower for keyword in fundamental_keywords),
+        'technical': any(keyword in text_lower for keyword in technical_keywords),
+        'news': any(keyword in text_lower for keyword in news_keywords),
+        'comparison': any(keyword in text_lower for keyword in comparison_keywords),
+        'investment_decision': any(word in text_lower for word in ['nên', 'mua', 'bán', 'đầu tư', 'khuyến nghị'])
+    }
+
+
+@dataclass
+class ParsedQuestion:
+    """Kết quả phân tích cú pháp một câu hỏi tra cứu số liệu."""
+    intent: Optional[str] = None  # "ratio" hoặc "close_price"
+    symbols: List[str] = field(default_factory=list)
+    ratio_name: Optional[str] = None
+    year: Optional[int] = None
+    quarter: Optional[int] = None
+    to_date: Optional[date] = None
+    period_unresolved: bool = False  # câu hỏi nêu kỳ dữ liệu nhưng không đọc được
+    confidence: float = 0.0
+
+
+class QuestionParser:
+    """
+    Phân tích câu hỏi thành mã chứng khoán, chỉ số (theo Dim_Ratio) và kỳ dữ liệu.
+
+    Câu hỏi tra cứu số liệu đơn thuần được phân tích với độ tin cậy cao có thể
+    trả lời trực tiếp bằng SQL mà không cần gọi agent.
+    """
+
+    def __init__(self, engine, router: TickerRouter):
+        """
+        Args:
+            engine: SQLAlchemy engine của data warehouse.
+            router: Bộ định tuyến dùng để nhận diện mã chứng khoán.
+        """
+        self.engine = engine
+        self.router = router
+        self._ratio_trie: Optional[PhraseTrie] = None
+        self._lock = threading.Lock()
+
+    def _load_ratios(self) -> PhraseTrie:
+        trie = PhraseTrie()
+        ratio_names = set(RATIO_ALIASES.values())
+        try:
+            with Session(self.engine) as session:
+                ratios = pd.read_sql(text('SELECT "RatioName" FROM "Dim_Ratio"'), session.connection())
+            ratio_names = set(ratios["RatioName"].dropna())
+        except Exception as e:
+            logger.warning(f"Không đọc được Dim_Ratio, chỉ dùng danh sách chỉ số mặc định: {str(e)}")
+
+        for ratio_name in ratio_names:
+            trie.add(ratio_name, ratio_name)
+            # Tên không kèm đơn vị, ví dụ "ROE (%)" -> "ROE"
+            trie.add(re.sub(r"\(.*?\)", "", ratio_name), ratio_name)
+        for alias, ratio_name in RATIO_ALIASES.items():
+            if ratio_name in ratio_names:
+                trie.add(alias, ratio_name)
+        return trie
+
+    def parse(self, question: str, symbols: Optional[List[str]] = None) -> ParsedQuestion:
+        """
+        Phân tích một câu hỏi.
+
+        Args:
+            question: Câu hỏi của người dùng.
+            symbols: Các mã đã nhận diện (None - tự nhận diện bằng router).
+
+        Returns:
+            ParsedQuestion: Kết quả phân tích kèm độ tin cậy trong khoảng [0, 1].
+        """
+        if self._ratio_trie is None:
+            with self._lock:
+                if self._ratio_trie is None:
+                    self._ratio_trie = self._load_ratios()
+
+        normalized = normalize_text(question)
+        # Chuỗi các từ có dấu cách hai đầu để so khớp trọn từ
+        padded = f" {' '.join(tokenize(question))} "
+        parsed = ParsedQuestion(
+            symbols=list(symbols) if symbols is not None else self.router.extract_symbols(question)
+        )
+
+        ratio_names = self._ratio_trie.find(question)
+        if len(ratio_names) == 1:
+            parsed.intent = "ratio"
+            parsed.ratio_name = ratio_names[0]
+        elif not ratio_names and any(f" {keyword} " in padded for keyword in CLOSE_PRICE_KEYWORDS):
+            parsed.intent = "close_price"
+
+        self._parse_period(normalized, parsed)
+
+        # Độ tin cậy: đúng một mã, đúng một đại lượng, không cần phân tích thêm và
+        # kỳ dữ liệu (nếu có nêu) đọc được đầy đủ
+        question_type = classify_question_type(question)
+        needs_analysis = (
+            question_type["investment_decision"] or question_type["comparison"]
+            or question_type["news"] or question_type["technical"]
+            or any(f" {keyword} " in padded for keyword in ANALYSIS_KEYWORDS)
+        )
+        confidence = 0.0
+        if len(parsed.symbols) == 1:
+            confidence += 0.4
+        if parsed.intent is not None:
+            confidence += 0.4
+        if not needs_analysis and not parsed.period_unresolved:
+            confidence += 0.2
+        parsed.confidence = round(confidence, 2)
+        return parsed
+
+    @staticmethod
+    def _parse_period(normalized: str, parsed: ParsedQuestion) -> None:
+        today = date.today()
+        quarter_match = _QUARTER_PATTERN.search(normalized)
+        if quarter_match:
+            parsed.quarter = int(quarter_match.group(1))
+            parsed.year = int(quarter_match.group(2))
+        else:
+            year_match = _YEAR_PATTERN.search(normalized)
+            if year_match:
+                parsed.year = int(year_match.group(1))
+            # "quý 1" không kèm năm: quý đó của năm đã nêu, hoặc của năm gần nhất có
+            # dữ liệu quý đó (get_ratio_value lọc theo quý, lấy năm mới nhất)
+            bare_quarters = {int(quarter) for quarter in _BARE_QUARTER_PATTERN.findall(normalized)}
+            if len(bare_quarters) == 1:
+                parsed.quarter = bare_quarters.pop()
+
+        date_match = _DATE_PATTERN.search(normalized)
+        if date_match:
+            day, month, year = (int(value) for value in date_match.groups())
+            try:
+                parsed.to_date = date(year, month, day)
+            except ValueError:
+                pass
+        elif "hom qua" in normalized:
+            parsed.to_date = today - timedelta(days=1)
+        elif "hom nay" in normalized:
+            parsed.to_date = today
+
+        remaining = normalized
+        for pattern in _PARSED_PERIOD_PATTERNS:
+            remaining = pattern.sub(" ", remaining)
+        parsed.period_unresolved = bool(_PERIOD_TERM_PATTERN.search(remaining))
+
+
+def _format_number(value: float) -> str:
+    """Định dạng số theo kiểu Việt Nam: dấu chấm phân cách nghìn, dấu phẩy thập phân."""
+    formatted = f"{value:,.2f}".rstrip("0").rstrip(".")
+    return formatted.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def answer_from_sql(parsed: ParsedQuestion, analyzer: StockAnalyzer) -> Optional[str]:
+    """
+    Trả lời câu hỏi tra cứu số liệu trực tiếp từ data warehouse.
+
+    Returns:
+        Optional[str]: Câu trả lời theo mẫu, None nếu không có dữ liệu phù hợp.
+    """
+    symbol = parsed.symbols[0]
+
+    if parsed.intent == "ratio":
+        result = analyzer.get_ratio_value(symbol, parsed.ratio_name, parsed.year, parsed.quarter)
+        if result.empty or pd.isna(result.iloc[0]["RatioValue"]):
+            return None
+        row = result.iloc[0]
+        unit = f" {row['Unit']}" if isinstance(row["Unit"], str) and row["Unit"] and row["Unit"] not in row["RatioName"] else ""
+        return (
+            f"**{row['RatioName']}** của **{symbol}** quý {int(row['Quarter'])}/{int(row['Year'])} "
+            f"là **{_format_number(float(row['RatioValue']))}**{unit}."
+        )
+
+    if parsed.intent == "close_price":
+        to_date = parsed.to_date.isoformat() if parsed.to_date else None
+        result = analyzer.get_close_price(symbol, to_date)
+        if result.empty:
+            return None
+        row = result.iloc[0]
+        trade_date = pd.to_datetime(row["Date"]).strftime("%d/%m/%Y")
+        answer = (
+            f"Giá đóng cửa của **{symbol}** phiên {trade_date} là "
+            f"**{_format_number(float(row['CurrentPrice']))}**"
+        )
+        if not pd.isna(row["DailyChangePercent"]):
+            answer += f" ({float(row['DailyChangePercent']):+.2f}% so với phiên trước)"
+        return answer + "."
+
+    return None
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from llama_index.core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+
+class ToolRegistry:
+    """
+    Registry dùng chung trong tiến trình cho các công cụ của agent.
+
+    Các công cụ được xây dựng một lần và dùng lại giữa các câu hỏi và các lần
+    rerun của Streamlit. Chỉ những phần đã cũ mới được xây dựng lại:
+    - Công cụ báo cáo của một mã khi bảng vector của mã đó được index lại.
+    - Danh sách công cụ khi danh sách mã chứng khoán thay đổi.
+    """
+
+    def __init__(
+        self,
+        symbols_provider: Callable[[], Sequence[str]],
+        report_tool_factory: Callable[[str], BaseTool],
+        function_tools_factory: Callable[[], List[BaseTool]],
+        version_provider: Optional[Callable[[Sequence[str]], Dict[str, int]]] = None,
+        refresh_interval: float = 60.0,
+        on_stale: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        Khởi tạo registry.
+
+        Args:
+            symbols_provider: Hàm trả về danh sách mã chứng khoán hiện tại.
+            report_tool_factory: Hàm tạo công cụ báo cáo tài chính cho một mã.
+            function_tools_factory: Hàm tạo các công cụ truy vấn dữ liệu (FunctionTool).
+            version_provider: Hàm trả về phiên bản index của từng mã, dùng để phát hiện
+                bảng vector đã được index lại. None - không kiểm tra.
+            refresh_interval: Số giây tối thiểu giữa hai lần kiểm tra phiên bản index.
+            on_stale: Hàm được gọi với mỗi mã có bảng vector đã được index lại, trước
+                khi tạo lại công cụ (ví dụ để loại index cũ khỏi index_pool).
+        """
+        self._symbols_provider = symbols_provider
+        self._report_tool_factory = report_tool_factory
+        self._function_tools_factory = function_tools_factory
+        self._version_provider = version_provider
+        self._refresh_interval = refresh_interval
+        self._on_stale = on_stale
+
+        self._lock = threading.RLock()
+        self._symbols: Optional[tuple] = None
+        self._report_tools: Dict[str, BaseTool] = {}
+        self._versions: Dict[str, int] = {}
+        self._function_tools: Optional[List[BaseTool]] = None
+        self._tools: List[BaseTool] = []
+        self._last_check = 0.0
+
+    def get_tools(self) -> List[BaseTool]:
+        """Trả về danh sách công cụ hiện tại, xây dựng lại phần đã cũ nếu cần."""
+        symbols = tuple(self._symbols_provider())
+        if symbols == self._symbols and not self._check_due():
+            return list(self._tools)
+
+        with self._lock:
+            self._refresh(symbols)
+            return list(self._tools)
+
+    def get_report_tool(self, symbol: str) -> Optional[BaseTool]:
+        """Trả về công cụ báo cáo của một mã (None nếu mã chưa được tải)."""
+        self.get_tools()
+        return self._report_tools.get(symbol)
+
+    def get_function_tools(self) -> List[BaseTool]:
+        """Trả về các công cụ truy vấn dữ liệu (FunctionTool)."""
+        self.get_tools()
+        return list(self._function_tools or [])
+
+    def invalidate(self, symbols: Optional[Sequence[str]] = None) -> None:
+        """
+        Đánh dấu công cụ của các mã là cũ để xây dựng lại ở lần gọi tiếp theo.
+
+        Args:
+            symbols: Danh sách mã cần làm mới. None - làm mới toàn bộ.
+        """
+        with self._lock:
+            targets = list(self._report_tools) if symbols is None else list(symbols)
+            for symbol in targets:
+                self._report_tools.pop(symbol, None)
+                self._versions.pop(symbol, None)
+            if symbols is None:
+                self._function_tools = None
+            # Buộc lần gọi tiếp theo đi vào nhánh làm mới
+            self._symbols = None
+
+    def _check_due(self) -> bool:
+        return (
+            self._version_provider is not None
+            and time.monotonic() - self._last_check >= self._refresh_interval
+        )
+
+    def _notify_stale(self, symbol: str) -> None:
+        if self._on_stale is None:
+            return
+        try:
+            self._on_stale(symbol)
+        except Exception as e:
+            logger.warning(f"Không làm mới được index của {symbol}: {str(e)}")
+
+    def _refresh(self, symbols: tuple) -> None:
+        """Đồng bộ các công cụ với danh sách mã và phiên bản index hiện tại."""
+        if symbols == self._symbols and not self._check_due():
+            # Một luồng khác vừa làm mới xong
+            return
+
+        stale = set()
+        if self._version_provider is not None:
+            try:
+                versions = self._version_provider(symbols)
+                stale = {
+                    s for s in symbols
+                    if s in self._report_tools and versions.get(s) != self._versions.get(s)
+                }
+            except Exception as e:
+                logger.warning(f"Không kiểm tra được phiên bản index: {str(e)}")
+                versions = dict(self._versions)
+            self._last_check = time.monotonic()
+        else:
+            versions = {}
+
+        # Loại bỏ các mã không còn trong danh sách và các mã đã index lại
+        for symbol in list(self._report_tools):
+            if symbol not in symbols or symbol in stale:
+                self._report_tools.pop(symbol)
+                self._versions.pop(symbol, None)
+                if symbol in stale:
+                    logger.info(f"Bảng vector của {symbol} đã thay đổi, tạo lại công cụ")
+                    self._notify_stale(symbol)
+
+        for symbol in symbols:
+            if symbol in self._report_tools:
+                continue
+            try:
+                self._report_tools[symbol] = self._report_tool_factory(symbol)
+                self._versions[symbol] = versions.get(symbol)
+            except Exception as e:
+                logger.warning(f"Không tải được {symbol}: {str(e)}")
+
+        if self._function_tools is None:
+            self._function_tools = self._function_tools_factory()
+
+        self._tools = [
+            self._report_tools[s] for s in symbols if s in self._report_tools
+        ] + list(self._function_tools)
+        self._symbols = symbols
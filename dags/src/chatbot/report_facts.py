@@ -0,0 +1,258 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.schema import Document, MetadataMode
+from sqlalchemy import text
+
+from .router import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Trích các bảng số liệu (cân đối kế toán, kết quả kinh doanh, lưu chuyển tiền tệ)
+# của báo cáo vào Fact_ReportItems khi index
+REPORT_FACTS_ENABLED = os.getenv("REPORT_FACTS_ENABLED", "true").lower() == "true"
+
+# Các phần báo cáo được trích (statement_type của report_metadata)
+FACT_STATEMENT_TYPES = ("balance_sheet", "income_statement", "cash_flow")
+
+# Đơn vị tính ghi trong báo cáo (đã bỏ dấu), quy về đồng
+UNIT_MULTIPLIERS = [
+    ("ty dong", 1_000_000_000),
+    ("trieu dong", 1_000_000),
+    ("nghin dong", 1_000),
+    ("ngan dong", 1_000),
+    ("vnd", 1),
+    ("dong", 1),
+]
+
+_UNIT_PATTERN = re.compile(r"don vi(?: tinh)?\s*[:.]?\s*(ty dong|trieu dong|nghin dong|ngan dong|vnd|dong)")
+_TABLE_SEPARATOR = re.compile(r"^\|?[\s:\-|]+\|?$")
+_THOUSANDS_NUMBER = re.compile(r"^\d{1,3}(?:([.,])\d{3})(?:\1\d{3})*$")
+# Số thứ tự đầu tên chỉ tiêu: "I.", "1.", "1.1", "a)", "-"
+_ITEM_NUMBERING = re.compile(r"^(?:[IVXivx]+|[a-zA-Z]|\d+(?:\.\d+)*)\s*[.)/]\s+|^[-+–]\s*")
+_CODE_HEADERS = ("ma so", "ma", "ms")
+_NOTE_HEADERS = ("thuyet minh", "tm")
+_LABEL_HEADERS = ("chi tieu", "tai san", "nguon von", "khoan muc", "noi dung")
+_YEAR_HEADER = re.compile(r"^(?:19|20)\d{2}$")
+# Mã số, số thuyết minh: số nguyên ngắn không có dấu phân cách ("100", "5", "15a")
+_CODE_LIKE = re.compile(r"^\d{1,3}[a-zA-Z]?$")
+
+
+def parse_report_number(cell: str) -> Optional[float]:
+    """
+    Đọc một ô số trong báo cáo tài chính Việt Nam.
+
+    Hỗ trợ dấu phân cách hàng nghìn bằng dấu chấm hoặc dấu phẩy, số âm trong ngoặc
+    "(1.234)" hoặc có dấu trừ. Ô trống, "-" hoặc không phải số trả về None.
+    """
+    value = (cell or "").strip().strip("*").replace(" ", "")
+    negative = False
+    if value.startswith("(") and value.endswith(")"):
+        negative, value = True, value[1:-1]
+    if value[:1] in ("-", "−", "–") and len(value) > 1:
+        negative, value = True, value[1:]
+    if not value or not value[0].isdigit():
+        return None
+    if _THOUSANDS_NUMBER.match(value):
+        value = value.replace(".", "").replace(",", "")
+    elif value.count(",") == 1 and "." not in value:
+        value = value.replace(",", ".")
+    elif "," in value and "." in value:
+        # Dấu xuất hiện sau cùng là dấu thập phân
+        decimal = "," if value.rfind(",") > value.rfind(".") else "."
+        value = value.replace("." if decimal == "," else ",", "").replace(decimal, ".")
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return -number if negative else number
+
+
+def detect_unit_multiplier(content: str) -> Optional[int]:
+    """Hệ số quy về đồng theo dòng "Đơn vị tính: ..." trong nội dung, None nếu không có."""
+    match = _UNIT_PATTERN.search(normalize_text(content))
+    if match is None:
+        return None
+    return dict(UNIT_MULTIPLIERS)[match.group(1)]
+
+
+def _split_row(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _clean_item_name(value: str) -> str:
+    value = value.strip(" *_")
+    return _ITEM_NUMBERING.sub("", value).strip(" *_:")
+
+
+def _table_layout(header: List[str]) -> Optional[Dict[str, Any]]:
+    # Xác định cột tên chỉ tiêu, cột mã số, cột thuyết minh theo dòng tiêu đề
+    normalized = [normalize_text(cell).strip(" *") for cell in header]
+    # Dòng có số (trừ năm làm tiêu đề cột) là dòng dữ liệu của bảng bị cắt từ trang trước
+    if any(parse_report_number(cell) is not None and not _YEAR_HEADER.match(cell.strip(" *")) for cell in header[1:]):
+        return None
+    label = next((i for i, cell in enumerate(normalized) if cell.startswith(_LABEL_HEADERS)), 0)
+    # Dòng chỉ có tên (ví dụ "TÀI SẢN") là dòng nhóm chỉ tiêu, không phải tiêu đề cột
+    if not any(cell for i, cell in enumerate(normalized) if i != label):
+        return None
+    code = next((i for i, cell in enumerate(normalized) if cell in _CODE_HEADERS), None)
+    note = next((i for i, cell in enumerate(normalized) if cell.startswith(_NOTE_HEADERS)), None)
+    return {"label": label, "code": code, "note": note}
+
+
+def _table_items(rows: List[List[str]], layout: Dict[str, Any], statement_type: str, multiplier: int):
+    skipped = {layout["label"], layout["code"], layout["note"]}
+    width = max(len(row) for row in rows)
+    # Cột số liệu kỳ hiện tại: cột số đầu tiên (sau tên, mã số, thuyết minh); cột chỉ
+    # gồm số ngắn là cột mã số/thuyết minh không nhận ra được qua tiêu đề
+    value_column = next(
+        (
+            column for column in range(width)
+            if column not in skipped
+            and any(
+                parse_report_number(row[column]) is not None and not _CODE_LIKE.match(row[column].strip(" *"))
+                for row in rows if column < len(row)
+            )
+        ),
+        None,
+    )
+    if value_column is None:
+        return []
+    items = []
+    for row in rows:
+        if layout["label"] >= len(row) or value_column >= len(row):
+            continue
+        name = _clean_item_name(row[layout["label"]])
+        value = parse_report_number(row[value_column])
+        if not name or value is None or parse_report_number(name) is not None:
+            continue
+        code = row[layout["code"]].strip(" *") if layout["code"] is not None and layout["code"] < len(row) else ""
+        items.append({
+            "statement_type": statement_type,
+            "item_key": re.sub(r"\s+", " ", normalize_text(name)),
+            "item_name": name[:255],
+            "item_code": code[:10] or None,
+            "value": value * multiplier,
+        })
+    return items
+
+
+def extract_report_items(documents: List[Document]) -> List[Dict[str, Any]]:
+    """
+    Trích các chỉ tiêu số liệu từ bảng markdown của một báo cáo đã tách theo phần.
+
+    Với mỗi bảng trong phần cân đối kế toán, kết quả kinh doanh, lưu chuyển tiền tệ:
+    cột tên chỉ tiêu và cột mã số được nhận theo dòng tiêu đề, giá trị lấy ở cột số
+    đầu tiên (kỳ hiện tại: "Số cuối kỳ", "Năm nay", "Quý này"). Bảng bị cắt sang
+    trang sau (không có dòng tiêu đề) dùng lại bố cục cột của bảng trước. Giá trị được
+    quy về đồng theo "Đơn vị tính". Chỉ tiêu trùng tên trong một phần chỉ giữ lần đầu.
+
+    Args:
+        documents: Các tài liệu của một file đã tách theo phần (split_by_statement).
+
+    Returns:
+        list[dict]: Mỗi phần tử gồm statement_type, item_key, item_name, item_code, value.
+    """
+    items: Dict[tuple, Dict[str, Any]] = {}
+    multiplier = 1
+    layout: Optional[Dict[str, Any]] = None
+    for document in documents:
+        content = document.get_content(metadata_mode=MetadataMode.NONE)
+        multiplier = detect_unit_multiplier(content) or multiplier
+        statement_type = document.metadata.get("statement_type")
+        if statement_type not in FACT_STATEMENT_TYPES:
+            continue
+
+        tables: List[List[List[str]]] = [[]]
+        for line in content.splitlines():
+            stripped = line.strip()
+            if stripped.startswith("|"):
+                if not _TABLE_SEPARATOR.match(stripped):
+                    tables[-1].append(_split_row(stripped))
+            elif tables[-1]:
+                tables.append([])
+
+        for rows in tables:
+            if not rows:
+                continue
+            header_layout = _table_layout(rows[0])
+            if header_layout is not None:
+                layout, rows = header_layout, rows[1:]
+            if layout is None or not rows:
+                continue
+            for item in _table_items(rows, layout, statement_type, multiplier):
+                items.setdefault((item["statement_type"], item["item_key"]), item)
+    return list(items.values())
+
+
+def save_report_items(
+    engine,
+    symbol: str,
+    year: int,
+    quarter: Optional[int],
+    items: List[Dict[str, Any]],
+    source_file: str,
+) -> int:
+    """
+    Ghi các chỉ tiêu của một báo cáo vào Fact_ReportItems (thay dữ liệu cũ của cùng file).
+
+    Args:
+        engine: SQLAlchemy engine của data warehouse.
+        symbol: Mã chứng khoán.
+        year: Năm của báo cáo.
+        quarter: Quý của báo cáo (None - báo cáo năm, lưu là 0).
+        items: Kết quả của extract_report_items.
+        source_file: Tên file báo cáo.
+
+    Returns:
+        int: Số chỉ tiêu đã ghi (0 nếu mã chưa có trong Dim_Company).
+    """
+    with engine.begin() as connection:
+        stock_key = connection.execute(
+            text('SELECT "StockKey" FROM "Dim_Company" WHERE "StockSymbol" = :symbol'),
+            {"symbol": symbol},
+        ).scalar()
+        if stock_key is None:
+            logger.warning(f"Mã {symbol} chưa có trong Dim_Company, bỏ qua số liệu của {source_file}")
+            return 0
+        connection.execute(
+            text('DELETE FROM "Fact_ReportItems" WHERE "StockKey" = :stock_key AND "SourceFile" = :source_file'),
+            {"stock_key": stock_key, "source_file": source_file},
+        )
+        if items:
+            connection.execute(
+                text(
+                    """
+                    INSERT INTO "Fact_ReportItems"
+                        ("StockKey", "Year", "Quarter", "StatementType", "ItemKey", "ItemName", "ItemCode",
+                         "Value", "SourceFile")
+                    VALUES (:stock_key, :year, :quarter, :statement_type, :item_key, :item_name, :item_code,
+                            :value, :source_file)
+                    ON CONFLICT ("StockKey", "Year", "Quarter", "StatementType", "ItemKey") DO UPDATE
+                    SET "ItemName" = EXCLUDED."ItemName", "ItemCode" = EXCLUDED."ItemCode",
+                        "Value" = EXCLUDED."Value", "SourceFile" = EXCLUDED."SourceFile"
+                    """
+                ),
+                [
+                    dict(item, stock_key=stock_key, year=year, quarter=quarter or 0, source_file=source_file)
+                    for item in items
+                ],
+            )
+    return len(items)
+
+
+def delete_report_items(engine, symbol: str, source_file: str) -> None:
+    """Xóa số liệu của một file báo cáo khỏi Fact_ReportItems (khi file bị xóa)."""
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                DELETE FROM "Fact_ReportItems"
+                WHERE "SourceFile" = :source_file
+                  AND "StockKey" = (SELECT "StockKey" FROM "Dim_Company" WHERE "StockSymbol" = :symbol)
+                """
+            ),
+            {"symbol": symbol, "source_file": source_file},
+        )
@@ -0,0 +1,138 @@
+import logging
+import os
+import re
+from typing import List, Optional
+
+from llama_index.core.schema import Document
+from llama_index.core.vector_stores import FilterCondition, MetadataFilter, MetadataFilters
+
+from .question_parser import _QUARTER_PATTERN, _YEAR_PATTERN, ParsedQuestion, QuestionParser
+from .router import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Suy ra bộ lọc năm/quý/loại báo cáo từ câu hỏi và áp dụng trước khi tìm ANN
+REPORT_FILTER_INFERENCE = os.getenv("REPORT_FILTER_INFERENCE", "true").lower() == "true"
+
+# Tiêu đề (đã bỏ dấu) của các phần trong báo cáo tài chính, ánh xạ về statement_type
+STATEMENT_HEADINGS = {
+    "balance_sheet": ["bang can doi ke toan", "bao cao tinh hinh tai chinh"],
+    "income_statement": ["bao cao ket qua hoat dong kinh doanh", "ket qua hoat dong kinh doanh",
+                         "bao cao ket qua kinh doanh"],
+    "cash_flow": ["bao cao luu chuyen tien te", "luu chuyen tien te"],
+    "notes": ["thuyet minh bao cao tai chinh", "ban thuyet minh"],
+}
+
+# Cách người dùng gọi tên từng loại báo cáo trong câu hỏi
+STATEMENT_QUESTION_KEYWORDS = {
+    "balance_sheet": ["can doi ke toan", "tinh hinh tai chinh"],
+    "income_statement": ["ket qua kinh doanh", "ket qua hoat dong kinh doanh"],
+    "cash_flow": ["luu chuyen tien te", "luu chuyen tien"],
+    "notes": ["thuyet minh"],
+}
+
+# Dòng tiêu đề: markdown heading hoặc dòng ngắn
+_MAX_HEADING_LENGTH = 120
+_MARKDOWN_HEADING = re.compile(r"^#+\s*")
+
+
+def detect_statement_heading(line: str) -> Optional[str]:
+    """Trả về statement_type nếu dòng là tiêu đề của một phần báo cáo, ngược lại None."""
+    stripped = _MARKDOWN_HEADING.sub("", line.strip()).strip("*_ ")
+    if not stripped or len(stripped) > _MAX_HEADING_LENGTH or stripped.startswith("|"):
+        return None
+    normalized = normalize_text(stripped)
+    for statement_type, headings in STATEMENT_HEADINGS.items():
+        if any(normalized.startswith(heading) or normalized == heading for heading in headings):
+            return statement_type
+    return None
+
+
+def split_by_statement(documents: List[Document]) -> List[Document]:
+    """
+    Tách các tài liệu (các trang) của một file báo cáo theo phần báo cáo.
+
+    Mỗi tài liệu kết quả thuộc đúng một phần và được gắn metadata statement_type
+    (balance_sheet, income_statement, cash_flow, notes hoặc other) cùng page, nên các
+    chunk không bao giờ trải qua hai phần. Phần hiện tại được giữ qua các trang cho
+    đến khi gặp tiêu đề của phần khác.
+
+    Args:
+        documents: Các tài liệu của một file, theo thứ tự trang.
+    """
+    results = []
+    current = "other"
+    for position, document in enumerate(documents, start=1):
+        page = document.metadata.get("page_label", position if len(documents) > 1 else None)
+        segments = []
+        lines: List[str] = []
+        for line in document.get_content().splitlines():
+            statement_type = detect_statement_heading(line)
+            if statement_type is not None and statement_type != current:
+                if any(existing.strip() for existing in lines):
+                    segments.append((current, lines))
+                current, lines = statement_type, []
+            lines.append(line)
+        if any(existing.strip() for existing in lines):
+            segments.append((current, lines))
+
+        for statement_type, segment_lines in segments:
+            metadata = dict(document.metadata)
+            metadata["statement_type"] = statement_type
+            if page is not None:
+                metadata["page"] = int(page) if str(page).isdigit() else page
+            results.append(Document(
+                text="\n".join(segment_lines),
+                metadata=metadata,
+                excluded_embed_metadata_keys=document.excluded_embed_metadata_keys,
+                excluded_llm_metadata_keys=document.excluded_llm_metadata_keys,
+            ))
+    return results
+
+
+def infer_report_filters(question: str) -> Optional[MetadataFilters]:
+    """
+    Suy ra bộ lọc metadata từ câu hỏi: năm, quý (cùng cách QuestionParser đọc kỳ
+    dữ liệu) và loại báo cáo nếu câu hỏi gọi tên rõ.
+
+    Ví dụ "lợi nhuận quý 2/2024 của FPT" -> year = 2024, quarter = 2.
+
+    Returns:
+        MetadataFilters hoặc None nếu câu hỏi không nêu kỳ hay loại báo cáo.
+    """
+    normalized = normalize_text(question)
+    filters = []
+    years = sorted({int(year) for year in _YEAR_PATTERN.findall(normalized)})
+    if len(years) > 1:
+        # Câu hỏi so sánh nhiều năm: lọc theo các năm, không lọc quý. Dùng OR các
+        # phép so sánh bằng (so sánh số) thay cho IN (PGVectorStore so sánh IN theo chuỗi)
+        filters.append(MetadataFilters(
+            filters=[MetadataFilter(key="year", value=year) for year in years],
+            condition=FilterCondition.OR,
+        ))
+    else:
+        parsed = ParsedQuestion()
+        QuestionParser._parse_period(normalized, parsed)
+        if parsed.year is not None:
+            filters.append(MetadataFilter(key="year", value=parsed.year))
+        if parsed.quarter is not None and len(_QUARTER_PATTERN.findall(normalized)) == 1:
+            filters.append(MetadataFilter(key="quarter", value=parsed.quarter))
+    statement_types = [
+        statement_type for statement_type, keywords in STATEMENT_QUESTION_KEYWORDS.items()
+        if any(keyword in normalized for keyword in keywords)
+    ]
+    if len(statement_types) == 1:
+        filters.append(MetadataFilter(key="statement_type", value=statement_types[0]))
+    if not filters:
+        return None
+    return MetadataFilters(filters=filters)
+
+
+def combine_filters(*filters: Optional[MetadataFilters]) -> Optional[MetadataFilters]:
+    """Gộp các bộ lọc bằng AND, bỏ qua bộ lọc None."""
+    filters = [item for item in filters if item is not None]
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return MetadataFilters(filters=filters, condition=FilterCondition.AND)
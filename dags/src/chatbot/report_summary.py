@@ -0,0 +1,172 @@
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from llama_index.core.schema import Document, MetadataMode, TextNode
+from llama_index.core.utils import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Truy xuất hai tầng: chọn báo cáo/phần báo cáo qua bảng tóm tắt rồi mới tìm đoạn.
+# Khi bật, lần index sau tạo tóm tắt cho mọi báo cáo chưa có (kể cả file không đổi)
+HIERARCHICAL_RETRIEVAL = os.getenv("HIERARCHICAL_RETRIEVAL", "false").lower() == "true"
+# Cách tạo tóm tắt:
+# - extractive: ghép tiêu đề, tên các chỉ tiêu trong bảng và các câu đầu (không gọi LLM)
+# - llm: gpt-4o tóm tắt từng phần
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "extractive").lower()
+# Số token tối đa của một tóm tắt
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "256"))
+# Số token tối đa của nội dung một phần gửi cho LLM khi SUMMARY_MODE=llm
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", "3000"))
+
+# Tên hiển thị của các phần báo cáo (statement_type của report_metadata)
+STATEMENT_TITLES = {
+    "balance_sheet": "Bảng cân đối kế toán",
+    "income_statement": "Báo cáo kết quả hoạt động kinh doanh",
+    "cash_flow": "Báo cáo lưu chuyển tiền tệ",
+    "notes": "Thuyết minh báo cáo tài chính",
+    "other": "Thông tin chung",
+}
+
+# Metadata của báo cáo được chép sang các node tóm tắt để lọc giống như khi tìm đoạn
+SUMMARY_METADATA_KEYS = ("symbol", "year", "quarter", "file_name")
+
+_TABLE_SEPARATOR = re.compile(r"^\|?[\s:\-|]+\|?$")
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+_SECTION_PROMPT = """Tóm tắt ngắn gọn (tối đa {max_words} từ) phần "{title}" trong báo cáo tài chính {report}.
+Nêu các chỉ tiêu chính có trong phần này và số liệu nổi bật, không bình luận thêm.
+
+{content}"""
+
+
+def summary_table_name(table_name: str) -> str:
+    """Tên bảng vector chứa tóm tắt của các báo cáo trong một bảng."""
+    return f"{table_name}_summary"
+
+
+def _truncate(value: str, max_tokens: int) -> str:
+    tokenizer = get_tokenizer()
+    tokens = tokenizer(value)
+    if len(tokens) <= max_tokens:
+        return value
+    # Cắt theo tỷ lệ ký tự để không phải giải mã token
+    return value[:int(len(value) * max_tokens / len(tokens))].rstrip()
+
+
+def _report_label(metadata: Dict) -> str:
+    label = metadata.get("symbol") or metadata.get("file_name") or ""
+    if metadata.get("quarter") and metadata.get("year"):
+        label += f" quý {metadata['quarter']}/{metadata['year']}"
+    elif metadata.get("year"):
+        label += f" năm {metadata['year']}"
+    return label.strip()
+
+
+def _extractive_summary(title: str, report: str, content: str, max_tokens: int) -> str:
+    # Tên chỉ tiêu (ô đầu của mỗi dòng bảng) là những gì câu hỏi thường nhắc tới
+    labels: "OrderedDict[str, None]" = OrderedDict()
+    sentences: List[str] = []
+    previous_is_table = False
+    for line in content.splitlines():
+        stripped = line.strip()
+        is_table = stripped.startswith("|")
+        # Dòng đầu của bảng là tiêu đề cột, không phải tên chỉ tiêu
+        is_header = is_table and not previous_is_table
+        previous_is_table = is_table
+        if not stripped or stripped.startswith("#"):
+            continue
+        if is_table:
+            if is_header or _TABLE_SEPARATOR.match(stripped):
+                continue
+            cells = [cell.strip(" *") for cell in stripped.strip("|").split("|")]
+            label = next((cell for cell in cells if cell and not re.fullmatch(r"[\d\s.,()%-]+", cell)), None)
+            if label:
+                labels[label] = None
+        elif len(sentences) < 3:
+            sentences.extend(sentence for sentence in _SENTENCE_BOUNDARY.split(stripped)[:3 - len(sentences)])
+    parts = [f"{title} - {report}."]
+    if sentences:
+        parts.append(" ".join(sentences))
+    if labels:
+        parts.append(f"Chỉ tiêu: {'; '.join(labels)}.")
+    return _truncate(" ".join(parts), max_tokens)
+
+
+def _llm_summary(title: str, report: str, content: str, max_tokens: int) -> str:
+    from ...config.models_llm import get_llm_gpt4o
+
+    prompt = _SECTION_PROMPT.format(
+        max_words=max_tokens // 2,
+        title=title,
+        report=report,
+        content=_truncate(content, SUMMARY_INPUT_TOKENS),
+    )
+    summary = str(get_llm_gpt4o().complete(prompt)).strip()
+    return _truncate(f"{title} - {report}. {summary}", max_tokens)
+
+
+def _summary_node(text: str, metadata: Dict) -> TextNode:
+    # Metadata chỉ dùng để lọc, không đưa vào nội dung được nhúng
+    return TextNode(
+        text=text,
+        metadata=metadata,
+        excluded_embed_metadata_keys=list(metadata),
+        excluded_llm_metadata_keys=list(metadata),
+    )
+
+
+def build_report_summaries(
+    documents: List[Document],
+    mode: Optional[str] = None,
+    max_tokens: int = SUMMARY_MAX_TOKENS,
+) -> List[TextNode]:
+    """
+    Tạo các node tóm tắt của một báo cáo: một node cho mỗi phần và một node cho cả báo cáo.
+
+    Node phần mang level="section" cùng statement_type; node báo cáo mang
+    level="report". Cả hai chép symbol, year, quarter, file_name từ báo cáo để truy
+    vấn tầng tóm tắt dùng chung bộ lọc với truy vấn đoạn.
+
+    Args:
+        documents: Các tài liệu của một file đã tách theo phần (split_by_statement).
+        mode: extractive hoặc llm (None - theo SUMMARY_MODE).
+        max_tokens: Số token tối đa của mỗi tóm tắt.
+    """
+    if not documents:
+        return []
+    mode = (mode or SUMMARY_MODE).lower()
+    if mode not in ("extractive", "llm"):
+        raise ValueError(f"SUMMARY_MODE không hợp lệ: {mode} (extractive hoặc llm)")
+    summarize = _llm_summary if mode == "llm" else _extractive_summary
+
+    base_metadata = {
+        key: documents[0].metadata[key] for key in SUMMARY_METADATA_KEYS if key in documents[0].metadata
+    }
+    report = _report_label(base_metadata)
+
+    sections: "OrderedDict[str, List[str]]" = OrderedDict()
+    for document in documents:
+        statement_type = document.metadata.get("statement_type", "other")
+        sections.setdefault(statement_type, []).append(document.get_content(metadata_mode=MetadataMode.NONE))
+
+    nodes = []
+    section_summaries = []
+    for statement_type, contents in sections.items():
+        title = STATEMENT_TITLES.get(statement_type, statement_type)
+        summary = summarize(title, report, "\n".join(contents), max_tokens)
+        section_summaries.append(summary)
+        metadata = dict(base_metadata, statement_type=statement_type, level="section")
+        nodes.append(_summary_node(summary, metadata))
+
+    # Tóm tắt cả báo cáo ghép từ tóm tắt các phần, chia đều số token cho mỗi phần
+    per_section = max(max_tokens // max(len(section_summaries), 1), 16)
+    report_summary = _truncate(
+        f"Báo cáo tài chính {report} gồm: {', '.join(STATEMENT_TITLES.get(key, key) for key in sections)}. "
+        + " ".join(_truncate(summary, per_section) for summary in section_summaries),
+        max_tokens,
+    )
+    nodes.append(_summary_node(report_summary, dict(base_metadata, level="report")))
+    return nodes
@@ -0,0 +1,133 @@
+import logging
+import math
+import os
+import threading
+from typing import Any, List, Optional
+
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Rerank các đoạn báo cáo trước khi đưa vào LLM
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+# Cross-encoder đa ngôn ngữ, chạy cục bộ
+RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-v2-m3")
+# Bỏ các đoạn có điểm rerank (0-1) thấp hơn ngưỡng
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.2"))
+# Dừng khi điểm giảm hơn mức này so với đoạn liền trước
+RERANK_SCORE_GAP = float(os.getenv("RERANK_SCORE_GAP", "0.3"))
+RERANK_MIN_KEEP = int(os.getenv("RERANK_MIN_KEEP", "1"))
+RERANK_MAX_KEEP = int(os.getenv("RERANK_MAX_KEEP", "6"))
+# Tổng số token tối đa của các đoạn được giữ
+RERANK_TOKEN_BUDGET = int(os.getenv("RERANK_TOKEN_BUDGET", "2000"))
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder(model_name: str = RERANK_MODEL):
+    """Cross-encoder dùng chung cho mọi query engine, tải ở lần rerank đầu tiên."""
+    global _cross_encoder
+    if _cross_encoder is None:
+        with _cross_encoder_lock:
+            if _cross_encoder is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError as e:
+                    raise ImportError("RERANK_ENABLED=true cần sentence-transformers") from e
+                logger.info(f"Đang tải cross-encoder {model_name}")
+                _cross_encoder = CrossEncoder(model_name, max_length=512)
+    return _cross_encoder
+
+
+class AdaptiveRerankPostprocessor(BaseNodePostprocessor):
+    """
+    Rerank các đoạn truy xuất được bằng cross-encoder rồi chỉ giữ số đoạn cần thiết.
+
+    Các đoạn được xếp theo điểm rerank và giữ lần lượt cho đến khi gặp một trong các
+    điều kiện dừng: điểm dưới min_score, điểm giảm quá score_gap so với đoạn trước,
+    đã đủ max_keep đoạn, hoặc thêm đoạn sẽ vượt token_budget. Luôn giữ ít nhất
+    min_keep đoạn. Số đoạn giữ lại của mỗi truy vấn được ghi log.
+    """
+
+    min_score: float = Field(default=RERANK_MIN_SCORE, description="Điểm rerank tối thiểu (0-1).")
+    score_gap: float = Field(default=RERANK_SCORE_GAP, description="Mức giảm điểm tối đa giữa hai đoạn liền nhau.")
+    min_keep: int = Field(default=RERANK_MIN_KEEP, description="Số đoạn tối thiểu được giữ.")
+    max_keep: int = Field(default=RERANK_MAX_KEEP, description="Số đoạn tối đa được giữ.")
+    token_budget: int = Field(default=RERANK_TOKEN_BUDGET, description="Tổng token tối đa của các đoạn được giữ.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "AdaptiveRerankPostprocessor"
+
+    @staticmethod
+    def _score(query: str, nodes: List[NodeWithScore]) -> List[float]:
+        pairs = [(query, node.node.get_content(metadata_mode=MetadataMode.EMBED)) for node in nodes]
+        scores = [float(score) for score in get_cross_encoder().predict(pairs)]
+        # Một số phiên bản sentence-transformers trả về logit thay vì xác suất
+        if any(score < 0 or score > 1 for score in scores):
+            scores = [1 / (1 + math.exp(-score)) for score in scores]
+        return scores
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None:
+            raise ValueError("AdaptiveRerankPostprocessor cần câu truy vấn")
+        if not nodes:
+            return []
+
+        scores = self._score(query_bundle.query_str, nodes)
+        ranked = sorted(zip(nodes, scores), key=lambda item: item[1], reverse=True)
+
+        tokenizer = get_tokenizer()
+        kept: List[NodeWithScore] = []
+        tokens = 0
+        reason = "hết ứng viên"
+        previous_score: Optional[float] = None
+        for node, score in ranked:
+            node_tokens = len(tokenizer(node.node.get_content(metadata_mode=MetadataMode.LLM)))
+            if len(kept) >= self.min_keep:
+                if len(kept) >= self.max_keep:
+                    reason = "đủ max_keep"
+                    break
+                if score < self.min_score:
+                    reason = f"điểm {score:.2f} < {self.min_score}"
+                    break
+                if previous_score is not None and previous_score - score > self.score_gap:
+                    reason = f"điểm giảm {previous_score - score:.2f}"
+                    break
+                if tokens + node_tokens > self.token_budget:
+                    reason = f"vượt {self.token_budget} token"
+                    break
+            kept.append(NodeWithScore(node=node.node, score=score))
+            tokens += node_tokens
+            previous_score = score
+
+        logger.info(
+            f"Rerank: giữ {len(kept)}/{len(nodes)} đoạn, {tokens} token, dừng vì {reason} "
+            f"(điểm: {', '.join(f'{result.score:.2f}' for result in kept)})"
+        )
+        return kept
+
+
+def create_report_postprocessors(symbol_count: int = 1) -> List[Any]:
+    """
+    Danh sách node_postprocessors cho query engine báo cáo tài chính.
+
+    Args:
+        symbol_count: Số mã trong một truy vấn; max_keep và token_budget tăng theo số mã.
+    """
+    if not RERANK_ENABLED:
+        return []
+    return [
+        AdaptiveRerankPostprocessor(
+            max_keep=RERANK_MAX_KEEP * symbol_count,
+            token_budget=RERANK_TOKEN_BUDGET * symbol_count,
+        )
+    ]
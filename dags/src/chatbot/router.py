@@ -0,0 +1,189 @@
+import logging
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from llama_index.core.tools import BaseTool
+from llama_index.core.utils import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Các tiền tố pháp lý thường gặp trong tên công ty, bỏ đi để tạo tên gọi ngắn
+COMPANY_NAME_PREFIXES = [
+    "ngân hàng thương mại cổ phần", "ngân hàng tmcp", "ngân hàng",
+    "tổng công ty cổ phần", "tổng công ty", "tập đoàn",
+    "công ty cổ phần", "công ty tnhh", "công ty", "ctcp",
+]
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+_TERMINAL = "$"
+
+
+def normalize_text(value: str) -> str:
+    """Chuẩn hóa chuỗi: chữ thường, bỏ dấu tiếng Việt, đổi đ thành d."""
+    value = unicodedata.normalize("NFD", value.lower())
+    value = "".join(ch for ch in value if unicodedata.category(ch) != "Mn")
+    return value.replace("đ", "d")
+
+
+def tokenize(value: str) -> List[str]:
+    """Tách chuỗi đã chuẩn hóa thành các từ."""
+    return _TOKEN_PATTERN.findall(normalize_text(value))
+
+
+class PhraseTrie:
+    """
+    Trie theo từ dùng để tìm các cụm từ đã biết trong một câu.
+
+    Mỗi cụm từ được gắn với một hoặc nhiều giá trị. Khi tìm, câu được quét một lần
+    và tại mỗi vị trí chọn cụm dài nhất khớp được.
+    """
+
+    def __init__(self):
+        self._root: Dict = {}
+
+    def add(self, phrase: str, value: str) -> None:
+        """Thêm một cụm từ và giá trị tương ứng."""
+        tokens = tokenize(phrase)
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(_TERMINAL, set()).add(value)
+
+    def find(self, sentence: str) -> List[str]:
+        """
+        Tìm các giá trị của những cụm từ xuất hiện trong câu.
+
+        Returns:
+            List[str]: Các giá trị theo thứ tự xuất hiện, không trùng lặp.
+        """
+        tokens = tokenize(sentence)
+        values: List[str] = []
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            match_end, match_values = None, None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if _TERMINAL in node:
+                    match_end, match_values = j, node[_TERMINAL]
+            if match_end is None:
+                i += 1
+                continue
+            for value in sorted(match_values):
+                if value not in values:
+                    values.append(value)
+            i = match_end
+        return values
+
+
+class TickerRouter:
+    """
+    Bộ định tuyến nhanh trích xuất mã chứng khoán từ câu hỏi.
+
+    Dùng một trie theo từ được xây dựng từ StockSymbol, ShortName và CompanyName
+    của bảng Dim_Company. Câu hỏi được quét một lần, tại mỗi vị trí chọn tên dài
+    nhất khớp được, nên chi phí tỷ lệ với độ dài câu hỏi chứ không với số công ty.
+    """
+
+    def __init__(self, engine=None, fallback_symbols: Optional[Sequence[str]] = None):
+        """
+        Khởi tạo bộ định tuyến.
+
+        Args:
+            engine: SQLAlchemy engine của data warehouse để đọc Dim_Company.
+            fallback_symbols: Danh sách mã dùng khi không đọc được Dim_Company.
+        """
+        self.engine = engine
+        self.fallback_symbols = list(fallback_symbols or [])
+        self._trie: Optional[PhraseTrie] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Xây dựng (lại) trie từ Dim_Company."""
+        aliases = [(symbol, symbol) for symbol in self.fallback_symbols]
+        if self.engine is not None:
+            try:
+                aliases.extend(self._load_company_aliases())
+            except Exception as e:
+                logger.warning(f"Không đọc được Dim_Company, chỉ dùng danh sách mã mặc định: {str(e)}")
+
+        trie = PhraseTrie()
+        for symbol, alias in aliases:
+            trie.add(alias, symbol)
+
+        with self._lock:
+            self._trie = trie
+
+    def _load_company_aliases(self) -> List[Tuple[str, str]]:
+        query = 'SELECT "StockSymbol", "ShortName", "CompanyName" FROM "Dim_Company"'
+        with Session(self.engine) as session:
+            companies = pd.read_sql(text(query), session.connection())
+
+        aliases = []
+        for row in companies.itertuples(index=False):
+            symbol = str(row.StockSymbol).strip().upper()
+            if not symbol:
+                continue
+            aliases.append((symbol, symbol))
+            for name in (row.ShortName, row.CompanyName):
+                if not isinstance(name, str) or not name.strip():
+                    continue
+                aliases.append((symbol, name))
+                short_name = self._strip_prefix(name)
+                # Chỉ dùng tên rút gọn nếu còn đủ dài để không khớp nhầm
+                if short_name and len(tokenize(short_name)) >= 2:
+                    aliases.append((symbol, short_name))
+        return aliases
+
+    @staticmethod
+    def _strip_prefix(name: str) -> str:
+        lowered = name.lower().strip()
+        for prefix in COMPANY_NAME_PREFIXES:
+            if lowered.startswith(prefix):
+                return name.strip()[len(prefix):].strip(" -")
+        return ""
+
+    def extract_symbols(self, question: str) -> List[str]:
+        """
+        Trích xuất các mã chứng khoán được nhắc đến trong câu hỏi.
+
+        Args:
+            question: Câu hỏi của người dùng.
+
+        Returns:
+            List[str]: Danh sách mã theo thứ tự xuất hiện, không trùng lặp.
+        """
+        if self._trie is None:
+            self.load()
+        return self._trie.find(question)
+
+
+def count_tool_prompt_tokens(tools: Iterable[BaseTool]) -> int:
+    """Ước lượng số token mà phần mô tả các công cụ chiếm trong prompt của agent."""
+    tokenizer = get_tokenizer()
+    total = 0
+    for tool in tools:
+        metadata = tool.metadata
+        total += len(tokenizer(f"{metadata.name}\n{metadata.description}\n{metadata.fn_schema_str}"))
+    return total
+
+
+def log_prompt_savings(all_tools: Sequence[BaseTool], routed_tools: Sequence[BaseTool]) -> int:
+    """Ghi log số token prompt tiết kiệm được nhờ định tuyến, trả về số token tiết kiệm."""
+    full_tokens = count_tool_prompt_tokens(all_tools)
+    routed_tokens = count_tool_prompt_tokens(routed_tools)
+    saved = full_tokens - routed_tokens
+    logger.info(
+        f"Định tuyến: {len(routed_tools)}/{len(all_tools)} công cụ, "
+        f"tiết kiệm {saved} token prompt ({routed_tokens}/{full_tokens})"
+    )
+    return saved
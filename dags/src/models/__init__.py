@@ -3,8 +3,10 @@ from .dim_time import DimTime
 from .dim_ratio import DimRatio
 from .fact_financial_ratios import FactFinancialRatios
 from .fact_stock_price import FactStockPrice
+from .fact_report_items import FactReportItems
 
 
 __all__ = [
-    "DimCompany", "DimTime", "DimRatio", "FactFinancialRatios", "FactStockPrice"
+    "DimCompany", "DimTime", "DimRatio", "FactFinancialRatios", "FactStockPrice",
+    "FactReportItems"
 ]
\ No newline at end of file
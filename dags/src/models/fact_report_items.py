@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DECIMAL
+from sqlalchemy.orm import relationship
+from config.database import Base
+
+class FactReportItems(Base):
+    __tablename__ = 'Fact_ReportItems'
+    
+    StockKey = Column(Integer, ForeignKey('Dim_Company.StockKey'), primary_key=True)
+    Year = Column(Integer, primary_key=True)
+    Quarter = Column(Integer, primary_key=True)  # 0 - báo cáo năm
+    StatementType = Column(String(20), primary_key=True)  # balance_sheet, income_statement, cash_flow
+    ItemKey = Column(String(255), primary_key=True)  # Tên chỉ tiêu đã chuẩn hóa (bỏ dấu, chữ thường)
+    ItemName = Column(String(255))
+    ItemCode = Column(String(10))  # Mã số của chỉ tiêu trong báo cáo (nếu có)
+    Value = Column(DECIMAL(24, 2))  # Đơn vị: đồng
+    SourceFile = Column(String(255))
+    
+    # Relationships (tùy chọn, hỗ trợ truy vấn ORM)
+    company = relationship("DimCompany", backref="fact_report_items")
@@ -1,5 +1,6 @@
 import streamlit as st
-from dags.src.chatbot import chatbot_agent
+# Import nhẹ: agent chỉ được tải khi người dùng gửi câu hỏi đầu tiên
+import dags.src.chatbot as chatbot
 
 # Cấu hình trang
 st.set_page_config(
@@ -57,16 +58,27 @@ if prompt:
         with st.chat_message("user", avatar="👤"):
             st.markdown(prompt)
     
-    # Gọi chatbot và hiển thị phản hồi
-    try:
-        response = chatbot_agent(prompt)
-    except Exception as e:
-        response = f"Đã xảy ra lỗi: {str(e)}"
-    
-    # Thêm phản hồi vào lịch sử trò chuyện
-    st.session_state.messages.append({"role": "assistant", "content": response})
-    
-    # Hiển thị phản hồi của bot
+    # Gọi chatbot và hiển thị phản hồi ngay khi từng phần được sinh ra
     with chat_container:
         with st.chat_message("assistant", avatar="🤖"):
-            st.markdown(response)
\ No newline at end of file
+            status = st.status("Đang phân tích...", expanded=False)
+            placeholder = st.empty()
+            response = ""
+            try:
+                for event in chatbot.stream_chatbot_agent(prompt):
+                    if event["type"] == "tool":
+                        status.write(f"🔧 {event['tool']}: {event['input']}")
+                    elif event["type"] == "status":
+                        status.update(label=event["content"])
+                    elif event["type"] == "token":
+                        response += event["content"]
+                        placeholder.markdown(response + "▌")
+                    elif event["type"] == "error":
+                        response = event["content"]
+            except Exception as e:
+                response = f"Đã xảy ra lỗi: {str(e)}"
+            status.update(label="Hoàn tất", state="complete")
+            placeholder.markdown(response)
+    
+    # Thêm phản hồi vào lịch sử trò chuyện
+    st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
@@ -13,7 +13,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from dags.config.database import Base, SQLALCHEMY_DATABASE_URL
 # Import tất cả các models
-from dags.src.models import (DimRatio, DimCompany, DimTime, FactFinancialRatios, FactStockPrice)
+from dags.src.models import (DimRatio, DimCompany, DimTime, FactFinancialRatios, FactStockPrice,
+                             FactReportItems)
 
 
 # this is the Alembic Config object, which provides
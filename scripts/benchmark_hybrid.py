@@ -0,0 +1,151 @@
+"""
+So sánh truy xuất chỉ theo vector với truy xuất hybrid (BM25 + vector) trên bộ câu
+hỏi có nhãn, để chọn HYBRID_SIMILARITY_TOP_K nhỏ nhất mà chất lượng không giảm.
+
+Bộ câu hỏi cùng định dạng JSONL với scripts/benchmark_retrieval.py, thêm hai khóa
+tùy chọn:
+    {"question": "...", "relevant_texts": ["vòng quay hàng tồn kho"],
+     "symbols": ["ACB"], "answer": "Vòng quay hàng tồn kho năm 2024 là 5,2 lần"}
+- symbols: lọc theo mã (bảng dùng chung)
+- answer: câu trả lời chuẩn, dùng khi chạy với --judge
+
+Với mỗi cấu hình, script in hit rate@k (có ít nhất một đoạn đúng), MRR, số token
+context đưa vào LLM và độ trễ truy xuất. Với --rerank, mỗi cấu hình được đo thêm khi
+có AdaptiveRerankPostprocessor (độ trễ gồm cả rerank). Với --hierarchical, đo thêm
+truy xuất hai tầng qua bảng tóm tắt (cần index với HIERARCHICAL_RETRIEVAL=true). Với --judge, câu trả lời của gpt-4o theo
+mỗi cấu hình được chấm 1-5 so với answer bằng CorrectnessEvaluator.
+
+Cách dùng:
+    python scripts/benchmark_hybrid.py --table financials_report --queries-file queries.jsonl
+    python scripts/benchmark_hybrid.py --table financials_report --queries-file queries.jsonl \\
+        --vector-top-k 10 --hybrid-top-k 3 4 5 --alpha 0.3 0.5 0.7 --judge
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.utils import get_tokenizer
+
+from dags.config.models_llm import get_llm_gpt4o
+from dags.src.chatbot.hierarchical_retriever import HierarchicalRetriever
+from dags.src.chatbot.hybrid_retriever import HybridRetriever
+from dags.src.chatbot.index_to_vectostore import load_indexs, symbol_filters
+from dags.src.chatbot.report_summary import summary_table_name
+from dags.src.chatbot.rerank import AdaptiveRerankPostprocessor
+
+logger = logging.getLogger(__name__)
+
+
+def is_relevant(node, item):
+    if node.node_id in (item.get("relevant_node_ids") or []):
+        return True
+    content = node.get_content().lower()
+    return any(value.lower() in content for value in item.get("relevant_texts") or [])
+
+
+def evaluate(name, make_retriever, items, judge, postprocessors=None):
+    """Chạy bộ câu hỏi với một cấu hình truy xuất (và rerank nếu có) rồi in các chỉ số."""
+    tokenizer = get_tokenizer()
+    hits, reciprocal_ranks, context_tokens, latencies, scores = [], [], [], [], []
+    evaluator = None
+    if judge:
+        from llama_index.core.evaluation import CorrectnessEvaluator
+        evaluator = CorrectnessEvaluator(llm=get_llm_gpt4o())
+
+    for item in items:
+        retriever = make_retriever(item)
+        start = time.perf_counter()
+        results = retriever.retrieve(item["question"])
+        for postprocessor in postprocessors or []:
+            results = postprocessor.postprocess_nodes(results, query_str=item["question"])
+        latencies.append(1000 * (time.perf_counter() - start))
+        ranks = [rank for rank, result in enumerate(results, start=1) if is_relevant(result.node, item)]
+        hits.append(1.0 if ranks else 0.0)
+        reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+        context_tokens.append(sum(len(tokenizer(result.node.get_content())) for result in results))
+
+        if evaluator is not None and item.get("answer"):
+            query_engine = RetrieverQueryEngine.from_args(
+                retriever, llm=get_llm_gpt4o(), node_postprocessors=postprocessors
+            )
+            response = query_engine.query(item["question"])
+            result = evaluator.evaluate(query=item["question"], response=str(response), reference=item["answer"])
+            scores.append(result.score or 0.0)
+
+    line = (f"{name:<34}{np.mean(hits):>8.3f}{np.mean(reciprocal_ranks):>8.3f}"
+            f"{np.mean(context_tokens):>10.0f}{np.percentile(latencies, 50):>10.1f}")
+    if judge:
+        line += f"{np.mean(scores) if scores else float('nan'):>8.2f}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh truy xuất vector và hybrid")
+    parser.add_argument("--table", required=True, help="Tên bảng vector (như khi truyền vào load_indexs)")
+    parser.add_argument("--queries-file", required=True, help="Bộ câu hỏi có nhãn (JSONL)")
+    parser.add_argument("--vector-top-k", type=int, nargs="+", default=[10])
+    parser.add_argument("--hybrid-top-k", type=int, nargs="+", default=[3, 4, 5])
+    parser.add_argument("--alpha", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--judge", action="store_true", help="Chấm câu trả lời của gpt-4o so với answer")
+    parser.add_argument("--rerank", action="store_true", help="Đo thêm mỗi cấu hình khi có AdaptiveRerankPostprocessor")
+    parser.add_argument("--hierarchical", action="store_true", help="Đo thêm truy xuất hai tầng qua bảng tóm tắt")
+    parser.add_argument("--summary-top-k", type=int, default=3, help="Số tóm tắt chọn ở tầng thứ nhất")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    with open(args.queries_file, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    if not items:
+        logger.error(f"{args.queries_file} không có câu hỏi nào")
+        sys.exit(1)
+
+    index = load_indexs(args.table)
+
+    def filters_for(item):
+        return symbol_filters(item["symbols"]) if item.get("symbols") else None
+
+    header = f"{'Cấu hình':<34}{'hit@k':>8}{'MRR':>8}{'token':>10}{'p50(ms)':>10}"
+    print(header + (f"{'điểm':>8}" if args.judge else ""))
+    configs = [
+        (f"vector k={k}", lambda item, k=k: index.as_retriever(similarity_top_k=k, filters=filters_for(item)))
+        for k in args.vector_top_k
+    ]
+    configs.extend(
+        (
+            f"hybrid k={k} alpha={alpha}",
+            lambda item, k=k, alpha=alpha: HybridRetriever(
+                index, similarity_top_k=k, alpha=alpha, filters=filters_for(item)
+            ),
+        )
+        for alpha in args.alpha
+        for k in args.hybrid_top_k
+    )
+    if args.hierarchical:
+        summary_index = load_indexs(summary_table_name(args.table))
+        configs.extend(
+            (
+                f"hierarchical k={k} s={args.summary_top_k}",
+                lambda item, k=k: HierarchicalRetriever(
+                    index, summary_index, similarity_top_k=k, summary_top_k=args.summary_top_k,
+                    filters=filters_for(item),
+                ),
+            )
+            for k in args.vector_top_k
+        )
+    for name, make_retriever in configs:
+        evaluate(name, make_retriever, items, args.judge)
+        if args.rerank:
+            evaluate(f"{name} + rerank", make_retriever, items, args.judge, [AdaptiveRerankPostprocessor()])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Đo chất lượng và tốc độ truy xuất báo cáo tài chính trên một lưới tham số HNSW.
+
+Với mỗi cỡ kho dữ liệu (--corpus-sizes), script lấy mẫu các đoạn đã nhúng từ một bảng
+vector có sẵn (không nhúng lại) vào bảng tạm, rồi với mỗi cặp (m, ef_construction)
+tạo HNSW và đo thời gian tạo. Với mỗi ef_search và top_k, bộ câu hỏi có nhãn được
+chạy qua PGVectorStore để tính recall@k và độ trễ p50/p95.
+
+Bộ câu hỏi là file JSONL, mỗi dòng một câu hỏi:
+    {"question": "Doanh thu thuần năm 2024 của ACB?", "relevant_node_ids": ["..."]}
+    {"question": "Tỷ lệ nợ xấu của BID", "relevant_texts": ["nợ xấu"]}
+Một đoạn là đúng nếu node_id nằm trong relevant_node_ids hoặc chứa một trong các
+chuỗi relevant_texts. Câu hỏi không có nhãn dùng top-k tìm chính xác (không dùng
+index) làm kết quả đúng. Câu hỏi không có đoạn đúng nào trong mẫu bị bỏ qua.
+
+Cách dùng:
+    python scripts/benchmark_retrieval.py --source-table financials_report --queries-file queries.jsonl
+    python scripts/benchmark_retrieval.py --source-table financials_report --queries-file queries.jsonl \\
+        --corpus-sizes 5000 50000 --m 8 16 32 --ef-construction 64 128 --ef-search 20 40 80 160 \\
+        --top-k 5 10 20 --output results.csv
+
+Kết quả dùng để đặt HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH và
+REPORT_SIMILARITY_TOP_K.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from dags.config.vectostore import disable_statement_timeout, get_embed_model, get_vector_engine
+from dags.src.chatbot.index_to_vectostore import _create_vector_store, hnsw_settings
+
+logger = logging.getLogger(__name__)
+
+BENCH_TABLE = "bench_retrieval"
+
+
+def load_query_set(path):
+    """Đọc bộ câu hỏi có nhãn và nhúng các câu hỏi bằng embedding model hiện tại."""
+    with open(path, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    embed_model = get_embed_model()
+    for item in items:
+        item["embedding"] = embed_model.get_query_embedding(item["question"])
+    return items
+
+
+def create_sample(connection, source_table, target_table, size, column_type):
+    """Lấy mẫu size đoạn (None - toàn bộ) từ bảng nguồn sang bảng thử nghiệm chưa có HNSW."""
+    # HNSW của lần đo trước được xóa để ghi mẫu mới không phải cập nhật index
+    connection.execute(text(f"DROP INDEX IF EXISTS {target_table}_embedding_idx"))
+    connection.execute(text(f"TRUNCATE {target_table}"))
+    limit = "ORDER BY random() LIMIT :size" if size else ""
+    connection.execute(
+        text(
+            f"""
+            INSERT INTO {target_table} (node_id, text, metadata_, embedding)
+            SELECT node_id, text, metadata_, embedding::{column_type}(1024) FROM {source_table} {limit}
+            """
+        ),
+        {"size": size} if size else {},
+    )
+    connection.execute(text(f"ANALYZE {target_table}"))
+    return connection.execute(text(f"SELECT count(*) FROM {target_table}")).scalar()
+
+
+def relevant_sets(connection, table, items, k, column_type):
+    """Tập node_id đúng của mỗi câu hỏi trong bảng mẫu (None nếu không có)."""
+    results = []
+    for item in items:
+        node_ids = item.get("relevant_node_ids") or []
+        patterns = [f"%{value}%" for value in item.get("relevant_texts") or []]
+        if node_ids or patterns:
+            rows = connection.execute(
+                text(f"SELECT node_id FROM {table} WHERE node_id = ANY(:node_ids) OR text ILIKE ANY(:patterns)"),
+                {"node_ids": node_ids, "patterns": patterns},
+            ).scalars().all()
+        else:
+            connection.execute(text("SET enable_indexscan = off"))
+            rows = connection.execute(
+                text(
+                    f"SELECT node_id FROM {table} "
+                    f"ORDER BY embedding <=> CAST(:embedding AS {column_type}) LIMIT :limit"
+                ),
+                {"embedding": json.dumps(item["embedding"]), "limit": k},
+            ).scalars().all()
+            connection.execute(text("RESET enable_indexscan"))
+        results.append(set(rows) or None)
+    return results
+
+
+def build_index(connection, table, m, ef_construction, dist_method):
+    """Tạo lại HNSW với tham số cho trước, trả về thời gian tạo (giây) và kích thước (MB)."""
+    # Trùng tên index của PGVectorStore để store không tạo thêm index khác
+    index_name = f"{table}_embedding_idx"
+    connection.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+    start = time.perf_counter()
+    connection.execute(
+        text(
+            f"CREATE INDEX {index_name} ON {table} USING hnsw (embedding {dist_method}) "
+            f"WITH (m = {m}, ef_construction = {ef_construction})"
+        )
+    )
+    seconds = time.perf_counter() - start
+    size = connection.execute(text("SELECT pg_relation_size(to_regclass(:index))"), {"index": index_name}).scalar()
+    return seconds, size / (1024 * 1024)
+
+
+def run_queries(store, items, relevant, k, ef_search):
+    """Chạy bộ câu hỏi, trả về (recall@k, độ trễ p50, p95 tính bằng ms)."""
+    recalls = []
+    latencies = []
+    store.query(VectorStoreQuery(query_embedding=items[0]["embedding"], similarity_top_k=k), hnsw_ef_search=ef_search)
+    for item, expected in zip(items, relevant):
+        if not expected:
+            continue
+        start = time.perf_counter()
+        result = store.query(
+            VectorStoreQuery(query_embedding=item["embedding"], similarity_top_k=k),
+            hnsw_ef_search=ef_search,
+        )
+        latencies.append(1000 * (time.perf_counter() - start))
+        recalls.append(len(set(result.ids) & expected) / min(k, len(expected)))
+    if not recalls:
+        return 0.0, 0.0, 0.0
+    return float(np.mean(recalls)), float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark truy xuất và lưới tham số HNSW")
+    parser.add_argument("--source-table", required=True, help="Bảng vector đã index (như khi truyền vào load_indexs)")
+    parser.add_argument("--queries-file", required=True, help="Bộ câu hỏi có nhãn (JSONL)")
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[0], help="Cỡ mẫu (0 - toàn bộ bảng)")
+    parser.add_argument("--m", type=int, nargs="+", default=[16])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[20, 40, 80, 160])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--storage-mode", choices=["vector", "halfvec"], default="vector")
+    parser.add_argument("--output", help="Ghi kết quả ra file CSV")
+    parser.add_argument("--keep", action="store_true", help="Giữ lại bảng thử nghiệm sau khi đo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    items = load_query_set(args.queries_file)
+    if not items:
+        logger.error(f"{args.queries_file} không có câu hỏi nào")
+        sys.exit(1)
+
+    source_table = f"data_{args.source_table.lower()}"
+    bench_table = f"data_{BENCH_TABLE}"
+    dist_method = "halfvec_cosine_ops" if args.storage_mode == "halfvec" else "vector_cosine_ops"
+    vector_engine = get_vector_engine()
+
+    # Bảng thử nghiệm được tạo không có HNSW; index được tạo riêng để đo thời gian
+    _create_vector_store(BENCH_TABLE, storage_mode=args.storage_mode, hnsw_kwargs=None)._initialize()
+
+    rows = []
+    print(f"{'corpus':>8}{'m':>5}{'ef_c':>6}{'build(s)':>10}{'MB':>8}{'ef_s':>6}{'k':>4}"
+          f"{'recall':>9}{'p50(ms)':>10}{'p95(ms)':>10}")
+    try:
+        for corpus_size in args.corpus_sizes:
+            with vector_engine.begin() as connection:
+                # Lấy mẫu, tìm chính xác và tạo HNSW trên kho lớn vượt statement_timeout của pool
+                disable_statement_timeout(connection)
+                count = create_sample(connection, source_table, bench_table, corpus_size, args.storage_mode)
+                relevant = {
+                    k: relevant_sets(connection, bench_table, items, k, args.storage_mode) for k in args.top_k
+                }
+            logger.info(f"Mẫu {count} đoạn, {sum(1 for r in relevant[args.top_k[0]] if r)} câu hỏi có đoạn đúng")
+
+            for m in args.m:
+                for ef_construction in args.ef_construction:
+                    with vector_engine.begin() as connection:
+                        disable_statement_timeout(connection)
+                        build_seconds, index_mb = build_index(connection, bench_table, m, ef_construction, dist_method)
+                    store = _create_vector_store(
+                        BENCH_TABLE,
+                        storage_mode=args.storage_mode,
+                        hnsw_kwargs=hnsw_settings(m, ef_construction, dist_method=dist_method),
+                    )
+                    for ef_search in args.ef_search:
+                        for k in args.top_k:
+                            recall, p50, p95 = run_queries(store, items, relevant[k], k, ef_search)
+                            row = {
+                                "corpus_size": count, "m": m, "ef_construction": ef_construction,
+                                "build_seconds": round(build_seconds, 2), "index_mb": round(index_mb, 1),
+                                "ef_search": ef_search, "top_k": k, "recall": round(recall, 4),
+                                "p50_ms": round(p50, 2), "p95_ms": round(p95, 2),
+                            }
+                            rows.append(row)
+                            print(f"{count:>8}{m:>5}{ef_construction:>6}{build_seconds:>10.2f}{index_mb:>8.1f}"
+                                  f"{ef_search:>6}{k:>4}{recall:>9.3f}{p50:>10.2f}{p95:>10.2f}")
+    finally:
+        if not args.keep:
+            with vector_engine.begin() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS {bench_table}"))
+        vector_engine.dispose()
+
+    if args.output and rows:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        logger.info(f"Đã ghi {len(rows)} dòng kết quả vào {args.output}")
+
+
+if __name__ == "__main__":
+    main()
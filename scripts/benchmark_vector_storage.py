@@ -0,0 +1,200 @@
+"""
+So sánh độ phủ (recall) và độ trễ truy vấn ANN giữa bảng vector float32 hiện tại và
+các kiểu lưu nén (VECTOR_STORAGE_MODE):
+- vector: bảng hiện tại, HNSW vector_cosine_ops
+- halfvec: vector half precision, HNSW halfvec_cosine_ops
+- halfvec_binary: lượt đầu bằng HNSW trên vector nhị phân, xếp hạng lại bằng cosine
+  trên halfvec, với nhiều hệ số ứng viên (--rescore-factors)
+
+Dữ liệu của bảng được sao chép sang bảng tạm "{table}__halfvec" (vector ép sang
+halfvec, không cần nhúng lại). Kết quả đúng là top-k tìm chính xác (không dùng index)
+trên vector float32. Câu truy vấn là vector của các đoạn lấy ngẫu nhiên trong bảng
+(đoạn đó bị loại khỏi kết quả) hoặc các câu trong --queries-file.
+
+Script in kích thước bảng/index, recall@k, độ trễ p50/p95 của từng kiểu lưu.
+
+Cách dùng:
+    python scripts/benchmark_vector_storage.py --table financials_report
+    python scripts/benchmark_vector_storage.py --table ACB_financials_report --queries 200 --rescore-factors 2 4 8
+    python scripts/benchmark_vector_storage.py --table financials_report --convert   # chuyển hẳn bảng sang halfvec
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from dags.config.vectostore import disable_statement_timeout, get_embed_model, get_vector_engine
+from dags.src.chatbot.compressed_vector_store import convert_table_to_halfvec
+from dags.src.chatbot.index_to_vectostore import (
+    HNSW_EF_CONSTRUCTION, HNSW_M, VECTOR_STORAGE_MODE, _create_vector_store,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def load_queries(connection, data_table, count, queries_file):
+    """Trả về danh sách (node_id của đoạn dùng làm truy vấn hoặc None, vector)."""
+    if queries_file:
+        with open(queries_file, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        embed_model = get_embed_model()
+        return [(None, embed_model.get_query_embedding(question)) for question in questions]
+
+    rows = connection.execute(
+        text(f"SELECT node_id, embedding::text FROM {data_table} ORDER BY random() LIMIT :count"),
+        {"count": count},
+    ).fetchall()
+    return [(node_id, json.loads(embedding)) for node_id, embedding in rows]
+
+
+def exact_top_k(connection, data_table, queries, k):
+    """Top-k chính xác theo cosine trên vector float32 (tắt index scan)."""
+    results = []
+    connection.execute(text("SET enable_indexscan = off"))
+    for node_id, embedding in queries:
+        rows = connection.execute(
+            text(
+                f"SELECT node_id FROM {data_table} "
+                f"ORDER BY embedding <=> CAST(:embedding AS vector) LIMIT :limit"
+            ),
+            {"embedding": json.dumps(embedding), "limit": k + 1},
+        ).scalars().all()
+        results.append([row for row in rows if row != node_id][:k])
+    connection.execute(text("RESET enable_indexscan"))
+    return results
+
+
+def copy_to_halfvec(connection, source_table, target_table):
+    """Sao chép các node sang bảng halfvec (đã được tạo sẵn cùng index)."""
+    connection.execute(text(f"TRUNCATE {target_table}"))
+    connection.execute(
+        text(
+            f"""
+            INSERT INTO {target_table} (node_id, text, metadata_, embedding)
+            SELECT node_id, text, metadata_, embedding::halfvec(1024) FROM {source_table}
+            """
+        )
+    )
+
+
+def relation_sizes(connection, data_table):
+    """Kích thước bảng (kể cả TOAST) và từng index, tính bằng MB."""
+    table_size = connection.execute(
+        text("SELECT pg_table_size(to_regclass(:table))"), {"table": data_table}
+    ).scalar()
+    index_rows = connection.execute(
+        text(
+            """
+            SELECT indexrelid::regclass::text, pg_relation_size(indexrelid)
+            FROM pg_index WHERE indrelid = to_regclass(:table)
+            """
+        ),
+        {"table": data_table},
+    ).fetchall()
+    mb = 1024 * 1024
+    return table_size / mb, {name: size / mb for name, size in index_rows}
+
+
+def run_queries(store, queries, k):
+    """Chạy các truy vấn, trả về (danh sách node_id mỗi truy vấn, độ trễ ms)."""
+    results = []
+    latencies = []
+    # Truy vấn khởi động để không tính thời gian mở kết nối và nạp index
+    store.query(VectorStoreQuery(query_embedding=queries[0][1], similarity_top_k=k + 1))
+    for node_id, embedding in queries:
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=k + 1))
+        latencies.append(1000 * (time.perf_counter() - start))
+        results.append([row for row in result.ids if row != node_id][:k])
+    return results, latencies
+
+
+def recall(reference, candidate, k):
+    return float(np.mean([len(set(a) & set(b)) / max(1, min(k, len(a))) for a, b in zip(reference, candidate)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo recall/độ trễ của các kiểu lưu vector")
+    parser.add_argument("--table", required=True, help="Tên bảng vector (như khi truyền vào load_indexs)")
+    parser.add_argument("--queries", type=int, default=100, help="Số đoạn lấy ngẫu nhiên làm truy vấn")
+    parser.add_argument("--queries-file", help="File câu truy vấn, mỗi dòng một câu (nhúng bằng model hiện tại)")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--keep", action="store_true", help="Giữ lại bảng halfvec tạm sau khi đo")
+    parser.add_argument("--convert", action="store_true", help="Chuyển hẳn bảng sang halfvec rồi thoát")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    vector_engine = get_vector_engine()
+    if args.convert:
+        convert_table_to_halfvec(
+            vector_engine,
+            args.table,
+            hnsw_m=HNSW_M,
+            hnsw_ef_construction=HNSW_EF_CONSTRUCTION,
+            binary_index=VECTOR_STORAGE_MODE == "halfvec_binary",
+        )
+        vector_engine.dispose()
+        return
+
+    source_table = f"data_{args.table.lower()}"
+    copy_name = f"{args.table}__halfvec"
+    copy_table = f"data_{copy_name.lower()}"
+
+    with vector_engine.begin() as connection:
+        # Tìm chính xác (không dùng index) trên bảng thật vượt statement_timeout của pool
+        disable_statement_timeout(connection)
+        queries = load_queries(connection, source_table, args.queries, args.queries_file)
+        if not queries:
+            logger.error(f"Bảng {source_table} không có dữ liệu")
+            sys.exit(1)
+        logger.info(f"Tính top-{args.top_k} chính xác cho {len(queries)} truy vấn")
+        reference = exact_top_k(connection, source_table, queries, args.top_k)
+
+    # Tạo bảng halfvec cùng cả hai HNSW (halfvec và nhị phân) rồi sao chép dữ liệu
+    _create_vector_store(copy_name, storage_mode="halfvec_binary")._initialize()
+    with vector_engine.begin() as connection:
+        disable_statement_timeout(connection)
+        logger.info(f"Sao chép {source_table} sang {copy_table}")
+        copy_to_halfvec(connection, source_table, copy_table)
+        connection.execute(text(f"ANALYZE {copy_table}"))
+
+    variants = [("vector", _create_vector_store(args.table, storage_mode="vector"))]
+    variants.append(("halfvec", _create_vector_store(copy_name, storage_mode="halfvec")))
+    for factor in args.rescore_factors:
+        store = _create_vector_store(copy_name, storage_mode="halfvec_binary", rescore_factor=factor)
+        variants.append((f"halfvec_binary x{factor}", store))
+
+    try:
+        with vector_engine.connect() as connection:
+            sizes = {name: relation_sizes(connection, name) for name in (source_table, copy_table)}
+        for name, (table_size, index_sizes) in sizes.items():
+            indexes = ", ".join(f"{index} {size:.1f} MB" for index, size in index_sizes.items())
+            print(f"{name}: bảng {table_size:.1f} MB; index: {indexes}")
+
+        print(f"\n{'Kiểu lưu':<22}{f'recall@{args.top_k}':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+        for name, store in variants:
+            results, latencies = run_queries(store, queries, args.top_k)
+            print(
+                f"{name:<22}{recall(reference, results, args.top_k):>12.3f}"
+                f"{np.percentile(latencies, 50):>12.2f}{np.percentile(latencies, 95):>12.2f}"
+            )
+    finally:
+        if not args.keep:
+            with vector_engine.begin() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS {copy_table}"))
+        vector_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
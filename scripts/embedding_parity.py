@@ -0,0 +1,137 @@
+"""
+So sánh embedding bge-m3 int8 (ONNX) với bge-m3 float32 trên kho báo cáo tài chính.
+
+Các đoạn văn bản được đọc từ một bảng vector đã index. Script báo cáo:
+- cosine giữa vector float và int8 của cùng một đoạn (trung bình, p5, nhỏ nhất)
+- độ trùng top-k khi truy xuất bằng brute force trên các đoạn đó, ở hai trường hợp:
+  index lại toàn bộ bằng int8 (int8/int8) và chỉ đổi backend của câu truy vấn (int8/float)
+- thời gian nhúng mỗi đoạn và bộ nhớ tăng thêm khi tải mỗi model
+
+Trả về mã lỗi 1 nếu cosine trung bình hoặc độ trùng top-k thấp hơn ngưỡng.
+
+Cách dùng:
+    python scripts/embedding_parity.py --table ACB_financials_report --limit 500
+    python scripts/embedding_parity.py --table financials_report --queries-file queries.txt
+"""
+import argparse
+import logging
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from dags.config.vectostore import create_embed_model, get_vector_engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = [
+    "Doanh thu thuần năm 2024 là bao nhiêu?",
+    "Lợi nhuận sau thuế quý 1 tăng hay giảm so với cùng kỳ?",
+    "Tổng tài sản và nợ phải trả cuối kỳ",
+    "Tỷ lệ nợ xấu của ngân hàng",
+    "Chi phí lãi vay và chi phí tài chính",
+    "Dòng tiền từ hoạt động kinh doanh",
+    "Kế hoạch chia cổ tức năm nay",
+    "Biên lợi nhuận gộp thay đổi thế nào?",
+    "Vốn chủ sở hữu và lợi nhuận chưa phân phối",
+    "Rủi ro chính trong hoạt động kinh doanh",
+]
+
+
+def load_chunks(table_name, limit):
+    """Đọc tối đa limit đoạn văn bản từ bảng vector."""
+    with get_vector_engine().connect() as connection:
+        rows = connection.execute(
+            text(f'SELECT text FROM "data_{table_name.lower()}" ORDER BY id LIMIT :limit'),
+            {"limit": limit},
+        ).scalars().all()
+    return [row for row in rows if row and row.strip()]
+
+
+def max_rss_mb():
+    # ru_maxrss tính bằng KB trên Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def embed(model, chunks, queries):
+    """Nhúng các đoạn và câu truy vấn, trả về (vector đoạn, vector truy vấn, giây mỗi đoạn)."""
+    start = time.perf_counter()
+    chunk_vectors = normalize(model.get_text_embedding_batch(chunks))
+    seconds_per_chunk = (time.perf_counter() - start) / len(chunks)
+    query_vectors = normalize([model.get_query_embedding(query) for query in queries])
+    return chunk_vectors, query_vectors, seconds_per_chunk
+
+
+def top_k(query_vectors, chunk_vectors, k):
+    scores = query_vectors @ chunk_vectors.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def overlap(reference, candidate, k):
+    return float(np.mean([len(a & b) / k for a, b in zip(reference, candidate)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh embedding int8 với float32")
+    parser.add_argument("--table", required=True, help="Tên bảng vector (như khi truyền vào load_indexs)")
+    parser.add_argument("--limit", type=int, default=500, help="Số đoạn văn bản tối đa")
+    parser.add_argument("--queries-file", help="File câu truy vấn, mỗi dòng một câu")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-overlap", type=float, default=0.8)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    queries = DEFAULT_QUERIES
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    chunks = load_chunks(args.table, args.limit)
+    if len(chunks) <= args.top_k:
+        logger.error(f"Bảng {args.table} chỉ có {len(chunks)} đoạn, cần nhiều hơn top-k={args.top_k}")
+        sys.exit(1)
+    logger.info(f"Đã đọc {len(chunks)} đoạn, {len(queries)} câu truy vấn")
+
+    # Tải model int8 trước để đo bộ nhớ tăng thêm của từng model (ru_maxrss chỉ tăng)
+    rss_before = max_rss_mb()
+    int8_model = create_embed_model("onnx_int8")
+    int8_chunks, int8_queries, int8_seconds = embed(int8_model, chunks, queries)
+    int8_rss = max_rss_mb() - rss_before
+
+    rss_before = max_rss_mb()
+    float_model = create_embed_model("float")
+    float_chunks, float_queries, float_seconds = embed(float_model, chunks, queries)
+    float_rss = max_rss_mb() - rss_before
+
+    cosines = np.sum(float_chunks * int8_chunks, axis=1)
+    reference = top_k(float_queries, float_chunks, args.top_k)
+    full_overlap = overlap(reference, top_k(int8_queries, int8_chunks, args.top_k), args.top_k)
+    mixed_overlap = overlap(reference, top_k(int8_queries, float_chunks, args.top_k), args.top_k)
+
+    print(f"Cosine float/int8:            trung bình {cosines.mean():.4f}, p5 {np.percentile(cosines, 5):.4f}, "
+          f"nhỏ nhất {cosines.min():.4f}")
+    print(f"Trùng top-{args.top_k} (int8/int8):     {full_overlap:.3f}")
+    print(f"Trùng top-{args.top_k} (int8/float):    {mixed_overlap:.3f}")
+    print(f"Thời gian mỗi đoạn:           float {1000 * float_seconds:.1f} ms, int8 {1000 * int8_seconds:.1f} ms "
+          f"(nhanh hơn {float_seconds / int8_seconds:.2f}x)")
+    print(f"Bộ nhớ tăng thêm khi tải:     float {float_rss:.0f} MB, int8 {int8_rss:.0f} MB")
+
+    passed = cosines.mean() >= args.min_cosine and min(full_overlap, mixed_overlap) >= args.min_overlap
+    print("KẾT QUẢ: ĐẠT" if passed else "KẾT QUẢ: KHÔNG ĐẠT")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
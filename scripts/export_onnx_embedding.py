@@ -0,0 +1,63 @@
+"""
+Export BAAI/bge-m3 sang ONNX và lượng tử hóa động int8 cho EMBED_BACKEND=onnx_int8.
+
+Thư mục kết quả chứa model_quantized.onnx cùng tokenizer, dùng làm ONNX_EMBED_MODEL_DIR.
+
+Cần cài thêm: pip install "optimum[onnxruntime]" transformers
+
+Cách dùng:
+    python scripts/export_onnx_embedding.py                         # ghi vào models/bge-m3-onnx-int8
+    python scripts/export_onnx_embedding.py --arch avx2 --output-dir /opt/models/bge-m3-int8
+"""
+import argparse
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "BAAI/bge-m3"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export bge-m3 sang ONNX int8")
+    parser.add_argument("--output-dir", default=os.getenv("ONNX_EMBED_MODEL_DIR", "models/bge-m3-onnx-int8"))
+    parser.add_argument(
+        "--arch",
+        choices=["avx2", "avx512", "avx512_vnni", "arm64"],
+        default="avx512_vnni",
+        help="Tập lệnh CPU của máy chạy chatbot",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    logger.info(f"Export {MODEL_NAME} sang ONNX (float32)")
+    model = ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True)
+    model.save_pretrained(args.output_dir)
+    AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(args.output_dir)
+
+    # Lượng tử hóa động: trọng số int8, activation được lượng tử hóa lúc chạy nên
+    # không cần dữ liệu hiệu chỉnh
+    logger.info(f"Lượng tử hóa int8 cho {args.arch}")
+    quantization_config = getattr(AutoQuantizationConfig, args.arch)(is_static=False, per_channel=False)
+    quantizer = ORTQuantizer.from_pretrained(args.output_dir)
+    quantizer.quantize(save_dir=args.output_dir, quantization_config=quantization_config)
+
+    float_size = sum(
+        os.path.getsize(os.path.join(args.output_dir, name))
+        for name in os.listdir(args.output_dir)
+        if name.startswith("model.onnx")
+    )
+    quantized_size = os.path.getsize(os.path.join(args.output_dir, "model_quantized.onnx"))
+    logger.info(
+        f"Đã ghi {args.output_dir}: float32 {float_size / 2**20:.0f} MB, "
+        f"int8 {quantized_size / 2**20:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
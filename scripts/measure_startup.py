@@ -0,0 +1,85 @@
+"""
+Đo thời gian khởi động nguội (cold start) của các module cấu hình và chatbot.
+
+Mỗi module được import trong một tiến trình Python mới nên kết quả không bị ảnh
+hưởng bởi các module đã import trước đó. Script trả về mã lỗi 1 nếu có module
+vượt ngân sách thời gian (xem mục "Ngân sách thời gian khởi động" trong README).
+
+Cách dùng:
+    python scripts/measure_startup.py                # chỉ đo thời gian import
+    python scripts/measure_startup.py --resources    # đo thêm lần đầu tạo embedding model, engine, LLM
+    python scripts/measure_startup.py --repeat 5     # lấy trung vị của 5 lần đo
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# (tên, câu lệnh cần đo, ngân sách tính bằng giây)
+IMPORT_TARGETS = [
+    ("dags.config.vectostore", "import dags.config.vectostore", 0.3),
+    ("dags.config.models_llm", "import dags.config.models_llm", 0.3),
+    ("dags.src.chatbot", "import dags.src.chatbot", 0.3),
+    # Phần lớn thời gian là import llama-index; không tạo model, kết nối hay client LLM
+    ("dags.src.chatbot.agent_stock", "import dags.src.chatbot.agent_stock", 3.0),
+]
+
+RESOURCE_TARGETS = [
+    ("get_embed_model()", "from dags.config.vectostore import get_embed_model; get_embed_model()", None),
+    ("get_vector_engine()", "from dags.config.vectostore import get_vector_engine; get_vector_engine()", None),
+    ("get_llm_gpt4o()", "from dags.config.models_llm import get_llm_gpt4o; get_llm_gpt4o()", None),
+]
+
+_RUNNER = """
+import json, time
+start = time.perf_counter()
+{statement}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+
+def measure(statement: str) -> float:
+    """Chạy câu lệnh trong một tiến trình mới và trả về thời gian thực thi (giây)."""
+    result = subprocess.run(
+        [sys.executable, "-c", _RUNNER.format(statement=statement)],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "lỗi không rõ")
+    return json.loads(result.stdout.strip().splitlines()[-1])["seconds"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động nguội")
+    parser.add_argument("--resources", action="store_true", help="Đo thêm lần đầu tạo tài nguyên")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần đo cho mỗi mục")
+    args = parser.parse_args()
+
+    targets = IMPORT_TARGETS + (RESOURCE_TARGETS if args.resources else [])
+    over_budget = False
+    print(f"{'Mục':<32}{'Trung vị (s)':>14}{'Ngân sách (s)':>16}")
+    for name, statement, budget in targets:
+        try:
+            seconds = statistics.median(measure(statement) for _ in range(args.repeat))
+        except RuntimeError as e:
+            print(f"{name:<32}{'lỗi':>14}   {e}")
+            over_budget = True
+            continue
+        budget_text = f"{budget:.1f}" if budget is not None else "-"
+        flag = ""
+        if budget is not None and seconds > budget:
+            flag = "  VƯỢT NGÂN SÁCH"
+            over_budget = True
+        print(f"{name:<32}{seconds:>14.3f}{budget_text:>16}{flag}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Chuyển báo cáo tài chính từ các bảng vector theo mã ("{symbol}_financials_report")
+sang bảng dùng chung (SHARED_REPORT_TABLE) với metadata symbol, year, quarter.
+
+Vector được sao chép trực tiếp trong Postgres, không cần parse hay nhúng lại.
+Script có thể chạy lại nhiều lần: node đã có trong bảng dùng chung được bỏ qua.
+
+Cách dùng:
+    python scripts/migrate_vector_store.py                # mọi bảng *_financials_report
+    python scripts/migrate_vector_store.py --symbols ACB FPT
+    python scripts/migrate_vector_store.py --drop-old     # xóa bảng cũ sau khi chuyển xong
+
+Sau khi chuyển, đặt VECTOR_STORE_LAYOUT=shared cho chatbot.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+
+from sqlalchemy import text
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from dags.config.vectostore import disable_statement_timeout, get_vector_engine
+from dags.src.chatbot.index_to_vectostore import (
+    SHARED_REPORT_TABLE, _create_vector_store, parse_report_period,
+)
+
+logger = logging.getLogger(__name__)
+
+_SYMBOL_PATTERN = re.compile(r"^[A-Za-z0-9]+$")
+
+
+def discover_symbols(connection):
+    """Tìm các mã đang có bảng vector riêng."""
+    rows = connection.execute(text(
+        """
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = 'public' AND table_name LIKE 'data\\_%\\_financials\\_report'
+        """
+    )).fetchall()
+    symbols = []
+    for (table_name,) in rows:
+        symbol = table_name[len("data_"):-len("_financials_report")]
+        if _SYMBOL_PATTERN.match(symbol):
+            symbols.append(symbol.upper())
+    return sorted(symbols)
+
+
+def migrate_symbol(connection, symbol, target_table):
+    """
+    Sao chép các node của một mã sang bảng dùng chung.
+
+    Returns:
+        tuple: (số node trong bảng cũ, số node của mã trong bảng dùng chung)
+    """
+    source_table = f"data_{symbol.lower()}_financials_report"
+    file_names = connection.execute(text(
+        f'SELECT DISTINCT metadata_->>\'file_name\' FROM "{source_table}"'
+    )).scalars().all()
+
+    for file_name in file_names:
+        patch = {"symbol": symbol, **parse_report_period(file_name)}
+        connection.execute(
+            text(
+                f"""
+                INSERT INTO "{target_table}" (text, metadata_, node_id, embedding)
+                SELECT s.text, (s.metadata_::jsonb || CAST(:patch AS jsonb))::json, s.node_id, s.embedding
+                FROM "{source_table}" s
+                WHERE (s.metadata_->>'file_name') IS NOT DISTINCT FROM :file_name
+                  AND NOT EXISTS (SELECT 1 FROM "{target_table}" t WHERE t.node_id = s.node_id)
+                """
+            ),
+            {"patch": json.dumps(patch), "file_name": file_name},
+        )
+
+    source_rows = connection.execute(text(f'SELECT COUNT(*) FROM "{source_table}"')).scalar()
+    target_rows = connection.execute(
+        text(f"SELECT COUNT(*) FROM \"{target_table}\" WHERE metadata_->>'symbol' = :symbol"),
+        {"symbol": symbol},
+    ).scalar()
+    return source_rows, target_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chuyển bảng vector theo mã sang bảng dùng chung")
+    parser.add_argument("--symbols", nargs="*", help="Các mã cần chuyển (mặc định: tất cả)")
+    parser.add_argument("--drop-old", action="store_true", help="Xóa bảng cũ khi đã chuyển đủ node")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    # Tạo bảng dùng chung cùng HNSW index và index trên metadata nếu chưa có
+    _create_vector_store(SHARED_REPORT_TABLE)._initialize()
+    target_table = f"data_{SHARED_REPORT_TABLE.lower()}"
+
+    vector_engine = get_vector_engine()
+    with vector_engine.begin() as connection:
+        symbols = [symbol.upper() for symbol in args.symbols] if args.symbols else discover_symbols(connection)
+
+    for symbol in symbols:
+        if not _SYMBOL_PATTERN.match(symbol):
+            logger.warning(f"Bỏ qua mã không hợp lệ: {symbol}")
+            continue
+        try:
+            with vector_engine.begin() as connection:
+                # Chép toàn bộ node của một mã vào bảng đã có HNSW vượt statement_timeout của pool
+                disable_statement_timeout(connection)
+                source_rows, target_rows = migrate_symbol(connection, symbol, target_table)
+                logger.info(f"{symbol}: {source_rows} node trong bảng cũ, {target_rows} node trong {target_table}")
+                if args.drop_old and target_rows >= source_rows:
+                    connection.execute(text(f'DROP TABLE "data_{symbol.lower()}_financials_report"'))
+                    logger.info(f"Đã xóa bảng cũ của {symbol}")
+        except Exception as e:
+            logger.error(f"Lỗi khi chuyển {symbol}: {str(e)}")
+
+    vector_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()